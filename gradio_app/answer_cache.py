@@ -0,0 +1,188 @@
+"""
+Semantic Answer Cache
+
+Many questions sent to the chatbot are near-identical. This cache returns a
+previous answer when a new query embeds close to a cached one *and* retrieval
+returned the same context for the same ``top_k``, skipping the LLM call.
+Entries expire after a TTL, the least recently used ones are evicted beyond
+a size limit, and entries are invalidated when documents that contributed to
+them change.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    # Fallback for direct execution
+    from metrics import REGISTRY
+
+_LOOKUPS = REGISTRY.counter(
+    "rag_answer_cache_lookups_total", "Semantic answer cache lookups", ["result"]
+)
+_HITS = _LOOKUPS.labels(result="hit")
+_MISSES = _LOOKUPS.labels(result="miss")
+
+
+def _doc_key(doc: Document) -> str:
+    """Stable identifier for a retrieved document."""
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return doc_id
+    return "sha1:" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def context_fingerprint(documents: Sequence[Document]) -> str:
+    """Fingerprint of the ordered retrieval result used to build a prompt."""
+    digest = hashlib.sha1()
+    for doc in documents:
+        digest.update(_doc_key(doc).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    bucket: Tuple[str, int]
+    answer: str
+    created: float
+    doc_keys: Set[str]
+    titles: Set[str]
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query embedding, context fingerprint and top_k.
+
+    Only entries with the same fingerprint and ``top_k`` are compared, so a
+    lookup scans a handful of vectors regardless of cache size.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl: float = 3600.0,
+        max_entries: int = 1024,
+    ):
+        """
+        Args:
+            similarity_threshold: Minimum cosine similarity between query
+                embeddings for a cached answer to be reused
+            ttl: Seconds before an entry expires
+            max_entries: Maximum number of cached answers
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets[entry.bucket]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._buckets[entry.bucket]
+
+    def lookup(
+        self, query_vector: Sequence[float], documents: Sequence[Document], top_k: int
+    ) -> Optional[str]:
+        """Return a cached answer for a similar query with the same context, if any."""
+        bucket_key = (context_fingerprint(documents), top_k)
+        query = self._normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id in list(self._buckets.get(bucket_key, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(query, entry.vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                _MISSES.inc()
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            _HITS.inc()
+            return self._entries[best_id].answer
+
+    def store(
+        self,
+        query_vector: Sequence[float],
+        documents: Sequence[Document],
+        top_k: int,
+        answer: str,
+    ) -> None:
+        """Cache an answer generated from ``documents`` for ``query_vector``."""
+        bucket_key = (context_fingerprint(documents), top_k)
+        entry = _Entry(
+            vector=self._normalize(query_vector),
+            bucket=bucket_key,
+            answer=answer,
+            created=time.time(),
+            doc_keys={_doc_key(doc) for doc in documents},
+            titles={doc.metadata["title"] for doc in documents if "title" in doc.metadata},
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._buckets.setdefault(bucket_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, documents: List[Document]) -> int:
+        """
+        Drop answers built from any of the given documents.
+
+        A document matches by ID, or by title so that re-uploading a document
+        under the same title invalidates answers built from its old chunks.
+
+        Returns:
+            Number of entries removed
+        """
+        doc_keys = {_doc_key(doc) for doc in documents}
+        titles = {doc.metadata["title"] for doc in documents if "title" in doc.metadata}
+        with self._lock:
+            stale = [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if entry.doc_keys & doc_keys or entry.titles & titles
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
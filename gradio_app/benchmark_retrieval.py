@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Retrieval Benchmark
+
+Measures how ``load_or_build_index`` and vector search behave as the corpus
+grows or the index type changes. Synthetic corpora of any size are generated
+from a Zipf-distributed vocabulary and embedded with a deterministic, offline
+hashing embedder, so runs are reproducible and need no model or API key. For
+each corpus size and index spec the benchmark reports build time, memory,
+snapshot save and load time, single-threaded QPS, p50/p99 search latency and
+recall@k against exact (Flat) search. Results are written as JSON for
+tracking across versions.
+
+Usage:
+    python benchmark_retrieval.py --sizes 1000,10000 --index-specs flat,ivf-flat,hnsw
+    python benchmark_retrieval.py --sizes 100000 --index-specs ivf-pq --nprobe 16 \\
+        --output bench.json
+    python benchmark_retrieval.py --sizes 100000 --storage float32,float16,int8 --rerank 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from .faiss_helper import load_or_build_index
+    from .index_spec import INDEX_ALIASES, IndexSpec
+except ImportError:
+    # Fallback for direct execution
+    from faiss_helper import load_or_build_index
+    from index_spec import INDEX_ALIASES, IndexSpec
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_INDEX_SPECS = ("flat", "ivf-flat", "hnsw")
+DEFAULT_QUERIES = 200
+DEFAULT_K = 10
+DEFAULT_DIM = 128
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic offline embedder: a normalized bag of signed, hashed words.
+
+    Texts sharing words get similar vectors, which is all the benchmark needs
+    to give ANN indexes realistic neighbourhoods without a real model.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+        self.seconds = 0.0
+
+    def _embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+            vec[digest % self.dim] += 1.0 if digest & (1 << 63) else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = [self._embed(text).tolist() for text in texts]
+        self.seconds += time.perf_counter() - started
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+def synthetic_corpus(
+    size: int, words_per_doc: int = 40, vocab_size: int = 20000, seed: int = 0
+) -> Dict[str, str]:
+    """
+    Generate ``size`` documents of Zipf-distributed words.
+
+    Returns:
+        Dictionary of document titles to content, as load_or_build_index expects
+    """
+    rng = np.random.default_rng(seed)
+    words = rng.zipf(1.3, size=(size, words_per_doc)) % vocab_size
+    return {
+        f"doc-{i:07d}": " ".join(f"w{word}" for word in row) for i, row in enumerate(words)
+    }
+
+
+def synthetic_queries(docs: Dict[str, str], count: int, seed: int = 1) -> List[str]:
+    """Queries made of half of a random document's words plus two random ones."""
+    rng = np.random.default_rng(seed)
+    texts = list(docs.values())
+    queries = []
+    for i in rng.choice(len(texts), size=count):
+        words = texts[i].split()
+        kept = rng.choice(len(words), size=max(1, len(words) // 2), replace=False)
+        noise = [f"w{word}" for word in rng.integers(0, 20000, size=2)]
+        queries.append(" ".join([words[j] for j in sorted(kept)] + noise))
+    return queries
+
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux), else peak RSS, else None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def _exact_neighbours(manager, queries: np.ndarray, k: int) -> List[List[str]]:
+    """Ground-truth top-k document IDs by exhaustive search over re-embedded texts."""
+    index = manager.index
+    id_map = index.index_to_docstore_id
+    positions = sorted(id_map)
+    texts = [index.docstore.search(id_map[position]).page_content for position in positions]
+    vectors = np.asarray(index.embeddings.embed_documents(texts), dtype=np.float32)
+
+    if index.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        exact = faiss.IndexFlatIP(vectors.shape[1])
+    else:
+        exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, labels = exact.search(queries, k)
+    return [[id_map[positions[label]] for label in row if label != -1] for row in labels]
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+
+def run_benchmark(
+    docs: Dict[str, str],
+    queries: Sequence[str],
+    index_spec: IndexSpec,
+    k: int = DEFAULT_K,
+    dim: int = DEFAULT_DIM,
+    workdir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Build, save, reload and query one index, measuring each step.
+
+    Args:
+        docs: Corpus of document titles to content
+        queries: Query texts
+        index_spec: Index type to benchmark
+        k: Neighbours retrieved per query (and the k of recall@k)
+        dim: Embedding dimension
+        workdir: Directory for the index files (default: a temporary directory)
+
+    Returns:
+        JSON-serializable measurements
+    """
+    factory = index_spec.factory
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        path = os.path.join(tmpdir, "index")
+        embeddings = HashEmbeddings(dim)
+
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        manager = load_or_build_index(
+            docs, path, embeddings=embeddings, index_spec=index_spec, auto_persist=False
+        )
+        build_seconds = time.perf_counter() - started
+        embed_seconds = embeddings.seconds
+        rss_after = _rss_bytes()
+        built_spec = IndexSpec.load(path)
+        index_bytes = int(faiss.serialize_index(manager.index.index).nbytes)
+
+        started = time.perf_counter()
+        manager.compact()
+        save_seconds = time.perf_counter() - started
+        disk_bytes = _dir_bytes(path)
+        manager.shutdown()
+        del manager
+
+        started = time.perf_counter()
+        manager = load_or_build_index(
+            docs, path, embeddings=embeddings, index_spec=index_spec, auto_persist=False
+        )
+        load_seconds = time.perf_counter() - started
+
+        # Queries are embedded up front so latencies cover the search alone
+        vectors = [manager.embed_query(query) for query in queries]
+        latencies = []
+        results = []
+        search_started = time.perf_counter()
+        for vector in vectors:
+            started = time.perf_counter()
+            hits = manager.similarity_search_with_score_by_vector(vector, k=k)
+            latencies.append(time.perf_counter() - started)
+            results.append([doc.id for doc, _ in hits])
+        search_seconds = time.perf_counter() - search_started
+
+        exact = _exact_neighbours(manager, np.asarray(vectors, dtype=np.float32), k)
+        recall = float(np.mean([
+            len(set(found) & set(truth)) / len(truth)
+            for found, truth in zip(results, exact)
+            if truth
+        ])) if results else 0.0
+        manager.shutdown()
+
+    return {
+        "index_spec": factory,
+        "factory": built_spec.factory if built_spec else factory,
+        "storage": index_spec.storage,
+        "rerank": index_spec.rerank,
+        "nprobe": index_spec.nprobe,
+        "ef_search": index_spec.ef_search,
+        "corpus_size": len(docs),
+        "dim": dim,
+        "k": k,
+        "queries": len(queries),
+        "build_seconds": round(build_seconds, 4),
+        "embed_seconds": round(embed_seconds, 4),
+        "rss_delta_bytes": (
+            rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        ),
+        "index_bytes": index_bytes,
+        "disk_bytes": disk_bytes,
+        "save_seconds": round(save_seconds, 4),
+        "load_seconds": round(load_seconds, 4),
+        "qps": round(len(queries) / search_seconds, 1) if search_seconds else None,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 4),
+            "p99": round(_percentile(latencies, 99) * 1000, 4),
+            "mean": round(float(np.mean(latencies)) * 1000, 4) if latencies else 0.0,
+        },
+        f"recall_at_{k}": round(recall, 4),
+    }
+
+
+def _compare_to_float32(result: Dict[str, Any], results: List[Dict[str, Any]], k: int) -> None:
+    """Add memory saved and recall lost against the float32 run of the same index."""
+    if result["storage"] == "float32":
+        return
+    key = ("index_spec", "nprobe", "ef_search", "corpus_size")
+    baseline = next(
+        (
+            other for other in results
+            if other["storage"] == "float32"
+            and not other["rerank"]
+            and all(other[name] == result[name] for name in key)
+        ),
+        None,
+    )
+    if baseline is None:
+        return
+    result["vs_float32"] = {
+        "index_bytes_saved": baseline["index_bytes"] - result["index_bytes"],
+        "index_bytes_ratio": round(result["index_bytes"] / baseline["index_bytes"], 4),
+        "recall_lost": round(baseline[f"recall_at_{k}"] - result[f"recall_at_{k}"], 4),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """Versions and hardware the numbers were measured on."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "faiss": getattr(faiss, "__version__", "unknown"),
+        "numpy": np.__version__,
+    }
+
+
+def run_suite(
+    sizes: Sequence[int],
+    specs: Sequence[IndexSpec],
+    num_queries: int = DEFAULT_QUERIES,
+    k: int = DEFAULT_K,
+    dim: int = DEFAULT_DIM,
+    workdir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Benchmark every index spec at every corpus size."""
+    results = []
+    for size in sizes:
+        docs = synthetic_corpus(size)
+        queries = synthetic_queries(docs, num_queries)
+        for spec in specs:
+            result = run_benchmark(docs, queries, spec, k, dim, workdir)
+            results.append(result)
+            print(
+                f"{size:>9} docs  {result['factory']:<16} rerank {result['rerank']:>2}"
+                f"  build {result['build_seconds']:>8.2f}s"
+                f"  load {result['load_seconds']:>6.2f}s  {result['qps'] or 0:>9.1f} QPS"
+                f"  p50 {result['latency_ms']['p50']:>7.3f}ms"
+                f"  p99 {result['latency_ms']['p99']:>7.3f}ms"
+                f"  recall@{k} {result[f'recall_at_{k}']:.3f}",
+                file=sys.stderr,
+            )
+    for result in results:
+        _compare_to_float32(result, results, k)
+    return {
+        "environment": environment(),
+        "config": {"sizes": list(sizes), "queries": num_queries, "k": k, "dim": dim},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark index build, persistence and search on synthetic corpora"
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma-separated corpus sizes (default: 1000,10000)",
+    )
+    parser.add_argument(
+        "--index-specs",
+        default=",".join(DEFAULT_INDEX_SPECS),
+        help=f"Comma-separated index types: {', '.join(INDEX_ALIASES)} or faiss factory "
+        "strings; separate with ';' when a factory string contains commas "
+        "(default: flat,ivf-flat,hnsw)",
+    )
+    parser.add_argument("--nprobe", type=int, help="Inverted lists searched per query (IVF)")
+    parser.add_argument("--ef-search", type=int, help="Candidate list size per query (HNSW)")
+    parser.add_argument(
+        "--storage",
+        default="float32",
+        help="Comma-separated vector encodings to compare: float32, float16, int8 "
+        "(default: float32)",
+    )
+    parser.add_argument(
+        "--rerank",
+        type=int,
+        default=0,
+        help="Shortlist factor re-ranked with exact vectors for float16/int8 runs",
+    )
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="Neighbours per query")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Embedding dimension")
+    parser.add_argument("--workdir", help="Directory for temporary index files")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    specs = [
+        IndexSpec(
+            factory=name.strip(),
+            nprobe=args.nprobe,
+            ef_search=args.ef_search,
+            storage=storage.strip(),
+            rerank=0 if storage.strip() == "float32" else args.rerank,
+        )
+        for name in args.index_specs.split(";" if ";" in args.index_specs else ",")
+        if name.strip()
+        for storage in args.storage.split(",")
+    ]
+    report = run_suite(
+        [int(size) for size in args.sizes.split(",")],
+        specs,
+        num_queries=args.queries,
+        k=args.k,
+        dim=args.dim,
+        workdir=args.workdir,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Bulk Directory Ingestion
+
+Builds or extends the index at a ``--faiss`` path from a whole directory
+tree instead of one upload at a time. Files are read, hashed and chunked in
+parallel worker processes, chunks are embedded in large batches, and the
+result is committed to the index as one snapshot. A manifest of file hashes
+stored next to the index makes re-runs resumable: only new or changed files
+are processed, and a modified file replaces its earlier chunks.
+
+Usage:
+    python bulk_ingest.py ./corpus --faiss ./my_index
+    python bulk_ingest.py ./corpus --faiss ./my_index --workers 8 --checkpoint-every 5000
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.documents import Document
+
+try:
+    from .faiss_helper import (
+        BatchedPersistenceManager,
+        build_index,
+        get_embeddings,
+        load_or_build_index,
+    )
+    from .index_spec import INDEX_ALIASES, IndexSpec
+    from .ingestion import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_text_stream
+    from .lexical_index import LEXICAL_FILE
+    from .sharded_index import (
+        ShardedIndexManager,
+        load_or_build_sharded_index,
+        read_shard_count,
+        shard_path,
+    )
+except ImportError:
+    # Fallback for direct execution
+    from faiss_helper import (
+        BatchedPersistenceManager,
+        build_index,
+        get_embeddings,
+        load_or_build_index,
+    )
+    from index_spec import INDEX_ALIASES, IndexSpec
+    from ingestion import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_text_stream
+    from lexical_index import LEXICAL_FILE
+    from sharded_index import (
+        ShardedIndexManager,
+        load_or_build_sharded_index,
+        read_shard_count,
+        shard_path,
+    )
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "ingest_manifest.json"
+DEFAULT_EXTENSIONS = (".txt", ".md", ".json")
+DEFAULT_BULK_EMBED_BATCH_SIZE = 512
+
+
+class IngestManifest:
+    """
+    Record of the files already in an index, keyed by path relative to the root.
+
+    Each entry holds the file's size, mtime and SHA-256 plus the IDs of the
+    chunks it produced. Size and mtime let unchanged files be skipped without
+    reading them; the hash catches files that were touched but not modified.
+    """
+
+    def __init__(self, index_path: str):
+        self.path = os.path.join(index_path, MANIFEST_FILE)
+        self.files: Dict[str, dict] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f)["files"]
+        except FileNotFoundError:
+            pass
+
+    def is_current(self, rel_path: str, size: int, mtime_ns: int) -> bool:
+        entry = self.files.get(rel_path)
+        return bool(entry) and entry["size"] == size and entry["mtime_ns"] == mtime_ns
+
+    def record(
+        self,
+        rel_path: str,
+        sha256: str,
+        size: int,
+        mtime_ns: int,
+        ids: Optional[List[str]] = None,
+    ) -> None:
+        """Add or update an entry; ``ids`` defaults to the entry's existing IDs."""
+        if ids is None:
+            ids = self.files.get(rel_path, {}).get("ids", [])
+        self.files[rel_path] = {
+            "sha256": sha256, "size": size, "mtime_ns": mtime_ns, "ids": ids,
+        }
+
+    def save(self) -> None:
+        """Atomically write the manifest."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.files}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class FileChunks:
+    """A file read, hashed and chunked by a worker process."""
+
+    rel_path: str
+    sha256: str
+    size: int
+    mtime_ns: int
+    chunks: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class BulkIngestResult:
+    """Summary of a bulk ingestion run."""
+
+    files_scanned: int = 0
+    files_ingested: int = 0
+    files_unchanged: int = 0
+    files_failed: int = 0
+    files_removed: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.files_scanned} files scanned, {self.files_ingested} ingested, "
+            f"{self.files_unchanged} unchanged, {self.files_removed} removed, "
+            f"{self.files_failed} failed; "
+            f"{self.chunks} chunks in {self.elapsed:.1f}s"
+        )
+
+
+def iter_corpus_files(
+    root: str, extensions: Sequence[str] = DEFAULT_EXTENSIONS
+) -> Iterator[Tuple[str, str, int, int]]:
+    """Yield (relative path, absolute path, size, mtime_ns) for matching files."""
+    extensions = tuple(ext.lower() for ext in extensions)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if not name.lower().endswith(extensions):
+                continue
+            abs_path = os.path.join(dirpath, name)
+            stat = os.stat(abs_path)
+            rel_path = os.path.relpath(abs_path, root).replace(os.sep, "/")
+            yield rel_path, abs_path, stat.st_size, stat.st_mtime_ns
+
+
+def _read_and_chunk(task: Tuple[str, str, int, int, int, int]) -> FileChunks:
+    """Worker: hash and chunk one file (runs in a separate process)."""
+    rel_path, abs_path, size, mtime_ns, chunk_tokens, overlap_tokens = task
+    try:
+        with open(abs_path, "rb") as f:
+            data = f.read()
+        text = data.decode("utf-8", errors="replace")
+        if abs_path.lower().endswith(".json"):
+            try:
+                text = json.dumps(json.loads(text), indent=2)
+            except ValueError:
+                pass
+        chunks = [
+            chunk for chunk in chunk_text_stream([text], chunk_tokens, overlap_tokens)
+            if chunk.strip()
+        ]
+        return FileChunks(rel_path, hashlib.sha256(data).hexdigest(), size, mtime_ns, chunks)
+    except OSError as e:
+        return FileChunks(rel_path, "", size, mtime_ns, error=str(e))
+
+
+def bulk_ingest(
+    root: str,
+    index_path: str,
+    *,
+    use_openai: bool = True,
+    extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+    workers: Optional[int] = None,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    embed_batch_size: int = DEFAULT_BULK_EMBED_BATCH_SIZE,
+    checkpoint_every: int = 0,
+    index_spec: Optional[IndexSpec] = None,
+    embedding_cache: Optional[str] = None,
+    lexical_index: Optional[bool] = None,
+    prune: bool = False,
+    metadata: Optional[Dict[str, str]] = None,
+) -> BulkIngestResult:
+    """
+    Ingest new and changed files under ``root`` into the index at ``index_path``.
+
+    Args:
+        root: Directory to walk
+        index_path: Index directory; created if it does not exist
+        use_openai: Whether to use OpenAI embeddings
+        extensions: File extensions to ingest
+        workers: Reader/chunker processes (default: CPU count)
+        chunk_tokens: Maximum tokens per chunk
+        overlap_tokens: Tokens shared by consecutive chunks
+        embed_batch_size: Chunks embedded per model call
+        checkpoint_every: Commit after this many changed files; 0 commits
+            everything in a single snapshot at the end
+        index_spec: Index type used when the index is created
+        embedding_cache: Optional SQLite embedding cache file
+        lexical_index: Maintain the BM25 index; by default only if the index
+            already has one
+        prune: Delete the chunks of files that were ingested before but no
+            longer exist under ``root``
+        metadata: Extra metadata stored in every chunk, e.g. ``{"tenant": "acme"}``
+
+    Returns:
+        BulkIngestResult with file and chunk counts
+    """
+    start = time.perf_counter()
+    result = BulkIngestResult()
+    spec = replace(index_spec) if index_spec else IndexSpec()
+    sharded = os.path.exists(index_path) and read_shard_count(index_path) is not None
+    # A directory without a snapshot, e.g. created beforehand, holds a new index
+    exists = sharded or os.path.exists(os.path.join(index_path, "index.faiss"))
+    if lexical_index is None:
+        lexical_dir = shard_path(index_path, 0) if sharded else index_path
+        lexical_index = os.path.exists(os.path.join(lexical_dir, LEXICAL_FILE))
+
+    manager: Optional[Union[BatchedPersistenceManager, ShardedIndexManager]] = None
+    embeddings = None
+    manifest = None
+    if exists:
+        # Saves are only triggered explicitly, once per commit; a sharded
+        # index routes each file's chunks to the shard of its path
+        load_index = load_or_build_sharded_index if sharded else load_or_build_index
+        manager = load_index(
+            {},
+            index_path,
+            use_openai=use_openai,
+            batch_size=sys.maxsize,
+            max_wait_time=float("inf"),
+            embedding_cache=embedding_cache,
+            index_spec=index_spec,
+            lexical_index=lexical_index,
+        )
+        manifest = IngestManifest(index_path)
+
+    files = list(iter_corpus_files(root, extensions))
+    result.files_scanned = len(files)
+    known = manifest.files if manifest else {}
+    tasks = [
+        (rel, abs_path, size, mtime_ns, chunk_tokens, overlap_tokens)
+        for rel, abs_path, size, mtime_ns in files
+        if not (manifest and manifest.is_current(rel, size, mtime_ns))
+    ]
+    result.files_unchanged = len(files) - len(tasks)
+    print(f"{len(files)} files found, {len(tasks)} new or modified")
+
+    pending: List[FileChunks] = []
+
+    def _commit() -> None:
+        nonlocal manager, embeddings, manifest, pending
+        if not any(item.chunks for item in pending):
+            # A new index needs at least one chunk to be built
+            if manager is None or not pending:
+                return
+        documents: List[Document] = []
+        uploaded = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        for item in pending:
+            for i, chunk in enumerate(item.chunks):
+                documents.append(Document(
+                    id=str(uuid.uuid4()),
+                    page_content=chunk,
+                    metadata={
+                        **(metadata or {}),
+                        "title": item.rel_path,
+                        "chunk": i,
+                        "source": item.rel_path,
+                        "uploaded": uploaded,
+                    },
+                ))
+
+        if manager is None:
+            embeddings = embeddings or get_embeddings(use_openai, cache_path=embedding_cache)
+            embed = embeddings.embed_documents
+        else:
+            embed = manager.embed_documents
+        texts = [doc.page_content for doc in documents]
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), embed_batch_size):
+            vectors.extend(embed(texts[i:i + embed_batch_size]))
+            print(f"  embedded {len(vectors)}/{len(texts)} chunks")
+
+        if manager is None:
+            index = build_index(
+                embeddings,
+                texts,
+                vectors,
+                [doc.metadata for doc in documents],
+                spec,
+                ids=[doc.id for doc in documents],
+            )
+            manager = BatchedPersistenceManager(
+                index,
+                index_path,
+                batch_size=sys.maxsize,
+                max_wait_time=float("inf"),
+                lexical_index=lexical_index,
+                index_spec=spec,
+            )
+            manager.compact()
+            spec.save(index_path)
+            manifest = IngestManifest(index_path)
+            ids = [doc.id for doc in documents]
+        else:
+            # Titles are file paths, so changed files replace their old chunks
+            ids = manager.upsert_embedded_documents(documents, vectors) if documents else []
+            emptied = [item.rel_path for item in pending if not item.chunks]
+            if emptied:
+                manager.delete(titles=emptied)
+            manager.compact()
+
+        offset = 0
+        for item in pending:
+            item_ids = ids[offset:offset + len(item.chunks)]
+            offset += len(item.chunks)
+            manifest.record(item.rel_path, item.sha256, item.size, item.mtime_ns, item_ids)
+        manifest.save()
+        result.files_ingested += len(pending)
+        result.chunks += len(documents)
+        print(f"Committed {len(pending)} files ({len(documents)} chunks)")
+        pending = []
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for item in pool.map(_read_and_chunk, tasks, chunksize=16):
+                if item.error:
+                    logger.warning(f"Skipping {item.rel_path}: {item.error}")
+                    result.files_failed += 1
+                    continue
+                previous = known.get(item.rel_path)
+                if previous and previous["sha256"] == item.sha256:
+                    # Touched but unchanged: refresh the stat, keep the chunks
+                    manifest.record(item.rel_path, item.sha256, item.size, item.mtime_ns)
+                    result.files_unchanged += 1
+                    continue
+                pending.append(item)
+                if checkpoint_every and len(pending) >= checkpoint_every:
+                    _commit()
+        _commit()
+
+        if prune and manifest is not None:
+            scanned = {rel for rel, _, _, _ in files}
+            removed = [rel for rel in manifest.files if rel not in scanned]
+            if removed:
+                manager.delete(titles=removed)
+                manager.compact()
+                for rel in removed:
+                    del manifest.files[rel]
+                result.files_removed = len(removed)
+                print(f"Removed {len(removed)} deleted files from the index")
+        if manifest is not None:
+            manifest.save()
+    finally:
+        if manager is not None:
+            manager.shutdown()
+
+    result.elapsed = time.perf_counter() - start
+    logger.info(f"Bulk ingestion of {root}: {result.summary()}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest a directory tree into a FAISS index in bulk"
+    )
+    parser.add_argument("root", help="Directory to ingest")
+    parser.add_argument("--faiss", required=True, help="Index directory to build or extend")
+    parser.add_argument(
+        "--local-model", action="store_true", help="Use local HuggingFace embeddings"
+    )
+    parser.add_argument(
+        "--extensions",
+        default=",".join(DEFAULT_EXTENSIONS),
+        help="Comma-separated file extensions to ingest (default: .txt,.md,.json)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Reader processes (default: CPU count)"
+    )
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=DEFAULT_BULK_EMBED_BATCH_SIZE,
+        help=f"Chunks embedded per model call (default: {DEFAULT_BULK_EMBED_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=0,
+        help="Commit after this many changed files (default: one commit at the end)",
+    )
+    parser.add_argument(
+        "--index-spec",
+        default="flat",
+        help=f"Index type for a new index: {', '.join(INDEX_ALIASES)} or a faiss "
+        "factory string (default: flat)",
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        default=os.getenv("EMBEDDING_CACHE_PATH"),
+        help="SQLite file caching embeddings (default: $EMBEDDING_CACHE_PATH)",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete chunks of previously ingested files that no longer exist",
+    )
+    parser.add_argument(
+        "--lexical-index",
+        action="store_true",
+        help="Maintain the BM25 index used by hybrid retrieval",
+    )
+    parser.add_argument(
+        "--tenant", help="Tenant name stored in every chunk's metadata for filtering"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    summary = bulk_ingest(
+        args.root,
+        args.faiss,
+        use_openai=not args.local_model,
+        extensions=[ext.strip() for ext in args.extensions.split(",") if ext.strip()],
+        workers=args.workers,
+        chunk_tokens=args.chunk_tokens,
+        overlap_tokens=args.chunk_overlap,
+        embed_batch_size=args.embed_batch_size,
+        checkpoint_every=args.checkpoint_every,
+        index_spec=IndexSpec(factory=args.index_spec),
+        embedding_cache=args.embedding_cache,
+        lexical_index=args.lexical_index or None,
+        prune=args.prune,
+        metadata={"tenant": args.tenant} if args.tenant else None,
+    )
+    print(summary.summary())
@@ -0,0 +1,202 @@
+"""
+Token-budgeted Context Packing
+
+``chat()`` used to join the raw text of every retrieved document into the
+prompt. This module packs retrieved passages into a fixed token budget in
+rank order: duplicate and near-duplicate passages are skipped, the overlap
+between consecutive chunks of the same document is trimmed, and the last
+passage that does not fit is truncated. A ledger records context and
+completion token counts per request so the savings are visible; the context
+totals are also exported as ``rag_context_tokens_total``.
+"""
+
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+try:
+    from .metrics import REGISTRY
+    from .tokens import get_tokenizer
+except ImportError:
+    # Fallback for direct execution
+    from metrics import REGISTRY
+    from tokens import get_tokenizer
+
+# Only needed for annotations; the app imports this module before LangChain
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_BUDGET = 3000
+# Passages that would be truncated below this many tokens are dropped instead
+MIN_TRUNCATED_TOKENS = 32
+# Longest chunk overlap searched for when trimming consecutive chunks
+MAX_OVERLAP_TOKENS = 128
+
+CONTEXT_TOKENS = REGISTRY.counter(
+    "rag_context_tokens_total",
+    "Context tokens retrieved for chat requests and sent after packing",
+    ["kind"],
+)
+
+
+@dataclass
+class PackedContext:
+    """Result of packing retrieved passages into a token budget."""
+
+    text: str
+    tokens: int
+    input_tokens: int
+    documents: List["Document"] = field(default_factory=list)
+    duplicates: int = 0
+    truncated: int = 0
+    dropped: int = 0
+
+
+def _overlap_length(previous: Sequence, current: Sequence, limit: int) -> int:
+    """Length of the longest suffix of ``previous`` that prefixes ``current``."""
+    for n in range(min(limit, len(previous), len(current)), 0, -1):
+        if list(previous[-n:]) == list(current[:n]):
+            return n
+    return 0
+
+
+def _is_contained(words: set, kept: List[set], threshold: float) -> bool:
+    """Whether most of a passage's words already appear in one kept passage."""
+    if not words:
+        return True
+    return any(len(words & other) / len(words) >= threshold for other in kept)
+
+
+def pack_context(
+    documents: Sequence["Document"],
+    budget_tokens: int = DEFAULT_CONTEXT_BUDGET,
+    *,
+    tokenizer=None,
+    separator: str = "\n",
+    duplicate_threshold: float = 0.9,
+) -> PackedContext:
+    """
+    Pack documents, best first, into at most ``budget_tokens`` tokens.
+
+    Args:
+        documents: Retrieved documents in rank order
+        budget_tokens: Maximum context size in tokens
+        tokenizer: Tokenizer with encode/decode (defaults to the cached one)
+        separator: Text placed between passages
+        duplicate_threshold: Fraction of a passage's words found in an
+            already packed passage for it to count as a near-duplicate
+
+    Returns:
+        PackedContext with the prompt text and packing statistics
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    sep_tokens = len(tokenizer.encode(separator)) if separator else 0
+
+    passages: List[str] = []
+    kept_docs: List["Document"] = []
+    kept_words: List[set] = []
+    seen_hashes = set()
+    last_tokens_by_chunk = {}
+    used = 0
+    input_tokens = 0
+    duplicates = truncated = dropped = 0
+
+    for position, doc in enumerate(documents):
+        tokens = tokenizer.encode(doc.page_content)
+        input_tokens += len(tokens)
+
+        digest = hashlib.sha1(doc.page_content.encode("utf-8")).digest()
+        words = set(doc.page_content.lower().split())
+        if digest in seen_hashes or _is_contained(words, kept_words, duplicate_threshold):
+            duplicates += 1
+            continue
+
+        # Consecutive chunks of one upload share their boundary tokens
+        full_tokens = tokens
+        title, chunk = doc.metadata.get("title"), doc.metadata.get("chunk")
+        if chunk is not None:
+            previous = last_tokens_by_chunk.get((title, chunk - 1))
+            if previous is not None:
+                tokens = tokens[_overlap_length(previous, tokens, MAX_OVERLAP_TOKENS):]
+
+        cost = len(tokens) + (sep_tokens if passages else 0)
+        remaining = budget_tokens - used
+        if cost > remaining:
+            room = remaining - (sep_tokens if passages else 0)
+            if room >= MIN_TRUNCATED_TOKENS:
+                passages.append(tokenizer.decode(tokens[:room]))
+                kept_docs.append(doc)
+                used += room + (sep_tokens if len(passages) > 1 else 0)
+                truncated += 1
+                dropped += len(documents) - position - 1
+            else:
+                dropped += len(documents) - position
+            break
+
+        # Keep the original formatting unless the overlap was trimmed
+        trimmed = len(tokens) < len(full_tokens)
+        passages.append(tokenizer.decode(tokens) if trimmed else doc.page_content)
+        kept_docs.append(doc)
+        kept_words.append(words)
+        seen_hashes.add(digest)
+        if chunk is not None:
+            last_tokens_by_chunk[(title, chunk)] = full_tokens
+        used += cost
+
+    return PackedContext(
+        text=separator.join(passages),
+        tokens=used,
+        input_tokens=input_tokens,
+        documents=kept_docs,
+        duplicates=duplicates,
+        truncated=truncated,
+        dropped=dropped,
+    )
+
+
+class TokenUsageLedger:
+    """Running totals of context and completion tokens across chat requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.context_tokens_retrieved = 0
+        self.context_tokens_sent = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(
+        self,
+        packed: PackedContext,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+    ) -> None:
+        """Record one request; prompt/completion counts come from the API usage field."""
+        with self._lock:
+            self.requests += 1
+            self.context_tokens_retrieved += packed.input_tokens
+            self.context_tokens_sent += packed.tokens
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+        CONTEXT_TOKENS.labels(kind="retrieved").inc(packed.input_tokens)
+        CONTEXT_TOKENS.labels(kind="sent").inc(packed.tokens)
+        logger.info(
+            f"Context {packed.input_tokens} -> {packed.tokens} tokens "
+            f"({packed.duplicates} duplicates, {packed.truncated} truncated, "
+            f"{packed.dropped} dropped); prompt {prompt_tokens}, "
+            f"completion {completion_tokens}"
+        )
+
+    def summary(self) -> str:
+        """One-line totals for the status panel."""
+        with self._lock:
+            saved = self.context_tokens_retrieved - self.context_tokens_sent
+            return (
+                f"{self.requests} requests: {self.prompt_tokens} prompt / "
+                f"{self.completion_tokens} completion tokens, "
+                f"{saved} context tokens saved by packing"
+            )
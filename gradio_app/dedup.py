@@ -0,0 +1,195 @@
+"""
+Near-duplicate Detection with MinHash LSH
+
+Uploading the same material again with small edits would embed and index
+every copy. ``NearDuplicateIndex`` keeps a MinHash signature of each chunk's
+word shingles in a banded LSH table, so a new chunk can be checked against
+the whole index before it is embedded: candidates come from the buckets it
+shares, and the signature agreement estimates their Jaccard similarity.
+"""
+
+import os
+import pickle
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+DEDUP_FILE = "minhash.pkl"
+DEDUP_POLICIES = ("reject", "merge")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """Hashes of the lower-cased ``size``-word shingles of a text."""
+    words = text.lower().split()
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def _lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows == num_perm.
+
+    Uses the most rows whose detection threshold ``(1 / bands) ** (1 / rows)``
+    is still at or below ``threshold``, so near-duplicates are rarely missed;
+    candidates are then verified against the signature estimate.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index of chunk signatures keyed by document ID.
+
+    Not thread-safe by itself; BatchedPersistenceManager guards it with the
+    same reader/writer lock as the FAISS index.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity at which two chunks are
+                near-duplicates
+            num_perm: Number of hash permutations in a signature
+            shingle_size: Words per shingle
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _lsh_bands(num_perm, threshold)
+
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._titles: Dict[str, Optional[str]] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(self.bands)]
+        self.aliases: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._signatures
+
+    def doc_ids(self) -> List[str]:
+        return list(self._signatures)
+
+    def compatible(self, threshold: float, num_perm: int = 128) -> bool:
+        """Whether this index was built with the given parameters."""
+        return self.threshold == threshold and self.num_perm == num_perm
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text's shingles."""
+        hashes = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        # (a * x + b) mod p stays below 2**63 for 31-bit a, b and 32-bit x
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def add(self, doc_id: str, signature: np.ndarray, title: Optional[str] = None) -> None:
+        """Index a document's signature."""
+        if doc_id in self._signatures:
+            self.remove(doc_id)
+        self._signatures[doc_id] = signature
+        self._titles[doc_id] = title
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a document, if present."""
+        signature = self._signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        self._titles.pop(doc_id, None)
+        self.aliases.pop(doc_id, None)
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            members = buckets.get(key)
+            if members is not None:
+                members.discard(doc_id)
+                if not members:
+                    del buckets[key]
+
+    def query(
+        self, signature: np.ndarray, exclude_titles: Iterable[str] = ()
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar indexed document at or above the threshold.
+
+        Args:
+            signature: Signature of the candidate chunk
+            exclude_titles: Ignore documents with these titles, e.g. the
+                ones an upsert is about to replace
+
+        Returns:
+            (doc_id, estimated Jaccard similarity), or None
+        """
+        exclude = set(exclude_titles)
+        candidates: Set[str] = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+
+        best = None
+        for doc_id in candidates:
+            if self._titles.get(doc_id) in exclude:
+                continue
+            similarity = float(np.mean(self._signatures[doc_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (doc_id, similarity)
+        return best
+
+    def add_alias(self, doc_id: str, title: str) -> None:
+        """Record that a merged near-duplicate from ``title`` maps to ``doc_id``."""
+        aliases = self.aliases.setdefault(doc_id, [])
+        if title not in aliases:
+            aliases.append(title)
+
+    def save(self, path: str) -> None:
+        """Atomically write the index to ``path/minhash.pkl``."""
+        write_dedup_bytes(path, pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.9) -> "NearDuplicateIndex":
+        """
+        Load ``path/minhash.pkl``.
+
+        Returns an empty index if the file does not exist or was built with a
+        different threshold; the caller then rebuilds it from the docstore.
+        """
+        try:
+            with open(os.path.join(path, DEDUP_FILE), "rb") as f:
+                index = pickle.load(f)
+        except FileNotFoundError:
+            return cls(threshold)
+        return index if index.compatible(threshold) else cls(threshold)
+
+
+def write_dedup_bytes(path: str, data: bytes) -> None:
+    """Atomically write a pickled NearDuplicateIndex into an index directory."""
+    final_path = os.path.join(path, DEDUP_FILE)
+    tmp_path = final_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
@@ -0,0 +1,26 @@
+"""
+Shared Defaults
+
+Names and defaults the command line and UI show before any index is loaded.
+They live here, away from the modules that use them, because those modules
+import FAISS, numpy or LangChain; importing the app to print ``--help`` or to
+start the background index load should not pay for that.
+"""
+
+# Friendly names for common index types (see index_spec.py). ``{nlist}`` and
+# ``{m}`` are filled in from the corpus size and vector dimension when the
+# index is built.
+INDEX_ALIASES = {
+    "flat": "Flat",
+    "ivf-flat": "IVF{nlist},Flat",
+    "ivf-pq": "IVF{nlist},PQ{m}",
+    "hnsw": "HNSW32",
+}
+
+# Metadata fields indexed for filtering by default (see metadata_filter.py)
+FILTER_FIELDS = ("title", "source", "uploaded", "tenant")
+
+# Chunking and embedding of uploaded documents (see ingestion.py)
+DEFAULT_CHUNK_TOKENS = 256
+DEFAULT_OVERLAP_TOKENS = 32
+DEFAULT_EMBED_BATCH_SIZE = 64
@@ -0,0 +1,369 @@
+"""
+Append-only Delta Log for FAISS Indexes
+
+Flushing a large FAISS index with ``save_local`` rewrites the whole vector
+file and pickled docstore. This module records only the documents added
+and deleted since the last full snapshot, plus metadata updates of existing
+documents, as small segment files next to the snapshot. A compaction step
+folds the segments back into the base snapshot, and loading replays any
+segments that have not been compacted yet. Deleted documents are tombstones
+until a compaction physically removes them.
+
+Full snapshots are written into a staging directory and swapped in as one
+unit (``SnapshotStaging``), so a crash mid-save never leaves a half-written
+snapshot behind.
+"""
+
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_DIR = "deltas"
+STATE_FILE = "delta_state.json"
+TOMBSTONE_FILE = "tombstones.json"
+STAGING_DIR = ".staging"
+COMMIT_MARKER = "COMMIT"
+_SEGMENT_RE = re.compile(r"^segment-(\d+)\.pkl$")
+
+
+class DeltaRecord:
+    """A single document addition captured for the delta log."""
+
+    __slots__ = ("doc_id", "text", "metadata", "vector")
+
+    def __init__(self, doc_id: str, text: str, metadata: Dict, vector: Sequence[float]):
+        self.doc_id = doc_id
+        self.text = text
+        self.metadata = metadata
+        self.vector = vector
+
+
+def segment_payload(
+    records: List[DeltaRecord],
+    deleted_ids: Iterable[str] = (),
+    updates: Optional[Mapping[str, Mapping[str, Any]]] = None,
+) -> Dict:
+    """
+    Serializable form of a change batch, shared by segments and the write-ahead log.
+
+    ``updates`` maps IDs of existing documents to metadata fields to overwrite,
+    e.g. the ``aliases`` of a chunk that absorbed a near-duplicate.
+    """
+    return {
+        "ids": [r.doc_id for r in records],
+        "texts": [r.text for r in records],
+        "metadatas": [r.metadata for r in records],
+        "vectors": np.asarray([r.vector for r in records], dtype=np.float32),
+        "deleted": list(deleted_ids),
+        "updates": {doc_id: dict(fields) for doc_id, fields in (updates or {}).items()},
+    }
+
+
+def payload_records(payload: Dict) -> List[DeltaRecord]:
+    """The additions in a segment payload."""
+    return [
+        DeltaRecord(doc_id, text, metadata, vector)
+        for doc_id, text, metadata, vector in zip(
+            payload["ids"], payload["texts"], payload["metadatas"], payload["vectors"]
+        )
+    ]
+
+
+def update_metadata(docstore: Any, updates: Mapping[str, Mapping[str, Any]]) -> int:
+    """
+    Overwrite metadata fields of stored documents.
+
+    Documents are replaced rather than changed in place, so a snapshot being
+    serialized from a copy of an in-memory docstore never sees a half-updated
+    metadata dict. Unknown IDs are skipped.
+
+    Returns:
+        Number of documents updated
+    """
+    changed: Dict[str, Document] = {}
+    for doc_id, fields in updates.items():
+        doc = docstore.search(doc_id)
+        if isinstance(doc, Document):
+            changed[doc_id] = Document(
+                id=doc_id, page_content=doc.page_content, metadata={**doc.metadata, **fields}
+            )
+    if isinstance(docstore, InMemoryDocstore):
+        # InMemoryDocstore.add refuses existing IDs
+        docstore._dict.update(changed)
+    elif changed:
+        docstore.add(changed)
+    return len(changed)
+
+
+def fsync_dir(path: str) -> None:
+    """Make renames inside a directory durable (no-op where unsupported)."""
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SnapshotStaging:
+    """
+    Writes a full snapshot next to the live one and swaps it in as one unit.
+
+    Files are written into ``PATH/.staging`` (e.g. by ``FAISS.save_local``).
+    ``commit`` fsyncs them, writes a COMMIT marker and renames them over the
+    live files. A crash before the marker leaves the previous snapshot
+    untouched; after it, ``recover_snapshot`` completes the swap on the
+    next load.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.path = os.path.join(index_path, STAGING_DIR)
+        # Leftovers of an earlier save that never committed
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+
+    def commit(self) -> int:
+        """
+        Durably swap the staged files into the index directory.
+
+        Returns:
+            Number of bytes in the committed snapshot
+        """
+        total = 0
+        for name in os.listdir(self.path):
+            with open(os.path.join(self.path, name), "rb") as f:
+                os.fsync(f.fileno())
+                total += os.fstat(f.fileno()).st_size
+        with open(os.path.join(self.path, COMMIT_MARKER), "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        fsync_dir(self.path)
+        _apply_staged(self.index_path, self.path)
+        return total
+
+    def abort(self) -> None:
+        """Discard the staged files; the live snapshot is unchanged."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _apply_staged(index_path: str, staging_path: str) -> None:
+    """Move committed files into place; safe to repeat after a crash."""
+    for name in os.listdir(staging_path):
+        if name != COMMIT_MARKER:
+            os.replace(os.path.join(staging_path, name), os.path.join(index_path, name))
+    fsync_dir(index_path)
+    shutil.rmtree(staging_path, ignore_errors=True)
+
+
+def recover_snapshot(index_path: str) -> Optional[bool]:
+    """
+    Finish or discard a full snapshot interrupted by a crash.
+
+    Returns:
+        True if a committed snapshot was rolled forward, False if an
+        uncommitted one was discarded, None if there was nothing to recover
+    """
+    staging_path = os.path.join(index_path, STAGING_DIR)
+    if not os.path.isdir(staging_path):
+        return None
+    if os.path.exists(os.path.join(staging_path, COMMIT_MARKER)):
+        _apply_staged(index_path, staging_path)
+        logger.warning(f"Completed a snapshot of {index_path} interrupted by a crash")
+        return True
+    shutil.rmtree(staging_path, ignore_errors=True)
+    logger.warning(f"Discarded an incomplete snapshot of {index_path}")
+    return False
+
+
+class DeltaLog:
+    """
+    Reads and writes delta segments for one index directory.
+
+    Layout inside ``index_path``::
+
+        index.faiss / index.pkl   base snapshot written by save_local
+        delta_state.json          highest segment folded into the base
+        tombstones.json           deleted IDs still present in the base
+        deltas/segment-N.pkl      additions, deletions and metadata updates made
+                                  after the snapshot
+        .staging/                 full snapshot being written (see SnapshotStaging)
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.segment_dir = os.path.join(index_path, SEGMENT_DIR)
+        self.state_path = os.path.join(index_path, STATE_FILE)
+
+    def has_base(self) -> bool:
+        """Check whether a base snapshot exists on disk."""
+        return os.path.exists(os.path.join(self.index_path, "index.faiss"))
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"compacted_through": 0}
+
+    def compacted_through(self) -> int:
+        """Highest segment number already contained in the base snapshot."""
+        return int(self._read_state().get("compacted_through", 0))
+
+    def _all_segments(self) -> List[Tuple[int, str]]:
+        if not os.path.isdir(self.segment_dir):
+            return []
+        segments = []
+        for name in os.listdir(self.segment_dir):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(self.segment_dir, name)))
+        return sorted(segments)
+
+    def pending_segments(self) -> List[Tuple[int, str]]:
+        """Segments that still need to be replayed on top of the base snapshot."""
+        done = self.compacted_through()
+        return [(seq, path) for seq, path in self._all_segments() if seq > done]
+
+    def pending_count(self) -> int:
+        """Number of segments not yet folded into the base snapshot."""
+        return len(self.pending_segments())
+
+    def last_sequence(self) -> int:
+        """Highest segment number written so far."""
+        segments = self._all_segments()
+        return max(segments[-1][0] if segments else 0, self.compacted_through())
+
+    def append(
+        self,
+        records: List[DeltaRecord],
+        deleted_ids: Iterable[str] = (),
+        updates: Optional[Mapping[str, Mapping[str, Any]]] = None,
+    ) -> int:
+        """
+        Write records, deleted document IDs and metadata updates as a new segment.
+
+        The segment is written to a temporary file and renamed into place so
+        a crash never leaves a partially written segment behind.
+
+        Returns:
+            The sequence number of the new segment
+        """
+        os.makedirs(self.segment_dir, exist_ok=True)
+        seq = self.last_sequence() + 1
+        payload = segment_payload(records, deleted_ids, updates)
+        final_path = self.segment_path(seq)
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+        return seq
+
+    def segment_path(self, seq: int) -> str:
+        """Path of the segment with sequence number ``seq``."""
+        return os.path.join(self.segment_dir, f"segment-{seq:08d}.pkl")
+
+    def mark_compacted(self, through_seq: int) -> None:
+        """
+        Record that the base snapshot contains every segment up to ``through_seq``
+        and delete those segments.
+        """
+        self.write_state(through_seq)
+        self.remove_compacted(through_seq)
+
+    def write_state(self, through_seq: int, directory: Optional[str] = None) -> None:
+        """
+        Atomically record the highest segment contained in the base snapshot.
+
+        ``directory`` writes the state file elsewhere, e.g. into a staged snapshot.
+        """
+        final_path = os.path.join(directory, STATE_FILE) if directory else self.state_path
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"compacted_through": through_seq}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+
+    def remove_compacted(self, through_seq: int) -> None:
+        """Delete segments already folded into the base snapshot."""
+        for seq, path in self._all_segments():
+            if seq <= through_seq:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Could not remove compacted segment {path}: {e}")
+
+    def tombstones(self) -> Set[str]:
+        """IDs deleted in the base snapshot or in any pending segment."""
+        try:
+            with open(os.path.join(self.index_path, TOMBSTONE_FILE), "r", encoding="utf-8") as f:
+                deleted = set(json.load(f))
+        except FileNotFoundError:
+            deleted = set()
+        for _, path in self.pending_segments():
+            deleted.update(self.read_segment(path).get("deleted", ()))
+        return deleted
+
+    def write_tombstones(self, deleted_ids: Iterable[str], directory: Optional[str] = None) -> None:
+        """Atomically record the deleted IDs still present in the base snapshot."""
+        final_path = os.path.join(directory or self.index_path, TOMBSTONE_FILE)
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sorted(deleted_ids), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+
+    @staticmethod
+    def read_segment(path: str) -> Dict:
+        """Load a segment payload from disk."""
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def replay(self, index: FAISS, segments: Optional[List[Tuple[int, str]]] = None) -> int:
+        """
+        Apply pending segments to an index loaded from the base snapshot.
+
+        Deleted documents are not removed here; ``tombstones()`` lists them so
+        the persistence manager can filter them out. Metadata updates are
+        written to the index's docstore.
+
+        Returns:
+            Number of documents replayed
+        """
+        known_ids = set(index.index_to_docstore_id.values())
+        replayed = 0
+        for seq, path in segments if segments is not None else self.pending_segments():
+            payload = self.read_segment(path)
+            # A crash between writing the base snapshot and updating the state
+            # file can leave segments whose documents are already in the base.
+            keep = [i for i, doc_id in enumerate(payload["ids"]) if doc_id not in known_ids]
+            if keep:
+                index.add_embeddings(
+                    text_embeddings=[
+                        (payload["texts"][i], payload["vectors"][i].tolist()) for i in keep
+                    ],
+                    metadatas=[payload["metadatas"][i] for i in keep],
+                    ids=[payload["ids"][i] for i in keep],
+                )
+                known_ids.update(payload["ids"][i] for i in keep)
+                replayed += len(keep)
+                logger.debug(f"Replayed delta segment {seq} ({len(keep)} documents)")
+            # Segments written before metadata updates existed have no such key
+            update_metadata(index.docstore, payload.get("updates", {}))
+        return replayed
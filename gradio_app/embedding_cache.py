@@ -0,0 +1,249 @@
+"""
+Content-addressed Embedding Cache
+
+Embedding is the slowest and most expensive step of building or growing the
+index. This module wraps any LangChain ``Embeddings`` object with an on-disk
+cache keyed by (model name, text hash), so rebuilding the index or uploading
+the same content again only embeds text that has not been seen before.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    # Fallback for direct execution
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_LOOKUPS = REGISTRY.counter(
+    "rag_embedding_cache_lookups_total", "Texts looked up in the embedding cache", ["result"]
+)
+_HITS = _LOOKUPS.labels(result="hit")
+_MISSES = _LOOKUPS.labels(result="miss")
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    """Best-effort identifier for the model behind an embeddings object."""
+    for attr in ("model_name", "model"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(embeddings).__name__
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several search queries as queries.
+
+    Uses the model's own batched ``embed_queries`` if it has one and calls
+    ``embed_query`` per text otherwise. ``embed_documents`` is no substitute:
+    instruction-tuned models embed queries differently, so a query would get
+    other neighbours depending on whether it happened to share a batch.
+    """
+    batched = getattr(embeddings, "embed_queries", None)
+    if batched is not None:
+        return batched(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class EmbeddingStore:
+    """
+    SQLite-backed vector store with size-bounded LRU eviction.
+
+    Each row holds one float32 vector. A monotonically increasing access
+    counter records recency, and the least recently used rows are evicted
+    once the stored vectors exceed ``max_bytes``.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0), COALESCE(MAX(last_used), 0)"
+            " FROM embeddings"
+        ).fetchone()
+        self._size_bytes, self._clock = int(row[0]), int(row[1])
+        self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Look up vectors for keys in batches and mark the hits as recently used."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._clock += 1
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        """Store vectors and evict least recently used rows if over budget."""
+        if not items:
+            return
+        with self._lock:
+            self._clock += 1
+            rows = [
+                (key, np.asarray(vector, dtype=np.float32).tobytes(), self._clock)
+                for key, vector in items.items()
+            ]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._size_bytes += sum(len(blob) for _, blob, _ in rows)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Delete the least recently used rows until under 90% of the budget."""
+        target = int(self.max_bytes * 0.9)
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        doomed = []
+        cursor = self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used ASC"
+        )
+        for key, size in cursor:
+            if self._size_bytes <= target:
+                break
+            doomed.append((key,))
+            self._size_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        logger.info(f"Evicted {len(doomed)} embeddings from cache {self.path}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves previously seen texts from an EmbeddingStore.
+
+    Only cache misses are sent to the wrapped model, in a single batched call.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        store: EmbeddingStore,
+        model_name: Optional[str] = None,
+    ):
+        self.underlying = underlying
+        self.store = store
+        self.model_name = model_name or embedding_model_name(underlying)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str, kind: str = "doc") -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, reusing cached vectors for content already seen."""
+        keys = [self._key(text) for text in texts]
+        cached = self.store.get_many(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(fresh)
+            cached.update(fresh)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        _HITS.inc(len(texts) - len(missing))
+        _MISSES.inc(len(missing))
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing a cached vector if available."""
+        key = self._key(text, kind="query")
+        cached = self.store.get_many([key])
+        if key in cached:
+            self.hits += 1
+            _HITS.inc()
+            return cached[key]
+        self.misses += 1
+        _MISSES.inc()
+        vector = self.underlying.embed_query(text)
+        self.store.put_many({key: vector})
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries, embedding only the uncached ones in one call.
+
+        Misses go to the model's own ``embed_queries`` if it has one, and to
+        ``embed_query`` one at a time otherwise; never to ``embed_documents``,
+        whose vectors differ from query vectors for instruction-tuned models.
+        """
+        keys = [self._key(text, kind="query") for text in texts]
+        cached = self.store.get_many(list(dict.fromkeys(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = embed_queries(self.underlying, list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(fresh)
+            cached.update(fresh)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        _HITS.inc(len(texts) - len(missing))
+        _MISSES.inc(len(missing))
+        return [list(cached[key]) for key in keys]
@@ -1,5 +1,9 @@
 import os
-from typing import Dict, Optional
+import threading
+from dataclasses import replace
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import (
     OpenAIEmbeddings,
@@ -9,13 +13,29 @@ from langchain_community.embeddings import (
 # Import the persistence manager
 try:
     from .persistence_manager import BatchedPersistenceManager
+    from .delta_log import DeltaLog, SnapshotStaging, recover_snapshot
+    from .readonly_index import load_mmap_index
+    from .embedding_cache import CachedEmbeddings, EmbeddingStore, embed_queries
+    from .index_spec import IndexSpec
+    from .metadata_filter import FILTER_FIELDS
+    from .write_ahead_log import WriteAheadLog
+    from .sqlite_docstore import DOCSTORE_BACKENDS, SqliteDocstore, move_to_sqlite
+    from .rerank import FloatVectorFile
 except ImportError:
     # Fallback for direct execution
     from persistence_manager import BatchedPersistenceManager
+    from delta_log import DeltaLog, SnapshotStaging, recover_snapshot
+    from readonly_index import load_mmap_index
+    from embedding_cache import CachedEmbeddings, EmbeddingStore, embed_queries
+    from index_spec import IndexSpec
+    from metadata_filter import FILTER_FIELDS
+    from write_ahead_log import WriteAheadLog
+    from sqlite_docstore import DOCSTORE_BACKENDS, SqliteDocstore, move_to_sqlite
+    from rerank import FloatVectorFile
 
 
-def get_embeddings(use_openai: bool = True):
-    """Return embeddings instance using OpenAI or a local model."""
+def _load_embeddings(use_openai: bool):
+    """Instantiate the OpenAI or local HuggingFace embeddings model."""
     if use_openai:
         return OpenAIEmbeddings()
 
@@ -30,6 +50,93 @@ def get_embeddings(use_openai: bool = True):
         return OpenAIEmbeddings()
 
 
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings that create the underlying model on first use.
+
+    Loading an existing index does not need the model, so the (slow) model
+    load moves to the first query, or to a warm-up in the background.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._embeddings: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._embeddings is not None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """The underlying embeddings, created on first access."""
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._factory()
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return embed_queries(self.embeddings, texts)
+
+
+def get_embeddings(
+    use_openai: bool = True,
+    cache_path: Optional[str] = None,
+    cache_max_mb: int = 1024,
+    lazy: bool = False,
+):
+    """
+    Return embeddings instance using OpenAI or a local model.
+
+    Args:
+        use_openai: Whether to use OpenAI embeddings
+        cache_path: Optional SQLite file caching vectors by (model, text hash)
+        cache_max_mb: Size limit of the cache before LRU eviction (megabytes)
+        lazy: Defer creating the model (and cache) until the first embedding
+    """
+    if lazy:
+        return LazyEmbeddings(lambda: get_embeddings(use_openai, cache_path, cache_max_mb))
+    embeddings = _load_embeddings(use_openai)
+    if cache_path:
+        store = EmbeddingStore(cache_path, max_bytes=cache_max_mb * 1024 * 1024)
+        return CachedEmbeddings(embeddings, store)
+    return embeddings
+
+
+def build_index(
+    embeddings,
+    texts: Sequence[str],
+    vectors: Sequence[Sequence[float]],
+    metadatas: Sequence[dict],
+    spec: IndexSpec,
+    ids: Optional[List[str]] = None,
+) -> FAISS:
+    """
+    Create a FAISS vector store of the spec's index type holding embedded texts.
+
+    Args:
+        embeddings: Embeddings used for later queries and additions
+        texts: Document texts
+        vectors: Embeddings of ``texts``; IVF/PQ indexes are trained on them
+        metadatas: Metadata for each text
+        spec: Index type to build
+        ids: Optional document IDs (generated when omitted)
+
+    Returns:
+        In-memory FAISS vector store
+    """
+    index = FAISS(embeddings, spec.build(vectors), InMemoryDocstore(), {})
+    index.add_embeddings(zip(texts, vectors), metadatas=list(metadatas), ids=ids)
+    return index
+
+
 def load_or_build_index(
     docs: Dict[str, str],
     path: Optional[str] = None,
@@ -38,6 +145,25 @@ def load_or_build_index(
     batch_size: int = 5,
     max_wait_time: float = 30.0,
     auto_persist: bool = True,
+    compact_every: int = 8,
+    mmap: bool = False,
+    embedding_cache: Optional[str] = None,
+    index_spec: Optional[IndexSpec] = None,
+    lexical_index: bool = False,
+    purge_threshold: float = 0.2,
+    dedup: Optional[str] = None,
+    dedup_threshold: float = 0.9,
+    filter_fields: Iterable[str] = FILTER_FIELDS,
+    embeddings=None,
+    index: Optional[FAISS] = None,
+    lazy_embeddings: bool = False,
+    max_batch_size: Optional[int] = None,
+    save_budget: float = 0.1,
+    max_unsaved: Optional[int] = None,
+    backpressure: str = "block",
+    wal: bool = True,
+    snapshot_mode: str = "thread",
+    docstore: str = "memory",
 ) -> BatchedPersistenceManager:
     """
     Load FAISS index from path or build a new one from docs.
@@ -49,38 +175,150 @@ def load_or_build_index(
         batch_size: Number of documents to accumulate before persisting
         max_wait_time: Maximum time to wait before persisting (seconds)
         auto_persist: Whether to automatically persist based on batch_size/time
+        compact_every: Number of delta segments to accumulate before they are
+            folded into the base snapshot
+        mmap: Memory-map the saved index read-only and load the docstore
+            lazily, so worker processes share one copy through the page cache
+        embedding_cache: Optional SQLite file caching embeddings so rebuilds
+            and repeat uploads skip text that was already embedded
+        index_spec: FAISS index type and vector storage to build (Flat, IVF,
+            PQ, HNSW; float32, float16 or int8). When an existing index is
+            loaded its persisted spec is used, and only the query-time
+            parameters (nprobe / ef_search / rerank) given here override it
+        lexical_index: Maintain a BM25 index next to the vector index for
+            hybrid and keyword retrieval
+        purge_threshold: Fraction of deleted vectors at which compaction
+            removes them from the index
+        dedup: Near-duplicate policy for new chunks ("reject", "merge" or None)
+        dedup_threshold: Shingle similarity at which chunks are near-duplicates
+        filter_fields: Metadata fields that searches can filter on inside FAISS
+        embeddings: Embeddings to use instead of creating them, e.g. one model
+            shared by several shards
+        index: Vector store to use when nothing is saved at ``path`` yet,
+            instead of building one from ``docs``
+        lazy_embeddings: Create the embedding model on first use rather than
+            now; loading a saved index then never waits for the model
+        max_batch_size: Upper bound of the adaptive save batch size
+        save_budget: Target fraction of wall time spent saving; slower saves
+            make the persistence thread wait for larger batches
+        max_unsaved: Unsaved changes at which ``backpressure`` applies
+        backpressure: "block", "reject" or "memory" (see BatchedPersistenceManager)
+        wal: Log every change before acknowledging it so a crash between
+            saves loses nothing; the log is replayed on the next load
+        snapshot_mode: "thread" or "fork"; "fork" writes full snapshots from
+            a child process so request threads keep the GIL
+        docstore: "memory" keeps document text in RAM (LangChain's
+            InMemoryDocstore); "sqlite" keeps it in ``docstore.sqlite`` and
+            reads only the documents a search returns. An existing in-memory
+            docstore is moved to SQLite when "sqlite" is requested
 
     Returns:
         BatchedPersistenceManager wrapping the FAISS index
     """
-    embeddings = get_embeddings(use_openai)
+    if docstore not in DOCSTORE_BACKENDS:
+        raise ValueError(f"docstore must be one of {DOCSTORE_BACKENDS}")
+    if embeddings is None:
+        embeddings = get_embeddings(
+            use_openai, cache_path=embedding_cache, lazy=lazy_embeddings
+        )
+    spec = replace(index_spec) if index_spec else IndexSpec()
+
+    # A mapped index is read-only, so pending delta segments cannot be replayed
+    read_only = bool(mmap and path)
+    exists = bool(path) and os.path.exists(path)
+    if exists and read_only and (DeltaLog(path).pending_count() or WriteAheadLog(path).last_lsn):
+        print("Warning: index has uncompacted delta segments; loading it into memory")
+        read_only = False
+    if exists and not read_only:
+        # Finish an interrupted snapshot and turn logged changes into a segment
+        recover_snapshot(path)
+        recovered = WriteAheadLog(path).recover(DeltaLog(path))
+        if recovered:
+            print(f"Recovered {recovered} changes from the write-ahead log")
+    exists = exists and DeltaLog(path).has_base()
 
     # Try to load existing index
-    if path and os.path.exists(path):
+    if read_only and exists:
+        index = load_mmap_index(path, embeddings)
+    elif exists:
         index = FAISS.load_local(
             path,
             embeddings,
             allow_dangerous_deserialization=True,
         )
+        if isinstance(index.docstore, SqliteDocstore):
+            index.docstore.bind(path)
+        # Replay documents saved as delta segments since the last snapshot
+        replayed = DeltaLog(path).replay(index)
+        if replayed:
+            print(f"Replayed {replayed} documents from delta segments")
     else:
-        # Build new index from docs
-        texts = list(docs.values())
-        metadatas = [{"title": t} for t in docs]
-        index = FAISS.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metadatas,
-        )
+        vectors = None
+        if index is None:
+            # Build new index from docs
+            texts = list(docs.values())
+            metadatas = [{"title": t} for t in docs]
+            vectors = embeddings.embed_documents(texts)
+            index = build_index(embeddings, texts, vectors, metadatas, spec)
 
         # Save initial index if path is provided
         if path:
-            index.save_local(path)
+            os.makedirs(path, exist_ok=True)
+            if docstore == "sqlite":
+                move_to_sqlite(index, path)
+            staging = SnapshotStaging(path)
+            index.save_local(staging.path)
+            spec.save(staging.path)
+            staging.commit()
+            if spec.rerank and vectors is not None:
+                # Full-precision copy for re-ranking; the manager keeps it in step
+                FloatVectorFile(path, index.index.d).append(vectors)
+            if read_only:
+                index = load_mmap_index(path, embeddings)
+
+    # Apply query-time parameters; explicit ones override the persisted spec
+    spec = (IndexSpec.load(path) if path else None) or spec
+    if index_spec is not None:
+        spec.nprobe = index_spec.nprobe or spec.nprobe
+        spec.ef_search = index_spec.ef_search or spec.ef_search
+        spec.rerank = index_spec.rerank or spec.rerank
+    spec.apply_search_params(index.index)
+
+    # Documents of an index saved with an in-memory docstore move on request;
+    # the compaction below drops them from index.pkl
+    migrate = (
+        docstore == "sqlite"
+        and bool(path)
+        and not read_only
+        and not isinstance(index.docstore, SqliteDocstore)
+    )
+    if migrate:
+        move_to_sqlite(index, path)
+        print(f"Moved the docstore of {path} to SQLite")
 
     # Wrap in persistence manager
-    return BatchedPersistenceManager(
+    manager = BatchedPersistenceManager(
         index=index,
         index_path=path,
         batch_size=batch_size,
         max_wait_time=max_wait_time,
         auto_persist=auto_persist,
+        compact_every=compact_every,
+        read_only=read_only,
+        lexical_index=lexical_index,
+        purge_threshold=purge_threshold,
+        dedup=dedup,
+        dedup_threshold=dedup_threshold,
+        filter_fields=filter_fields,
+        max_batch_size=max_batch_size,
+        save_budget=save_budget,
+        max_unsaved=max_unsaved,
+        backpressure=backpressure,
+        wal=wal,
+        snapshot_mode=snapshot_mode,
+        rerank=spec.rerank,
+        index_spec=spec,
     )
+    if migrate:
+        manager.compact()
+    return manager
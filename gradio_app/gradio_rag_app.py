@@ -1,13 +1,40 @@
 import os
 import argparse
-import gradio as gr
-import openai
-from faiss_helper import load_or_build_index, BatchedPersistenceManager
-import json
-from langchain_core.documents import Document
-from typing import Optional
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from startup import PROCESS_START, BackgroundLoader, StartupTimer
+from lexical_index import is_identifier_query, reciprocal_rank_fusion
+from context_packing import DEFAULT_CONTEXT_BUDGET, TokenUsageLedger, pack_context
+from streaming_chat import (
+    DEFAULT_MAX_CONCURRENT_CHATS,
+    LLM_COMPLETION_SECONDS,
+    StreamingChatClient,
+    record_token_usage,
+)
+from metrics import REGISTRY, start_metrics_server
+from query_batching import DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH, QueryCoalescer
+from tokens import get_tokenizer
+from defaults import (
+    DEFAULT_CHUNK_TOKENS,
+    DEFAULT_EMBED_BATCH_SIZE,
+    DEFAULT_OVERLAP_TOKENS,
+    FILTER_FIELDS,
+    INDEX_ALIASES,
+)
+from typing import TYPE_CHECKING, Optional, Union
 import atexit
 
+# gradio, openai, FAISS, numpy and LangChain are slow to import; everything
+# that needs them is imported on first use so the app (and its index load)
+# start sooner. Names the command line shows come from defaults.py.
+if TYPE_CHECKING:
+    from answer_cache import SemanticAnswerCache
+    from index_registry import IndexRegistry
+    from persistence_manager import BatchedPersistenceManager
+    from sharded_index import ShardedIndexManager
+
 # -- tiny "vector store" (dict of doc: context). Replace with real DB later --
 DOCS = {
     "What is RAG?": (
@@ -19,237 +46,598 @@ DOCS = {
     ),
 }
 
-openai.api_key = os.getenv("OPENAI_API_KEY", "sk-...")
+# Global FAISS index with persistence manager, set once the background load finishes
+INDEX: Optional[Union["BatchedPersistenceManager", "ShardedIndexManager"]] = None
+INDEX_LOADER: Optional[BackgroundLoader] = None
+
+# Named per-course / per-tenant indexes loaded on demand (--index, --index-root)
+INDEXES: Optional["IndexRegistry"] = None
+
+# Seconds a request waits for an index that is still loading
+INDEX_WAIT_TIMEOUT = 120.0
+
+# Per-phase startup timing
+STARTUP = StartupTimer()
+
+# End-to-end retrieval latency; index, cache and LLM metrics live in their modules
+RETRIEVE_SECONDS = REGISTRY.histogram(
+    "rag_retrieve_seconds", "Time to retrieve documents for a question, end to end"
+)
+
+# "vector", "hybrid" (BM25 + vector with rank fusion) or "lexical"
+RETRIEVAL_MODE = "vector"
+
+# Embeds concurrent questions in shared batches (None embeds each on its own)
+QUERY_COALESCER: Optional[QueryCoalescer] = None
+
+# Optional semantic cache of chat answers (enabled with --answer-cache)
+ANSWER_CACHE: Optional["SemanticAnswerCache"] = None
 
-# Global FAISS index with persistence manager
-INDEX: Optional[BatchedPersistenceManager] = None
+# Token budget for retrieved context in chat prompts, and running token totals
+CONTEXT_BUDGET = DEFAULT_CONTEXT_BUDGET
+TOKEN_USAGE = TokenUsageLedger()
+
+# Async streaming chat client (None falls back to the blocking chat())
+CHAT_CLIENT: Optional[StreamingChatClient] = None
+
+# Chunking and embedding settings for uploaded documents
+INGESTION_CONFIG = {
+    "chunk_tokens": DEFAULT_CHUNK_TOKENS,
+    "overlap_tokens": DEFAULT_OVERLAP_TOKENS,
+    "embed_batch_size": DEFAULT_EMBED_BATCH_SIZE,
+}
 
 
 def cleanup_index():
     """Cleanup function to ensure index is saved on exit."""
     if INDEX and hasattr(INDEX, "shutdown"):
         INDEX.shutdown()
+    if INDEXES is not None:
+        INDEXES.shutdown()
 
 
 # Register cleanup function
 atexit.register(cleanup_index)
 
 
-def retrieve(query: str, k: int = 1):
+@functools.lru_cache(maxsize=None)
+def _openai():
+    """The openai module, imported and configured on first use."""
+    import openai
+
+    openai.api_key = os.getenv("OPENAI_API_KEY", "sk-...")
+    return openai
+
+
+def get_index(timeout: Optional[float] = INDEX_WAIT_TIMEOUT):
+    """
+    The loaded index, waiting for a background load that is still running.
+
+    Returns:
+        The index manager, or None if no index was configured
+
+    Raises:
+        TimeoutError: If the index is still loading after ``timeout`` seconds
+        RuntimeError: If loading the index failed
+    """
+    if INDEX is None and INDEX_LOADER is not None:
+        return INDEX_LOADER.wait(timeout)
+    return INDEX
+
+
+@contextmanager
+def use_index(index_name: Optional[str] = None, wait: bool = True):
+    """
+    The named index, kept resident while the block runs, or the default index.
+
+    Args:
+        index_name: Name in the INDEXES registry; empty selects the default index
+        wait: Wait for a default index that is still loading; otherwise
+            yield whatever is loaded (possibly None)
+
+    Raises:
+        ValueError: If a name is given but no named indexes are configured,
+            or the name is invalid
+        KeyError: If the registry does not know the name
+    """
+    if not index_name:
+        yield get_index() if wait else INDEX
+        return
+    if INDEXES is None:
+        raise ValueError("No named indexes configured (use --index or --index-root)")
+    with INDEXES.use(index_name) as index:
+        yield index
+
+
+def retrieve_documents(
+    query: str,
+    k: int = 1,
+    metadata_filter: Optional[dict] = None,
+    index_name: Optional[str] = None,
+):
+    """
+    Search an index for relevant documents.
+
+    ``metadata_filter`` restricts vector search inside FAISS and is applied to
+    lexical hits directly. ``index_name`` selects a named index instead of
+    the default one.
+
+    Returns:
+        (query embedding, documents). The embedding is None when the query
+        was answered from the lexical index alone.
+    """
+    with use_index(index_name) as index:
+        if index is None:
+            raise ValueError("FAISS index not initialized")
+        with RETRIEVE_SECONDS.time():
+            return _retrieve(index, query, k, metadata_filter)
+
+
+def _retrieve(index, query: str, k: int, metadata_filter: Optional[dict]):
+    fetch_k = max(4 * k, 20)
+    lexical_docs = []
+    if RETRIEVAL_MODE != "vector":
+        lexical_docs = [doc for doc, _ in index.lexical_search(query, k=fetch_k)]
+        if metadata_filter:
+            from metadata_filter import matches
+
+            lexical_docs = [doc for doc in lexical_docs if matches(doc.metadata, metadata_filter)]
+        # Identifiers and codes are matched exactly by BM25: skip embedding
+        if RETRIEVAL_MODE == "lexical" or (
+            is_identifier_query(query) and len(lexical_docs) >= k
+        ):
+            return None, lexical_docs[:k]
+
+    if QUERY_COALESCER is not None:
+        query_vector = QUERY_COALESCER.embed(index, query)
+    else:
+        query_vector = index.embed_query(query)
+    if RETRIEVAL_MODE == "vector":
+        return query_vector, index.similarity_search_by_vector(
+            query_vector, k=k, metadata_filter=metadata_filter
+        )
+
+    vector_docs = index.similarity_search_by_vector(
+        query_vector, k=fetch_k, metadata_filter=metadata_filter
+    )
+    by_id = {doc.id: doc for doc in lexical_docs + vector_docs}
+    fused = reciprocal_rank_fusion(
+        [[doc.id for doc in vector_docs], [doc.id for doc in lexical_docs]]
+    )
+    return query_vector, [by_id[doc_id] for doc_id in fused[:k]]
+
+
+def retrieve(query: str, k: int = 1, index_name: Optional[str] = None):
     """Search the FAISS index for relevant documents."""
-    if INDEX is None:
-        raise ValueError("FAISS index not initialized")
-    results = INDEX.similarity_search(query, k=k)
+    _, results = retrieve_documents(query, k=k, index_name=index_name)
     return [doc.page_content for doc in results]
 
 
-def process_uploaded_file(file_path) -> str:
-    """Process uploaded file and return its content."""
-    if file_path is None:
-        return "No file uploaded"
+def _with_persistence_status(index, status_msg: str) -> str:
+    """Append the index's persistence status to a user-facing message."""
+    pending_count = index.get_pending_count()
+    is_dirty = index.is_dirty()
 
-    try:
-        # Read file content
-        if file_path.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-        elif file_path.endswith(".json"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                content = json.dumps(data, indent=2)
-        else:
-            # For other file types, try to read as text
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
+    if pending_count > 0:
+        status_msg += f" ({pending_count} chunks pending save)"
+    elif not is_dirty:
+        status_msg += " (saved to disk)"
+    return status_msg
 
-        return content
-    except Exception as e:
-        return f"Error reading file: {str(e)}"
 
+def add_document_to_index(
+    content: str,
+    title: str = "Uploaded Document",
+    replace: bool = False,
+    tenant: Optional[str] = None,
+    index_name: Optional[str] = None,
+) -> str:
+    """
+    Chunk and add a text document to the FAISS index with batched persistence.
 
-def add_document_to_index(content: str, title: str = "Uploaded Document") -> str:
-    """Add a new document to the FAISS index with batched persistence."""
+    With ``replace``, chunks of an earlier document with the same title are
+    deleted. ``tenant`` is stored in the chunks' metadata for filtering.
+    ``index_name`` selects a named index instead of the default one.
+    """
     if not content.strip():
         return "No content to add"
 
-    if INDEX is None:
-        return "Index not initialized"
-    raise ValueError("FAISS index is not initialized")
-
     try:
-        # Create a new document
-        doc = Document(page_content=content, metadata={"title": title})
+        with use_index(index_name) as index:
+            if index is None:
+                return "Index not initialized"
+            from ingestion import ingest_blocks
 
-        # Add to existing index (handles batched persistence automatically)
-        INDEX.add_documents([doc])
+            result = ingest_blocks(
+                index,
+                [content],
+                title,
+                replace=replace,
+                metadata={"tenant": tenant} if tenant else None,
+                **INGESTION_CONFIG,
+            )
+            return _with_persistence_status(
+                index,
+                f"Successfully added document '{title}' to the knowledge base: "
+                f"{result.summary()}",
+            )
+    except Exception as e:
+        return f"Error adding document: {str(e)}"
 
-        # Get persistence status
-        pending_count = INDEX.get_pending_count()
-        is_dirty = INDEX.is_dirty()
 
-        # Provide user feedback about persistence status
-        status_msg = f"Successfully added document '{title}' to the knowledge base"
-        if pending_count > 0:
-            status_msg += f" ({pending_count} documents pending save)"
-        elif not is_dirty:
-            status_msg += " (saved to disk)"
+def add_file_to_index(
+    file_path,
+    title: str = "Uploaded Document",
+    progress=None,
+    replace: bool = False,
+    tenant: Optional[str] = None,
+    index_name: Optional[str] = None,
+) -> str:
+    """
+    Stream an uploaded file into the FAISS index as overlapping chunks.
 
-        return status_msg
+    With ``replace``, chunks of an earlier document with the same title are
+    deleted. ``tenant`` is stored in the chunks' metadata for filtering.
+    ``index_name`` selects a named index instead of the default one.
+    """
+    if file_path is None:
+        return "No file uploaded"
+
+    try:
+        with use_index(index_name) as index:
+            if index is None:
+                return "Index not initialized"
+            from ingestion import ingest_file
 
+            result = ingest_file(
+                index,
+                file_path,
+                title,
+                progress=progress,
+                replace=replace,
+                metadata={"tenant": tenant} if tenant else None,
+                **INGESTION_CONFIG,
+            )
+            if not result.chunks:
+                return "No content to add"
+            return _with_persistence_status(
+                index,
+                f"Successfully added document '{title}' to the knowledge base: "
+                f"{result.summary()}",
+            )
     except Exception as e:
         return f"Error adding document: {str(e)}"
 
 
-def force_save_index() -> str:
+def delete_document_from_index(title: str, index_name: Optional[str] = None) -> str:
+    """Delete every chunk of the document with the given title."""
+    if not title.strip():
+        return "Please enter the title of the document to delete."
+
+    try:
+        with use_index(index_name) as index:
+            if index is None:
+                return "Index not initialized"
+            deleted = index.delete(titles=[title])
+            if not deleted:
+                return f"No document titled '{title}' found"
+            return _with_persistence_status(index, f"Deleted {deleted} chunks of '{title}'")
+    except Exception as e:
+        return f"Error deleting document: {str(e)}"
+
+
+def force_save_index(index_name: Optional[str] = None) -> str:
     """Force an immediate save of the FAISS index."""
     try:
-        if INDEX is None:
-            return "❌ No index available to save"
-        assert INDEX is not None
-        if hasattr(INDEX, "force_save"):
-            success = INDEX.force_save()
-            if success:
-                return "✅ Index saved successfully to disk"
-            return "❌ Failed to save index"
+        if not index_name and INDEX_LOADER is not None and INDEX_LOADER.status == "loading":
+            return "⏳ Index is still loading"
+        with use_index(index_name, wait=False) as index:
+            if index is not None and hasattr(index, "force_save"):
+                success = index.force_save()
+                if success:
+                    return "✅ Index saved successfully to disk"
+                return "❌ Failed to save index"
         return "❌ No index available to save"
     except Exception as e:
         return f"❌ Error saving index: {str(e)}"
 
 
-def get_index_status() -> str:
+def get_index_status(index_name: Optional[str] = None) -> str:
     """Get the current persistence status of the index."""
     try:
-        if INDEX and hasattr(INDEX, "get_pending_count"):
-            pending = INDEX.get_pending_count()
-            dirty = INDEX.is_dirty()
-            assert INDEX is not None
+        if not index_name:
+            if INDEX_LOADER is not None and INDEX_LOADER.status == "loading":
+                return "⏳ Loading index..."
+            if INDEX_LOADER is not None and INDEX_LOADER.status == "failed":
+                return f"❌ Index failed to load: {INDEX_LOADER.error}"
+        with use_index(index_name, wait=False) as index:
+            if index is None or not hasattr(index, "get_pending_count"):
+                return "❓ Index status unknown"
+            pending = index.get_pending_count()
+            dirty = index.is_dirty()
 
             if not dirty:
-                return "✅ All changes saved"
+                status = "✅ All changes saved"
             elif pending > 0:
-                return f"⏳ {pending} documents pending save"
+                status = f"⏳ {pending} documents pending save"
             else:
-                return "⏳ Changes pending save"
-        else:
-            return "❓ Index status unknown"
+                status = "⏳ Changes pending save"
+        if TOKEN_USAGE.requests:
+            status += f"\n💬 {TOKEN_USAGE.summary()}"
+        return status
     except Exception as e:
         return f"❌ Error checking status: {str(e)}"
 
 
-def chat(query: str, top_k: int):
-    """Chat function that uses dynamic top_k value."""
+def _prepare_chat(query: str, top_k: int, filter_text: str = "", index_name: str = ""):
+    """
+    Retrieve and pack context for a question.
+
+    Args:
+        query: The user's question
+        top_k: Number of documents to retrieve
+        filter_text: Metadata filter such as ``source=notes.txt, tenant=acme``
+        index_name: Named index to search; empty searches the default index
+
+    Returns:
+        (query_vector, docs, cached answer or None, packed context, prompt)
+    """
+    from metadata_filter import parse_filter
+
+    metadata_filter = parse_filter(filter_text) if filter_text else None
+    query_vector, docs = retrieve_documents(
+        query, k=top_k, metadata_filter=metadata_filter, index_name=index_name
+    )
+
+    if ANSWER_CACHE is not None and query_vector is not None:
+        cached = ANSWER_CACHE.lookup(query_vector, docs, top_k)
+        if cached is not None:
+            return query_vector, docs, cached, None, None
+
+    packed = pack_context(docs, CONTEXT_BUDGET)
+    prompt = (
+        "Answer the question using ONLY the context below.\n\n"
+        f"Context:\n{packed.text}\n\nQ: {query}\nA:"
+    )
+    return query_vector, docs, None, packed, prompt
+
+
+def _finish_chat(query_vector, docs, top_k: int, answer: str, packed, usage) -> None:
+    """Record token usage and cache a generated answer."""
+    TOKEN_USAGE.record(
+        packed,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+    )
+    if ANSWER_CACHE is not None and query_vector is not None:
+        ANSWER_CACHE.store(query_vector, docs, top_k, answer)
+
+
+def chat(query: str, top_k: int, filter_text: str = "", index_name: str = ""):
+    """Chat function that uses dynamic top_k value and an optional metadata filter."""
     if not query.strip():
         return "Please enter a question."
 
     try:
-        context = "\n".join(retrieve(query, k=top_k))
-        prompt = (
-            "Answer the question using ONLY the context below.\n\n"
-            f"Context:\n{context}\n\nQ: {query}\nA:"
+        query_vector, docs, cached, packed, prompt = _prepare_chat(
+            query, top_k, filter_text, index_name
         )
-        resp = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
+        if cached is not None:
+            return cached
+
+        with LLM_COMPLETION_SECONDS.labels(mode="sync").time():
+            resp = _openai().ChatCompletion.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+            )
+        answer = resp.choices[0].message.content.strip()
+        usage = getattr(resp, "usage", None)
+        record_token_usage(
+            getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
         )
-        return resp.choices[0].message.content.strip()
+        _finish_chat(
+            query_vector,
+            docs,
+            top_k,
+            answer,
+            packed,
+            {
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+            },
+        )
+        return answer
     except Exception as e:
         return f"Error: {str(e)}"
 
 
-with gr.Blocks(title="🧑‍💻 RAG Chatbot with File Upload") as demo:
-    gr.Markdown("# 🧑‍💻 No‑Code RAG Chatbot (Gradio)")
-    gr.Markdown(
-        "Upload documents to expand the knowledge base and adjust retrieval parameters."
-    )
+async def chat_stream(query: str, top_k: int, filter_text: str = "", index_name: str = ""):
+    """
+    Async chat that yields the growing answer as tokens arrive.
+
+    Retrieval runs in a worker thread so the event loop keeps serving other
+    requests; generation streams through CHAT_CLIENT, whose semaphore caps
+    concurrent generations per process.
+    """
+    if not query.strip():
+        yield "Please enter a question."
+        return
+
+    try:
+        query_vector, docs, cached, packed, prompt = await asyncio.to_thread(
+            _prepare_chat, query, top_k, filter_text, index_name
+        )
+        if cached is not None:
+            yield cached
+            return
+
+        answer = ""
+        usage = {}
+        messages = [{"role": "user", "content": prompt}]
+        async for delta in CHAT_CLIENT.stream(messages, usage):
+            answer += delta
+            yield answer
+
+        answer = answer.strip()
+        _finish_chat(query_vector, docs, top_k, answer, packed, usage)
+        yield answer
+    except Exception as e:
+        yield f"Error: {str(e)}"
 
-    with gr.Row():
-        # Main chat area
-        with gr.Column(scale=3):
-            with gr.Row():
-                inp = gr.Textbox(
-                    label="Ask a question",
-                    placeholder="Enter your question here...",
-                    scale=4,
+
+def build_demo():
+    """Build the Gradio UI (importing gradio here keeps module import fast)."""
+    import gradio as gr
+
+    with gr.Blocks(title="🧑‍💻 RAG Chatbot with File Upload") as demo:
+        gr.Markdown("# 🧑‍💻 No‑Code RAG Chatbot (Gradio)")
+        gr.Markdown(
+            "Upload documents to expand the knowledge base and adjust retrieval parameters."
+        )
+
+        with gr.Row():
+            # Main chat area
+            with gr.Column(scale=3):
+                with gr.Row():
+                    inp = gr.Textbox(
+                        label="Ask a question",
+                        placeholder="Enter your question here...",
+                        scale=4,
+                    )
+                    submit_btn = gr.Button("Submit", scale=1, variant="primary")
+                out = gr.Markdown(label="Answer")
+
+            # Sidebar for controls
+            with gr.Column(scale=1):
+                gr.Markdown("### ⚙️ Controls")
+
+                # Named index every action below applies to; empty is the default index
+                index_choice = gr.Dropdown(
+                    label="Index",
+                    choices=[""] + (INDEXES.names() if INDEXES is not None else []),
+                    value="",
+                    allow_custom_value=INDEXES is not None and INDEXES.root is not None,
+                    visible=INDEXES is not None,
+                    info="Course or tenant knowledge base (empty: default index)",
+                )
+
+                # Top-k parameter
+                top_k_slider = gr.Slider(
+                    minimum=1,
+                    maximum=10,
+                    value=1,
+                    step=1,
+                    label="Top-K Retrieval",
+                    info="Number of documents to retrieve",
                 )
-                submit_btn = gr.Button("Submit", scale=1, variant="primary")
-            out = gr.Markdown(label="Answer")
-
-        # Sidebar for controls
-        with gr.Column(scale=1):
-            gr.Markdown("### ⚙️ Controls")
-
-            # Top-k parameter
-            top_k_slider = gr.Slider(
-                minimum=1,
-                maximum=10,
-                value=1,
-                step=1,
-                label="Top-K Retrieval",
-                info="Number of documents to retrieve",
-            )
 
-            gr.Markdown("### 📁 Upload Documents")
+                metadata_filter_box = gr.Textbox(
+                    label="Metadata Filter",
+                    placeholder="source=notes.txt, uploaded>=2026-01-01",
+                    info=f"Comma-separated conditions on {', '.join(FILTER_FIELDS)}",
+                )
 
-            # File upload
-            file_upload = gr.File(
-                label="Upload Document", file_types=[".txt", ".json"], type="filepath"
-            )
+                gr.Markdown("### 📁 Upload Documents")
 
-            doc_title = gr.Textbox(
-                label="Document Title",
-                placeholder="Enter a title for the document",
-                value="Uploaded Document",
-            )
+                # File upload
+                file_upload = gr.File(
+                    label="Upload Document", file_types=[".txt", ".json"], type="filepath"
+                )
 
-            upload_btn = gr.Button("Add to Knowledge Base", variant="secondary")
-            upload_status = gr.Markdown(label="Upload Status")
+                doc_title = gr.Textbox(
+                    label="Document Title",
+                    placeholder="Enter a title for the document",
+                    value="Uploaded Document",
+                )
 
-            # Persistence controls
-            gr.Markdown("### 💾 Persistence")
+                doc_tenant = gr.Textbox(
+                    label="Tenant (optional)", placeholder="Stored with the chunks for filtering"
+                )
 
-            persistence_status = gr.Markdown(
-                label="Status", value="❓ Index status unknown"
-            )
+                replace_existing = gr.Checkbox(
+                    label="Replace existing document with the same title", value=False
+                )
+
+                upload_btn = gr.Button("Add to Knowledge Base", variant="secondary")
+                delete_btn = gr.Button(
+                    "🗑️ Delete Document With This Title", variant="secondary"
+                )
+                upload_status = gr.Markdown(label="Upload Status")
+
+                # Persistence controls
+                gr.Markdown("### 💾 Persistence")
+
+                persistence_status = gr.Markdown(
+                    label="Status", value="❓ Index status unknown"
+                )
+
+                with gr.Row():
+                    save_btn = gr.Button("💾 Save Now", variant="secondary", scale=1)
+                    refresh_status_btn = gr.Button(
+                        "🔄 Refresh", variant="secondary", scale=1
+                    )
+
+        # Event handlers
+        def handle_upload(file, title, replace, tenant, index_name, progress=gr.Progress()):
+            if file is None:
+                return "Please select a file to upload."
 
-            with gr.Row():
-                save_btn = gr.Button("💾 Save Now", variant="secondary", scale=1)
-                refresh_status_btn = gr.Button(
-                    "🔄 Refresh", variant="secondary", scale=1
+            def report(p):
+                progress(
+                    p.fraction,
+                    desc=f"Embedded {p.chunks_embedded} chunks ({p.chunks_per_second:.1f}/s)",
                 )
 
-    # Event handlers
-    def handle_upload(file, title):
-        if file is None:
-            return "Please select a file to upload."
+            return add_file_to_index(
+                file,
+                title,
+                progress=report,
+                replace=replace,
+                tenant=tenant.strip() or None,
+                index_name=index_name,
+            )
+
+        def handle_delete(title, index_name):
+            return delete_document_from_index(title, index_name)
 
-        content = process_uploaded_file(file)
-        if content.startswith("Error"):
-            return content
+        async def handle_chat(query, top_k, filter_text, index_name):
+            if CHAT_CLIENT is None:
+                yield await asyncio.to_thread(chat, query, int(top_k), filter_text, index_name)
+                return
+            async for partial in chat_stream(query, int(top_k), filter_text, index_name):
+                yield partial
 
-        result = add_document_to_index(content, title)
-        return result
+        def handle_save(index_name):
+            return force_save_index(index_name)
 
-    def handle_chat(query, top_k):
-        return chat(query, int(top_k))
+        def handle_refresh_status(index_name):
+            return get_index_status(index_name)
 
-    def handle_save():
-        return force_save_index()
+        # Connect event handlers
+        # Concurrency is bounded by CHAT_CLIENT's semaphore rather than Gradio's queue
+        chat_inputs = [inp, top_k_slider, metadata_filter_box, index_choice]
+        submit_btn.click(handle_chat, chat_inputs, out, concurrency_limit=None)
+        inp.submit(handle_chat, chat_inputs, out, concurrency_limit=None)
+        upload_btn.click(
+            handle_upload,
+            [file_upload, doc_title, replace_existing, doc_tenant, index_choice],
+            upload_status,
+        )
+        delete_btn.click(handle_delete, [doc_title, index_choice], upload_status)
+        save_btn.click(handle_save, index_choice, persistence_status)
+        refresh_status_btn.click(handle_refresh_status, index_choice, persistence_status)
 
-    def handle_refresh_status():
-        return get_index_status()
+        # Update persistence status on upload, delete and index switch
+        upload_btn.click(handle_refresh_status, index_choice, persistence_status)
+        delete_btn.click(handle_refresh_status, index_choice, persistence_status)
+        index_choice.change(handle_refresh_status, index_choice, persistence_status)
 
-    # Connect event handlers
-    submit_btn.click(handle_chat, [inp, top_k_slider], out)
-    inp.submit(handle_chat, [inp, top_k_slider], out)
-    upload_btn.click(handle_upload, [file_upload, doc_title], upload_status)
-    save_btn.click(handle_save, outputs=persistence_status)
-    refresh_status_btn.click(handle_refresh_status, outputs=persistence_status)
+    return demo
 
-    # Update persistence status on upload
-    upload_btn.click(handle_refresh_status, outputs=persistence_status)
 
 if __name__ == "__main__":
+    STARTUP.record("module imports", PROCESS_START, time.perf_counter() - PROCESS_START)
     parser = argparse.ArgumentParser(
         description="RAG Chatbot with batched FAISS persistence"
     )
@@ -258,6 +646,31 @@ if __name__ == "__main__":
         help="Path to existing FAISS index",
         default=os.getenv("FAISS_INDEX_PATH"),
     )
+    parser.add_argument(
+        "--index",
+        action="append",
+        default=[],
+        metavar="NAME=PATH",
+        help="Named index selectable per request, e.g. --index physics-101=indexes/physics "
+        "(repeatable)",
+    )
+    parser.add_argument(
+        "--index-root",
+        help="Directory of named indexes, one subdirectory each; new names are "
+        "created on first use",
+    )
+    parser.add_argument(
+        "--max-resident-indexes",
+        type=int,
+        default=8,
+        help="Named indexes kept loaded; the least recently used is saved and "
+        "unloaded beyond this (default: 8)",
+    )
+    parser.add_argument(
+        "--max-resident-mb",
+        type=float,
+        help="Optional budget for the summed index file sizes of loaded named indexes",
+    )
     parser.add_argument(
         "--local-model",
         action="store_true",
@@ -282,23 +695,444 @@ if __name__ == "__main__":
         action="store_true",
         help="Disable automatic persistence (save immediately)",
     )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        help="Upper bound of the adaptive save batch size (default: 20 x --batch-size)",
+    )
+    parser.add_argument(
+        "--save-budget",
+        type=float,
+        default=0.1,
+        help="Target fraction of time spent saving; slow saves grow the batch (default: 0.1)",
+    )
+    parser.add_argument(
+        "--max-unsaved",
+        type=int,
+        help="Unsaved changes at which uploads are subject to --backpressure",
+    )
+    parser.add_argument(
+        "--backpressure",
+        choices=["block", "reject", "memory"],
+        default="block",
+        help="At --max-unsaved: wait for saves, reject the upload, or keep changes "
+        "in memory until the next full snapshot (default: block)",
+    )
+    parser.add_argument(
+        "--no-wal",
+        action="store_true",
+        help="Do not log changes before acknowledging them; a crash loses unsaved changes",
+    )
+    parser.add_argument(
+        "--snapshot-mode",
+        choices=["thread", "fork"],
+        default="thread",
+        help="Write full snapshots on the persistence thread or in a forked child "
+        "process that keeps the GIL free for requests (default: thread)",
+    )
+    parser.add_argument(
+        "--docstore",
+        choices=["memory", "sqlite"],
+        default="memory",
+        help="Keep document text in RAM or in docstore.sqlite next to the index, "
+        "read only for search hits (default: memory)",
+    )
+    parser.add_argument(
+        "--compact-every",
+        type=int,
+        default=8,
+        help="Delta segments to accumulate before compacting the snapshot (default: 8)",
+    )
+    parser.add_argument(
+        "--purge-threshold",
+        type=float,
+        default=0.2,
+        help="Fraction of deleted vectors at which compaction removes them from "
+        "the index (default: 0.2)",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Memory-map the saved index read-only so worker processes share it "
+        "(disables uploads)",
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        help="SQLite file caching embeddings by model and text hash",
+        default=os.getenv("EMBEDDING_CACHE_PATH"),
+    )
+
+    # Retrieval configuration
+    parser.add_argument(
+        "--retrieval",
+        choices=["vector", "hybrid", "lexical"],
+        default="vector",
+        help="Retrieval mode; hybrid and lexical maintain a BM25 index next to "
+        "the FAISS index (default: vector)",
+    )
+
+    parser.add_argument(
+        "--query-batch-window-ms",
+        type=float,
+        default=DEFAULT_BATCH_WINDOW * 1000,
+        help="Milliseconds a question waits for concurrent ones to embed them in one "
+        f"batch; 0 disables batching (default: {DEFAULT_BATCH_WINDOW * 1000:g})",
+    )
+    parser.add_argument(
+        "--query-batch-max",
+        type=int,
+        default=DEFAULT_MAX_BATCH,
+        help="Questions at which a batch is embedded without waiting out the window "
+        f"(default: {DEFAULT_MAX_BATCH})",
+    )
+
+    # Near-duplicate detection
+    parser.add_argument(
+        "--dedup",
+        choices=["reject", "merge"],
+        default=None,
+        help="Skip uploaded chunks that near-duplicate indexed ones; merge also "
+        "records the new title as an alias (default: disabled)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.9,
+        help="Estimated shingle Jaccard similarity for near-duplicates (default: 0.9)",
+    )
+
+    # Metadata filtering
+    parser.add_argument(
+        "--filter-fields",
+        default=",".join(FILTER_FIELDS),
+        help="Comma-separated metadata fields searches can filter on "
+        f"(default: {','.join(FILTER_FIELDS)})",
+    )
+
+    # Answer cache configuration
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="Reuse answers for near-identical questions with the same retrieved context",
+    )
+    parser.add_argument(
+        "--answer-cache-threshold",
+        type=float,
+        default=0.95,
+        help="Minimum cosine similarity between queries to reuse an answer (default: 0.95)",
+    )
+    parser.add_argument(
+        "--answer-cache-ttl",
+        type=float,
+        default=3600.0,
+        help="Seconds before a cached answer expires (default: 3600)",
+    )
+    parser.add_argument(
+        "--answer-cache-size",
+        type=int,
+        default=1024,
+        help="Maximum number of cached answers (default: 1024)",
+    )
+
+    parser.add_argument(
+        "--context-budget",
+        type=int,
+        default=DEFAULT_CONTEXT_BUDGET,
+        help="Maximum tokens of retrieved context per chat prompt; lower-ranked "
+        f"passages are trimmed or dropped (default: {DEFAULT_CONTEXT_BUDGET})",
+    )
+
+    # Chat generation configuration
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Use the blocking chat path instead of streaming tokens asynchronously",
+    )
+    parser.add_argument(
+        "--llm-base-url",
+        default=os.getenv("OPENAI_BASE_URL"),
+        help="OpenAI-compatible base URL for streamed chat, e.g. a local "
+        "mock_llm_server.py (default: $OPENAI_BASE_URL or OpenAI)",
+    )
+    parser.add_argument(
+        "--max-concurrent-chats",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_CHATS,
+        help="Maximum answers generated at once by this process "
+        f"(default: {DEFAULT_MAX_CONCURRENT_CHATS})",
+    )
 
+    # Index type configuration
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the index into this many hash-routed shards searched in "
+        "parallel (default: 1; an existing sharded index keeps its count)",
+    )
+    parser.add_argument(
+        "--index-spec",
+        default="flat",
+        help=f"Index type to build: {', '.join(INDEX_ALIASES)} or a faiss "
+        "index_factory string such as 'IVF4096,PQ64' (default: flat)",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        help="Inverted lists searched per query for IVF indexes",
+    )
+    parser.add_argument(
+        "--ef-search",
+        type=int,
+        help="Candidate list size per query for HNSW indexes",
+    )
+    parser.add_argument(
+        "--train-sample-size",
+        type=int,
+        default=100_000,
+        help="Maximum vectors used to train IVF/PQ indexes (default: 100000)",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=["float32", "float16", "int8"],
+        default="float32",
+        help="Vector encoding of a new Flat, IVF-Flat or HNSW index (default: float32)",
+    )
+    parser.add_argument(
+        "--rerank",
+        type=int,
+        default=0,
+        help="Rescore a shortlist of N x k results with exact float32 vectors kept on "
+        "disk; must be set when the index is built (default: 0, off)",
+    )
+
+    # Ingestion configuration
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=DEFAULT_CHUNK_TOKENS,
+        help=f"Maximum tokens per uploaded chunk (default: {DEFAULT_CHUNK_TOKENS})",
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=DEFAULT_OVERLAP_TOKENS,
+        help=f"Tokens shared by consecutive chunks (default: {DEFAULT_OVERLAP_TOKENS})",
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=DEFAULT_EMBED_BATCH_SIZE,
+        help=f"Chunks embedded per model call (default: {DEFAULT_EMBED_BATCH_SIZE})",
+    )
+
+    # Startup
+    parser.add_argument(
+        "--no-background-load",
+        action="store_true",
+        help="Load the index before starting the UI instead of in the background",
+    )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        help="Skip the warm-up embedding, search, tokenizer and LLM client setup",
+    )
+    parser.add_argument(
+        "--warm-up-query",
+        default="warm up",
+        help="Query embedded and searched once after the index loads",
+    )
+    parser.add_argument(
+        "--startup-timings",
+        help="Write the per-phase startup timing breakdown to this JSON file",
+    )
+
+    # Metrics
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics at /metrics and JSON at /metrics.json on this port",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="Interface the metrics endpoint binds (default: 127.0.0.1)",
+    )
     args = parser.parse_args()
 
-    # Initialize INDEX with persistence configuration
-    INDEX = load_or_build_index(
-        DOCS,
-        path=args.faiss,
-        use_openai=not args.local_model,
-        batch_size=args.batch_size,
-        max_wait_time=args.max_wait_time,
-        auto_persist=not args.no_auto_persist,
+    RETRIEVAL_MODE = args.retrieval
+    if args.query_batch_window_ms > 0:
+        QUERY_COALESCER = QueryCoalescer(
+            window=args.query_batch_window_ms / 1000, max_batch=args.query_batch_max
+        )
+    CONTEXT_BUDGET = args.context_budget
+    if not args.no_stream:
+        CHAT_CLIENT = StreamingChatClient(
+            base_url=args.llm_base_url,
+            max_concurrent=args.max_concurrent_chats,
+        )
+    INGESTION_CONFIG.update(
+        chunk_tokens=args.chunk_tokens,
+        overlap_tokens=args.chunk_overlap,
+        embed_batch_size=args.embed_batch_size,
     )
+    if args.answer_cache:
+        import answer_cache
+
+        ANSWER_CACHE = answer_cache.SemanticAnswerCache(
+            similarity_threshold=args.answer_cache_threshold,
+            ttl=args.answer_cache_ttl,
+            max_entries=args.answer_cache_size,
+        )
 
     print("🚀 Starting RAG Chatbot with batched persistence:")
     print(f"   - Batch size: {args.batch_size}")
     print(f"   - Max wait time: {args.max_wait_time}s")
     print(f"   - Auto persist: {not args.no_auto_persist}")
+    print(f"   - Write-ahead log: {'disabled' if args.no_wal else 'enabled'}")
+    print(f"   - Snapshot mode: {args.snapshot_mode}")
+    print(f"   - Docstore: {args.docstore}")
+    if args.max_unsaved:
+        print(f"   - Backpressure: {args.backpressure} at {args.max_unsaved} unsaved changes")
+    print(f"   - Compact every: {args.compact_every} delta segments")
     print(f"   - Index path: {args.faiss or 'In-memory only'}")
+    print(f"   - Embedding cache: {args.embedding_cache or 'disabled'}")
+    print(f"   - Chunking: {args.chunk_tokens} tokens, {args.chunk_overlap} overlap")
+    print(f"   - Retrieval: {RETRIEVAL_MODE}")
+    if QUERY_COALESCER:
+        print(f"   - Query batching: {args.query_batch_window_ms:g} ms window, "
+              f"up to {args.query_batch_max} questions")
+    else:
+        print("   - Query batching: disabled")
+    print(f"   - Near-duplicate detection: {args.dedup or 'disabled'}")
+    print(f"   - Answer cache: {'enabled' if ANSWER_CACHE else 'disabled'}")
+    print(f"   - Context budget: {CONTEXT_BUDGET} tokens")
+    if CHAT_CLIENT:
+        print(f"   - Streaming chat: {args.llm_base_url or 'OpenAI'}, "
+              f"{args.max_concurrent_chats} concurrent")
+    else:
+        print("   - Streaming chat: disabled")
+    if args.index or args.index_root:
+        import index_registry
+
+        paths = {}
+        for entry in args.index:
+            name, sep, path = entry.partition("=")
+            if not sep or not name or not path:
+                parser.error(f"--index expects NAME=PATH, got {entry!r}")
+            paths[name] = path
+        INDEXES = index_registry.IndexRegistry(
+            lambda name, path: open_index(path),
+            paths=paths,
+            root=args.index_root,
+            max_resident=args.max_resident_indexes,
+            max_resident_bytes=(
+                int(args.max_resident_mb * 1024 * 1024) if args.max_resident_mb else None
+            ),
+        )
+        print(f"   - Named indexes: {', '.join(INDEXES.names()) or 'none yet'}, "
+              f"{args.max_resident_indexes} resident")
+    if args.metrics_port is not None:
+        metrics_server, _ = start_metrics_server(args.metrics_host, args.metrics_port)
+        print(f"   - Metrics: {metrics_server.url} (JSON at /metrics.json)")
+
+    def open_index(path: Optional[str]):
+        """Load or build an index at ``path`` with the command line's settings."""
+        from faiss_helper import load_or_build_index
+        from index_spec import IndexSpec
+        from sharded_index import load_or_build_sharded_index, read_shard_count
+
+        sharded = args.shards > 1 or bool(path and read_shard_count(path))
+        load = (
+            functools.partial(
+                load_or_build_sharded_index, shards=args.shards if args.shards > 1 else None
+            )
+            if sharded
+            else load_or_build_index
+        )
+        index = load(
+            DOCS,
+            path=path,
+            use_openai=not args.local_model,
+            batch_size=args.batch_size,
+            max_wait_time=args.max_wait_time,
+            auto_persist=not args.no_auto_persist,
+            max_batch_size=args.max_batch_size,
+            save_budget=args.save_budget,
+            max_unsaved=args.max_unsaved,
+            backpressure=args.backpressure,
+            wal=not args.no_wal,
+            snapshot_mode=args.snapshot_mode,
+            docstore=args.docstore,
+            compact_every=args.compact_every,
+            purge_threshold=args.purge_threshold,
+            dedup=args.dedup,
+            dedup_threshold=args.dedup_threshold,
+            filter_fields=[f.strip() for f in args.filter_fields.split(",") if f.strip()],
+            mmap=args.mmap,
+            embedding_cache=args.embedding_cache,
+            index_spec=IndexSpec(
+                factory=args.index_spec,
+                nprobe=args.nprobe,
+                ef_search=args.ef_search,
+                train_sample_size=args.train_sample_size,
+                storage=args.storage,
+                rerank=args.rerank,
+            ),
+            lexical_index=args.retrieval != "vector",
+            lazy_embeddings=True,
+        )
+        if ANSWER_CACHE is not None:
+            index.add_change_listener(ANSWER_CACHE.invalidate)
+        return index
+
+    def load_index():
+        """Load or build the index configured on the command line."""
+        global INDEX
+        index = INDEX = open_index(args.faiss)
+
+        sharded = hasattr(index, "shards")
+        first_shard = index.shards[0] if sharded else index
+        print("📚 Index loaded:")
+        print(f"   - Index type: {type(first_shard.index.index).__name__}")
+        if sharded:
+            sizes = ", ".join(str(size) for size in index.shard_sizes())
+            print(f"   - Shards: {index.num_shards} ({sizes} vectors)")
+        print(f"   - Read-only mmap: {index.read_only}")
+        print(f"   - Filterable metadata: {', '.join(index.filter_fields)}")
+        return index
+
+    def warm_up_search(index):
+        # Loads the embedding model and pages in the index and docstore
+        query_vector = index.embed_query(args.warm_up_query)
+        index.similarity_search_by_vector(query_vector, k=1)
+
+    def warm_up_chat_client(_):
+        if CHAT_CLIENT is not None:
+            CHAT_CLIENT.client
+        else:
+            _openai()
+
+    INDEX_LOADER = BackgroundLoader("index load", load_index, STARTUP)
+    if not args.no_warm_up:
+        INDEX_LOADER.add_warm_up("embedding + search", warm_up_search)
+        INDEX_LOADER.add_warm_up("tokenizer", lambda _: get_tokenizer())
+        INDEX_LOADER.add_warm_up("chat client", warm_up_chat_client)
+    if args.no_background_load:
+        INDEX_LOADER.run()
+    else:
+        INDEX_LOADER.start()
+
+    with STARTUP.phase("build ui"):
+        demo = build_demo()
+    with STARTUP.phase("launch ui"):
+        demo.launch(prevent_thread_lock=True)
+    STARTUP.mark("ui ready")
 
-    demo.launch()
+    # The full breakdown, including index load and warm-up, once they finish
+    INDEX_LOADER.warmed.wait()
+    STARTUP.mark("startup complete")
+    print(STARTUP.report())
+    if args.startup_timings:
+        STARTUP.save(args.startup_timings)
+    demo.block_thread()
@@ -0,0 +1,253 @@
+"""
+Named Indexes with LRU Residency
+
+The app used to serve exactly one index, so every course or tenant with its
+own knowledge base needed its own process. ``IndexRegistry`` maps index names
+to directories, loads an index on its first request, and keeps at most
+``max_resident`` indexes (and optionally ``max_resident_bytes`` of index
+files) in memory. The least recently used index is shut down when the
+budget is exceeded; shutting down flushes its unsaved changes, so evicting
+never loses data. Indexes in use by a request are never evicted.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    # Fallback for direct execution
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Names become directory names under the registry root
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+# Files whose size approximates the memory a loaded index takes
+_RESIDENT_FILES = ("index.faiss", "index.pkl", "bm25.pkl", "minhash.pkl")
+
+RESIDENT_INDEXES = REGISTRY.gauge("rag_resident_indexes", "Named indexes loaded in memory")
+INDEX_LOADS = REGISTRY.counter("rag_index_loads_total", "Named indexes loaded on first use")
+INDEX_EVICTIONS = REGISTRY.counter(
+    "rag_index_evictions_total", "Named indexes flushed and unloaded to stay within budget"
+)
+
+
+def resident_bytes(path: str) -> int:
+    """Estimate the memory of a loaded index from its snapshot files (all shards)."""
+    total = 0
+    for root, _, names in os.walk(path):
+        total += sum(
+            os.path.getsize(os.path.join(root, name)) for name in names if name in _RESIDENT_FILES
+        )
+    return total
+
+
+class _Entry:
+    __slots__ = ("index", "bytes", "leases", "loaded")
+
+    def __init__(self):
+        self.index: Any = None
+        self.bytes = 0
+        self.leases = 0
+        self.loaded = threading.Event()
+
+
+class IndexRegistry:
+    """
+    Loads named indexes on demand and keeps the most recently used resident.
+
+    Usage:
+        registry = IndexRegistry(load, root="indexes", max_resident=8)
+        with registry.use("physics-101") as index:
+            index.similarity_search("entropy")
+    """
+
+    def __init__(
+        self,
+        load: Callable[[str, str], Any],
+        paths: Optional[Mapping[str, str]] = None,
+        root: Optional[str] = None,
+        max_resident: int = 8,
+        max_resident_bytes: Optional[int] = None,
+    ):
+        """
+        Args:
+            load: ``load(name, path)`` returning an index manager, e.g. a
+                partial of ``load_or_build_index``
+            paths: Explicit index name -> directory mapping
+            root: Directory whose subdirectories are indexes; any valid name
+                not in ``paths`` maps to ``root/name`` and is created on first use
+            max_resident: Most indexes kept in memory at once
+            max_resident_bytes: Optional budget for the summed snapshot file
+                sizes of resident indexes
+        """
+        if max_resident < 1:
+            raise ValueError("max_resident must be at least 1")
+        for name in paths or ():
+            self._check_name(name)
+        self._load = load
+        self.paths = dict(paths or {})
+        self.root = root
+        self.max_resident = max_resident
+        self.max_resident_bytes = max_resident_bytes
+        # Resident (or loading) indexes, least recently used first
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _check_name(name: str) -> None:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid index name {name!r}: use letters, digits, '_', '.' or '-'")
+
+    def path_for(self, name: str) -> str:
+        """
+        Directory of the named index.
+
+        Raises:
+            KeyError: If the name is neither registered nor allowed under ``root``
+        """
+        if name in self.paths:
+            return self.paths[name]
+        self._check_name(name)
+        if self.root is None:
+            raise KeyError(f"Unknown index {name!r}")
+        return os.path.join(self.root, name)
+
+    def names(self) -> List[str]:
+        """Registered names plus indexes already saved under ``root``."""
+        names = set(self.paths)
+        if self.root and os.path.isdir(self.root):
+            names.update(
+                entry for entry in os.listdir(self.root)
+                if _NAME_RE.match(entry) and os.path.isdir(os.path.join(self.root, entry))
+            )
+        return sorted(names)
+
+    def resident(self) -> List[str]:
+        """Names of loaded indexes, least recently used first."""
+        with self._lock:
+            return [name for name, entry in self._entries.items() if entry.index is not None]
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """Yield the named index, loading it if needed; it stays resident meanwhile."""
+        index = self._acquire(name)
+        try:
+            yield index
+        finally:
+            with self._lock:
+                self._entries[name].leases -= 1
+            self._evict()
+
+    def get(self, name: str) -> Any:
+        """
+        The named index without holding it; may be evicted by later requests.
+
+        Prefer ``use`` for anything that writes to the index.
+        """
+        with self.use(name) as index:
+            return index
+
+    def _acquire(self, name: str) -> Any:
+        path = self.path_for(name)
+        with self._lock:
+            entry = self._entries.get(name)
+            loader = entry is None
+            if loader:
+                entry = self._entries[name] = _Entry()
+            entry.leases += 1
+            self._entries.move_to_end(name)
+
+        if loader:
+            try:
+                logger.info(f"Loading index {name!r} from {path}")
+                entry.index = self._load(name, path)
+                entry.bytes = resident_bytes(path)
+                INDEX_LOADS.inc()
+            except BaseException:
+                with self._lock:
+                    del self._entries[name]
+                raise
+            finally:
+                # Wakes requests waiting for this load, also when it failed
+                entry.loaded.set()
+            RESIDENT_INDEXES.set(len(self.resident()))
+            self._evict()
+        else:
+            entry.loaded.wait()
+            if entry.index is None:
+                with self._lock:
+                    entry.leases -= 1
+                raise RuntimeError(f"Loading index {name!r} failed")
+        return entry.index
+
+    def _over_budget(self) -> bool:
+        loaded = [entry for entry in self._entries.values() if entry.index is not None]
+        if len(loaded) > self.max_resident:
+            return True
+        # One index larger than the whole byte budget still stays loaded
+        if self.max_resident_bytes is None or len(loaded) <= 1:
+            return False
+        return sum(entry.bytes for entry in loaded) > self.max_resident_bytes
+
+    def _evict(self) -> None:
+        """Unload least recently used idle indexes until within budget."""
+        while True:
+            with self._lock:
+                if not self._over_budget():
+                    return
+                victim = next(
+                    (
+                        (name, entry) for name, entry in self._entries.items()
+                        if entry.index is not None and entry.leases == 0
+                    ),
+                    None,
+                )
+                if victim is None:
+                    # Everything over budget is in use; retry when released
+                    return
+                name, entry = victim
+                del self._entries[name]
+            self._unload(name, entry.index)
+            INDEX_EVICTIONS.inc()
+            RESIDENT_INDEXES.set(len(self.resident()))
+
+    @staticmethod
+    def _unload(name: str, index: Any) -> None:
+        # Sharded managers return None; single managers report whether all was saved
+        if hasattr(index, "shutdown") and index.shutdown() is False:
+            logger.error(f"Index {name!r} was unloaded with unsaved changes")
+        else:
+            logger.info(f"Unloaded index {name!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident indexes and their estimated sizes, e.g. for a status page."""
+        with self._lock:
+            loaded = {
+                name: entry.bytes
+                for name, entry in self._entries.items()
+                if entry.index is not None
+            }
+        return {
+            "resident": list(loaded),
+            "resident_bytes": sum(loaded.values()),
+            "max_resident": self.max_resident,
+            "max_resident_bytes": self.max_resident_bytes,
+        }
+
+    def shutdown(self) -> None:
+        """Flush and unload every resident index."""
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+        for name, entry in entries:
+            if entry.index is not None:
+                self._unload(name, entry.index)
+        RESIDENT_INDEXES.set(0)
@@ -0,0 +1,200 @@
+"""
+Approximate Nearest Neighbour Index Specifications
+
+``FAISS.from_texts`` always builds an exact flat index whose query time grows
+linearly with the corpus. An ``IndexSpec`` selects a FAISS index type (Flat,
+IVF-Flat, IVF-PQ, HNSW or any ``faiss.index_factory`` string), trains it on a
+sample of the vectors, applies query-time parameters such as ``nprobe`` and
+``efSearch``, and is persisted next to the index so reloads keep the choice.
+``storage`` stores Flat, IVF-Flat and HNSW vectors as float16 or int8 scalar
+codes instead of float32; ``rerank`` then rescores a shortlist exactly (see
+rerank.py).
+
+A corpus too small to train the requested type gets a flat index first. The
+spec remembers the request, and compaction rebuilds the index into the
+requested type once enough vectors exist (``upgrade_due``).
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Optional, Sequence
+
+import faiss
+import numpy as np
+
+try:
+    from .defaults import INDEX_ALIASES
+except ImportError:
+    # Fallback for direct execution
+    from defaults import INDEX_ALIASES
+
+logger = logging.getLogger(__name__)
+
+SPEC_FILE = "index_spec.json"
+
+# Scalar quantizer codes for each vector storage option
+STORAGE_CODECS = {"float32": None, "float16": "SQfp16", "int8": "SQ8"}
+
+# FAISS recommends at least this many training points per IVF centroid
+_POINTS_PER_CENTROID = 39
+
+# PQ trains 256 centroids (8-bit codes) per sub-quantizer and needs a point each
+_PQ_TRAINING_POINTS = 256
+
+
+@dataclass
+class IndexSpec:
+    """
+    Describes which FAISS index to build and how to search it.
+
+    Attributes:
+        factory: Alias from INDEX_ALIASES or a faiss.index_factory string
+        nprobe: Inverted lists visited per query (IVF indexes)
+        ef_search: Candidate list size per query (HNSW indexes)
+        train_sample_size: Maximum number of vectors used for training
+        storage: Vector encoding, "float32", "float16" or "int8"
+        rerank: Shortlist size as a multiple of k that searches rescore with
+            exact float32 vectors; 0 disables re-ranking
+        requested: Index type asked for when ``build`` had to fall back to a
+            flat index because the corpus was too small to train it; None
+            once ``factory`` is what was asked for
+    """
+
+    factory: str = "flat"
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    train_sample_size: int = 100_000
+    storage: str = "float32"
+    rerank: int = 0
+    requested: Optional[str] = None
+
+    def __post_init__(self):
+        if self.storage not in STORAGE_CODECS:
+            raise ValueError(f"storage must be one of {tuple(STORAGE_CODECS)}")
+        if self.rerank < 0:
+            raise ValueError("rerank must be 0 or a positive shortlist factor")
+
+    def _with_storage(self, template: str) -> str:
+        """Swap the float32 vector encoding of a factory string for ``storage``."""
+        codec = STORAGE_CODECS[self.storage]
+        if codec is None or codec in template:
+            return template
+        if template == "Flat":
+            return codec
+        if template.endswith(",Flat"):
+            return template[: -len("Flat")] + codec
+        if re.fullmatch(r"HNSW\d+", template):
+            return f"{template},{codec}"
+        logger.warning(f"{template} sets its own vector encoding; ignoring storage={self.storage}")
+        return template
+
+    def resolve_factory(self, num_vectors: int, dim: int) -> str:
+        """Expand an alias into a concrete index_factory string for this corpus."""
+        template = self._with_storage(INDEX_ALIASES.get(self.factory.lower(), self.factory))
+        nlist = max(
+            1, min(int(4 * math.sqrt(num_vectors)), num_vectors // _POINTS_PER_CENTROID)
+        )
+        m = next((m for m in (dim // 8, dim // 4, dim // 2, 1) if m and dim % m == 0), 1)
+        return template.format(nlist=nlist, m=m)
+
+    @staticmethod
+    def min_training_vectors(factory: str) -> int:
+        """Fewest vectors that can train an index built from a factory string."""
+        needed = 1
+        if "IVF" in factory:
+            needed = _POINTS_PER_CENTROID
+        if "PQ" in factory:
+            needed = max(needed, _PQ_TRAINING_POINTS)
+        return needed
+
+    def upgrade_due(self, num_vectors: int) -> bool:
+        """Whether an index that fell back to flat can now be built as requested."""
+        if self.requested is None:
+            return False
+        requested = INDEX_ALIASES.get(self.requested.lower(), self.requested)
+        return num_vectors >= self.min_training_vectors(requested)
+
+    def build(
+        self, vectors: Sequence[Sequence[float]], num_vectors: Optional[int] = None
+    ) -> faiss.Index:
+        """
+        Create and train an empty FAISS index suited to ``vectors``.
+
+        Vectors are not added; the caller adds them together with their
+        documents. Falls back to an exact flat index when the corpus is too
+        small to train the requested index type, and records the request in
+        ``requested`` so that compaction can rebuild the index later.
+
+        Args:
+            vectors: Training vectors, usually the whole corpus
+            num_vectors: Corpus size when ``vectors`` is only a sample of it
+
+        Raises:
+            ValueError: If ``vectors`` is empty, since the dimension is unknown
+        """
+        data = np.asarray(vectors, dtype=np.float32)
+        if data.size == 0:
+            raise ValueError("Cannot build an index from an empty corpus; add a document first")
+        dim = data.shape[1]
+        num_vectors = num_vectors or len(data)
+        requested = self.factory = self.requested or self.factory
+        self.requested = None
+        factory = self.resolve_factory(num_vectors, dim)
+        fallback = self._with_storage("Flat")
+        if num_vectors < self.min_training_vectors(factory):
+            logger.warning(
+                f"Only {num_vectors} vectors: too few to train {factory}, using {fallback}. "
+                "Compaction rebuilds the index once the corpus is large enough."
+            )
+            factory = fallback
+            self.requested = requested
+
+        index = faiss.index_factory(dim, factory)
+        if not index.is_trained:
+            sample = data
+            if num_vectors > self.train_sample_size:
+                rng = np.random.default_rng(0)
+                sample = data[rng.choice(num_vectors, self.train_sample_size, replace=False)]
+            logger.info(f"Training {factory} on {len(sample)} vectors")
+            try:
+                index.train(sample)
+            except RuntimeError as e:
+                # Not a matter of corpus size, so compaction does not retry it
+                logger.warning(f"Could not train {factory} ({e}), using {fallback}")
+                factory = fallback
+                index = faiss.index_factory(dim, factory)
+                if not index.is_trained:
+                    index.train(sample)
+
+        self.factory = factory
+        self.apply_search_params(index)
+        return index
+
+    def apply_search_params(self, index: faiss.Index) -> None:
+        """Set query-time parameters (nprobe / efSearch) that apply to this index."""
+        params = faiss.ParameterSpace()
+        for name, value in (("nprobe", self.nprobe), ("efSearch", self.ef_search)):
+            if value is None:
+                continue
+            try:
+                params.set_index_parameter(index, name, value)
+            except RuntimeError:
+                logger.warning(f"Index type {self.factory} has no search parameter {name}")
+
+    def save(self, path: str) -> None:
+        """Write the spec next to the index files."""
+        with open(os.path.join(path, SPEC_FILE), "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IndexSpec"]:
+        """Read a persisted spec, or None for indexes saved before specs existed."""
+        try:
+            with open(os.path.join(path, SPEC_FILE), "r", encoding="utf-8") as f:
+                return cls(**json.load(f))
+        except FileNotFoundError:
+            return None
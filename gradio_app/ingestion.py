@@ -0,0 +1,277 @@
+"""
+Streaming Document Ingestion
+
+Turns an uploaded file into retrievable chunks instead of one giant vector:
+the file is read incrementally, split into token-bounded overlapping chunks,
+embedded in fixed-size batches and committed to the index in one update.
+Progress and throughput are reported through an optional callback.
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional
+
+from langchain_core.documents import Document
+
+try:
+    from .defaults import DEFAULT_CHUNK_TOKENS, DEFAULT_EMBED_BATCH_SIZE, DEFAULT_OVERLAP_TOKENS
+    from .tokens import get_tokenizer
+except ImportError:
+    # Fallback for direct execution
+    from defaults import DEFAULT_CHUNK_TOKENS, DEFAULT_EMBED_BATCH_SIZE, DEFAULT_OVERLAP_TOKENS
+    from tokens import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class IngestionProgress:
+    """Snapshot of an ingestion run, passed to progress callbacks."""
+
+    bytes_read: int
+    total_bytes: int
+    chunks_embedded: int
+    elapsed: float
+
+    @property
+    def fraction(self) -> float:
+        """Fraction of the input read so far (0.0 - 1.0)."""
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, self.bytes_read / self.total_bytes)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_embedded / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass
+class IngestionResult:
+    """Summary of a completed ingestion run."""
+
+    title: str
+    chunks: int
+    tokens: int
+    bytes_read: int
+    elapsed: float
+    ids: List[str] = field(default_factory=list)
+    duplicates: int = 0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        summary = (
+            f"{self.chunks} chunks ({self.tokens} tokens, {self.bytes_read / 1024:.1f} KB) "
+            f"in {self.elapsed:.2f}s, {self.chunks_per_second:.1f} chunks/s"
+        )
+        if self.duplicates:
+            summary += f", {self.duplicates} near-duplicate chunks skipped"
+        return summary
+
+
+def iter_file_text(path: str, block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Yield the text of a file in blocks.
+
+    JSON files are parsed and pretty-printed so chunks contain readable
+    key/value pairs; everything else is streamed as UTF-8 text.
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield json.dumps(json.load(f), indent=2)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+def chunk_text_stream(
+    blocks: Iterable[str],
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    tokenizer=None,
+) -> Iterator[str]:
+    """
+    Split streamed text into chunks of at most ``chunk_tokens`` tokens.
+
+    Consecutive chunks share ``overlap_tokens`` tokens so that a passage cut
+    at a chunk boundary is still retrievable from either side. Blocks are cut
+    at the last whitespace so a word is never split between two blocks.
+    """
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+    tokenizer = tokenizer or get_tokenizer()
+    step = chunk_tokens - overlap_tokens
+
+    buffer: list = []
+    fresh = 0  # tokens in the buffer not yet emitted in any chunk
+    carry = ""
+
+    def _drain(final: bool) -> Iterator[str]:
+        nonlocal buffer, fresh
+        while len(buffer) >= chunk_tokens:
+            yield tokenizer.decode(buffer[:chunk_tokens])
+            buffer = buffer[step:]
+            fresh = max(0, len(buffer) - overlap_tokens)
+        if final and fresh > 0:
+            yield tokenizer.decode(buffer)
+            buffer, fresh = [], 0
+
+    for block in blocks:
+        text = carry + block
+        cut = max(text.rfind(" "), text.rfind("\n"))
+        if cut == -1:
+            carry = text
+            continue
+        carry = text[cut + 1:]
+        tokens = tokenizer.encode(text[:cut + 1])
+        buffer.extend(tokens)
+        fresh += len(tokens)
+        yield from _drain(final=False)
+
+    if carry:
+        tokens = tokenizer.encode(carry)
+        buffer.extend(tokens)
+        fresh += len(tokens)
+    yield from _drain(final=True)
+
+
+def ingest_blocks(
+    manager,
+    blocks: Iterable[str],
+    title: str,
+    *,
+    source: Optional[str] = None,
+    total_bytes: int = 0,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    progress: Optional[Callable[[IngestionProgress], None]] = None,
+    replace: bool = False,
+    metadata: Optional[Mapping[str, str]] = None,
+) -> IngestionResult:
+    """
+    Chunk, embed and add streamed text to a BatchedPersistenceManager.
+
+    Chunks are embedded ``embed_batch_size`` at a time while the input is
+    still being read, then all of them are committed in a single
+    ``add_embedded_documents`` call.
+
+    Args:
+        manager: BatchedPersistenceManager receiving the chunks
+        blocks: Iterable of text blocks
+        title: Title stored in every chunk's metadata
+        source: Optional source name (e.g. file name) stored in metadata
+        total_bytes: Size of the input, used for progress fractions
+        chunk_tokens: Maximum tokens per chunk
+        overlap_tokens: Tokens shared by consecutive chunks
+        embed_batch_size: Number of chunks embedded per model call
+        progress: Optional callback invoked after every embedded batch
+        replace: Replace existing documents with the same title instead of
+            adding alongside them
+        metadata: Extra metadata stored in every chunk, e.g. ``{"tenant": "acme"}``
+
+    Returns:
+        IngestionResult with chunk counts and throughput
+    """
+    tokenizer = get_tokenizer()
+    start = time.perf_counter()
+    bytes_read = 0
+
+    def _counted(blocks_in: Iterable[str]) -> Iterator[str]:
+        nonlocal bytes_read
+        for block in blocks_in:
+            bytes_read += len(block.encode("utf-8"))
+            yield block
+
+    documents: List[Document] = []
+    vectors: List[List[float]] = []
+    batch: List[Document] = []
+    tokens = 0
+    chunk_count = 0
+    duplicates = 0
+    uploaded = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def _flush_batch() -> None:
+        nonlocal batch, duplicates
+        if not batch:
+            return
+        # Near-duplicates of indexed chunks are dropped before embedding
+        if getattr(manager, "has_dedup", False):
+            batch, skipped = manager.deduplicate(
+                batch, replacing_titles=[title] if replace else ()
+            )
+            duplicates += len(skipped)
+        if batch:
+            vectors.extend(manager.embed_documents([doc.page_content for doc in batch]))
+            documents.extend(batch)
+        batch = []
+        if progress:
+            progress(IngestionProgress(
+                bytes_read=bytes_read,
+                total_bytes=total_bytes,
+                chunks_embedded=len(documents),
+                elapsed=time.perf_counter() - start,
+            ))
+
+    for chunk in chunk_text_stream(
+        _counted(blocks), chunk_tokens, overlap_tokens, tokenizer
+    ):
+        if not chunk.strip():
+            continue
+        chunk_metadata = {
+            **(metadata or {}), "title": title, "chunk": chunk_count, "uploaded": uploaded
+        }
+        if source:
+            chunk_metadata["source"] = source
+        batch.append(Document(page_content=chunk, metadata=chunk_metadata))
+        chunk_count += 1
+        tokens += len(tokenizer.encode(chunk))
+        if len(batch) >= embed_batch_size:
+            _flush_batch()
+    _flush_batch()
+
+    ids = []
+    if documents and replace:
+        ids = manager.upsert_embedded_documents(documents, vectors)
+    elif documents:
+        ids = manager.add_embedded_documents(documents, vectors)
+    result = IngestionResult(
+        title=title,
+        chunks=len(documents),
+        tokens=tokens,
+        bytes_read=bytes_read,
+        elapsed=time.perf_counter() - start,
+        ids=ids,
+        duplicates=duplicates,
+    )
+    logger.info(f"Ingested '{title}': {result.summary()}")
+    return result
+
+
+def ingest_file(manager, path: str, title: str, **kwargs) -> IngestionResult:
+    """
+    Stream a .txt/.json (or other UTF-8 text) file into the index.
+
+    Accepts the same keyword arguments as ``ingest_blocks``.
+    """
+    return ingest_blocks(
+        manager,
+        iter_file_text(path),
+        title,
+        source=os.path.basename(path),
+        total_bytes=os.path.getsize(path),
+        **kwargs,
+    )
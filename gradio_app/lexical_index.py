@@ -0,0 +1,164 @@
+"""
+In-process BM25 Lexical Index
+
+Dense retrieval misses exact identifiers and rare terms, and every query has
+to be embedded first. ``BM25Index`` is an incrementally updated inverted index
+kept next to the FAISS index; ``reciprocal_rank_fusion`` merges its ranking
+with the vector ranking, and identifier-style queries can be answered from it
+without embedding the query at all.
+"""
+
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+LEXICAL_FILE = "bm25.pkl"
+
+_TERM_RE = re.compile(r"[\w][\w.\-/]*")
+_PART_RE = re.compile(r"[.\-/_]+")
+# Tokens with digits or separators, e.g. ERR-4021, faiss_helper.py, v1.2
+_IDENTIFIER_RE = re.compile(r"^(?=.*[\d_.\-/])[\w.\-/]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case terms of a text.
+
+    Identifiers are indexed whole and by their parts, so ``ERR-4021`` matches
+    queries for either ``err-4021`` or ``4021``.
+    """
+    terms = []
+    for match in _TERM_RE.finditer(text.lower()):
+        term = match.group().strip(".-/")
+        if not term:
+            continue
+        terms.append(term)
+        parts = [p for p in _PART_RE.split(term) if p]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def is_identifier_query(query: str) -> bool:
+    """True if every word of the query looks like an identifier or code."""
+    words = query.split()
+    return bool(words) and all(_IDENTIFIER_RE.match(word) for word in words)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index of term -> {doc_id: term frequency}.
+
+    Not thread-safe by itself; BatchedPersistenceManager guards it with the
+    same reader/writer lock as the FAISS index.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_len
+
+    def doc_ids(self) -> List[str]:
+        """IDs of all indexed documents."""
+        return list(self._doc_len)
+
+    def add_terms(self, doc_id: str, terms: Sequence[str]) -> None:
+        """Index a document from terms produced by ``tokenize``."""
+        if doc_id in self._doc_len:
+            self.remove(doc_id)
+        counts = Counter(terms)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._doc_len[doc_id] = len(terms)
+        self._doc_terms[doc_id] = tuple(counts)
+        self._total_len += len(terms)
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document's text."""
+        self.add_terms(doc_id, tokenize(text))
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a document from the index, if present."""
+        if doc_id not in self._doc_len:
+            return
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+
+    def idf(self, term: str) -> float:
+        n = len(self._doc_len)
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (doc_id, score) pairs, best first."""
+        if not self._doc_len:
+            return []
+        avg_len = self._total_len / len(self._doc_len)
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                score = idf * tf * (self.k1 + 1) / (tf + norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str) -> None:
+        """Atomically write the index to ``path/bm25.pkl``."""
+        write_lexical_bytes(path, pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load ``path/bm25.pkl``, or return an empty index if it does not exist."""
+        try:
+            with open(os.path.join(path, LEXICAL_FILE), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return cls()
+
+
+def write_lexical_bytes(path: str, data: bytes) -> None:
+    """Atomically write a pickled BM25Index into an index directory."""
+    final_path = os.path.join(path, LEXICAL_FILE)
+    tmp_path = final_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]], k: int = 60
+) -> List[Hashable]:
+    """
+    Merge several rankings with Reciprocal Rank Fusion.
+
+    Each item scores ``sum(1 / (k + rank))`` over the rankings it appears in,
+    which needs no calibration between BM25 scores and vector distances.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,287 @@
+"""
+Metadata Filters as FAISS ID Selectors
+
+LangChain's ``filter`` argument post-filters: it over-fetches candidates and
+checks their metadata in Python, so selective filters miss results or get
+slow. ``MetadataIndex`` keeps, for a few indexed fields, the index positions
+of every value. A filter is turned into a packed bitmap over index positions
+and handed to FAISS as an ``IDSelectorBitmap``, so only matching vectors are
+considered inside the ANN search itself. Filters matching only a few vectors
+are answered by an exact scan of those vectors instead, because an
+approximate search (few IVF lists probed, an HNSW walk) may never reach them.
+
+Filters map a field to a value, a list of values (any of them), or a range
+``{"gte": ..., "lt": ...}`` over the field's values (e.g. ISO dates)::
+
+    {"source": "notes.txt", "tenant": ["acme", "globex"], "uploaded": {"gte": "2026-01-01"}}
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+import faiss
+import numpy as np
+
+try:
+    from .defaults import FILTER_FIELDS
+except ImportError:
+    # Fallback for direct execution
+    from defaults import FILTER_FIELDS
+
+# Filters matching at most this many vectors are searched exactly
+EXACT_SEARCH_LIMIT = 4096
+RANGE_OPERATORS = {
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+_CONDITION_RE = re.compile(r"^\s*(\w+)\s*(>=|<=|>|<|=)\s*(.+?)\s*$")
+_OPERATOR_NAMES = {">=": "gte", "<=": "lte", ">": "gt", "<": "lt"}
+
+
+def _value_matches(value: Any, condition: Any) -> bool:
+    if isinstance(condition, Mapping):
+        return value is not None and all(
+            RANGE_OPERATORS[op](value, bound) for op, bound in condition.items()
+        )
+    if isinstance(condition, (list, tuple, set)):
+        return value in condition
+    return value == condition
+
+
+def matches(metadata: Mapping, metadata_filter: Mapping) -> bool:
+    """Check a document's metadata against a filter (used for lexical results)."""
+    return all(
+        _value_matches(metadata.get(field), condition)
+        for field, condition in metadata_filter.items()
+    )
+
+
+def parse_filter(text: str) -> Dict[str, Any]:
+    """
+    Parse a filter typed by a user, e.g. ``source=notes.txt, uploaded>=2026-01-01``.
+
+    Repeating ``field=value`` for the same field matches any of the values.
+    """
+    metadata_filter: Dict[str, Any] = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        match = _CONDITION_RE.match(part)
+        if not match:
+            raise ValueError(f"Cannot parse filter condition '{part.strip()}'")
+        field, operator, value = match.groups()
+        if operator == "=":
+            existing = metadata_filter.get(field)
+            if existing is None:
+                metadata_filter[field] = value
+            elif isinstance(existing, list):
+                existing.append(value)
+            else:
+                metadata_filter[field] = [existing, value]
+        else:
+            bounds = metadata_filter.setdefault(field, {})
+            if not isinstance(bounds, dict):
+                raise ValueError(f"Cannot combine a value and a range for '{field}'")
+            bounds[_OPERATOR_NAMES[operator]] = value
+    return metadata_filter
+
+
+class MetadataIndex:
+    """
+    Index positions of each value of selected metadata fields.
+
+    Positions are kept per value as a sorted array, and packed bitmaps are
+    materialized on demand and cached for frequently filtered values.
+    """
+
+    def __init__(self, fields: Iterable[str] = FILTER_FIELDS, cache_size: int = 256):
+        self.fields = tuple(fields)
+        self.cache_size = cache_size
+        self._positions: Dict[str, Dict[Any, List[int]]] = {f: {} for f in self.fields}
+        self._doc_positions: Dict[str, int] = {}
+        self._arrays: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._bitmaps: "OrderedDict[Tuple[str, Any, int], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, position: int, doc_id: str, metadata: Mapping) -> None:
+        """Record the indexed field values of the vector at ``position``."""
+        with self._lock:
+            self._doc_positions[doc_id] = position
+            for field in self.fields:
+                value = metadata.get(field)
+                if value is None:
+                    continue
+                self._positions[field].setdefault(value, []).append(position)
+                self._arrays.pop((field, value), None)
+
+    def positions_of(self, doc_ids: Iterable[str]) -> List[int]:
+        """Index positions of the given documents."""
+        return [self._doc_positions[d] for d in doc_ids if d in self._doc_positions]
+
+    def values(self, field: str) -> List[Any]:
+        """Distinct values of an indexed field."""
+        return list(self._positions[field])
+
+    def _array(self, field: str, value: Any) -> np.ndarray:
+        key = (field, value)
+        array = self._arrays.get(key)
+        if array is None:
+            array = np.asarray(self._positions[field].get(value, ()), dtype=np.int64)
+            self._arrays[key] = array
+        return array
+
+    def _value_bitmap(self, field: str, value: Any, size: int) -> np.ndarray:
+        """Packed bitmap (LSB first, as FAISS expects) of a value's positions."""
+        key = (field, value, size)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is not None and (field, value) in self._arrays:
+            self._bitmaps.move_to_end(key)
+            return bitmap
+        mask = np.zeros(size, dtype=bool)
+        positions = self._array(field, value)
+        mask[positions[positions < size]] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        self._bitmaps[key] = bitmap
+        while len(self._bitmaps) > self.cache_size:
+            self._bitmaps.popitem(last=False)
+        return bitmap
+
+    def bitmap(self, metadata_filter: Mapping, size: int) -> np.ndarray:
+        """
+        Packed bitmap of the positions matching a filter.
+
+        Values of one field are OR-ed, fields are AND-ed.
+
+        Raises:
+            ValueError: If the filter uses a field that is not indexed
+        """
+        unknown = set(metadata_filter) - set(self.fields)
+        if unknown:
+            raise ValueError(
+                f"Fields {sorted(unknown)} are not indexed for filtering; "
+                f"indexed fields: {list(self.fields)}"
+            )
+        result = np.full((size + 7) // 8, 0xFF, dtype=np.uint8)
+        with self._lock:
+            for field, condition in metadata_filter.items():
+                if isinstance(condition, Mapping):
+                    selected = [
+                        v for v in self._positions[field] if _value_matches(v, condition)
+                    ]
+                elif isinstance(condition, (list, tuple, set)):
+                    selected = list(condition)
+                else:
+                    selected = [condition]
+                field_bits = np.zeros_like(result)
+                for value in selected:
+                    if value in self._positions[field]:
+                        field_bits |= self._value_bitmap(field, value, size)
+                result &= field_bits
+        return result
+
+
+def clear_positions(bitmap: np.ndarray, positions: Iterable[int]) -> None:
+    """Unset the bits of the given positions in a packed bitmap, in place."""
+    positions = np.fromiter(positions, dtype=np.int64)
+    if len(positions):
+        np.bitwise_and.at(
+            bitmap, positions >> 3, ~(np.uint8(1) << (positions & 7).astype(np.uint8))
+        )
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector):
+    """
+    SearchParameters of the right type for ``index`` carrying ``selector``.
+
+    IVF and HNSW indexes reject untyped parameters, so their current nprobe /
+    efSearch are carried over.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    except RuntimeError:
+        pass
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def enable_reconstruction(index: faiss.Index) -> None:
+    """
+    Give an IVF index the direct map it needs to reconstruct vectors by position.
+
+    Building the map changes the index, so call this while nothing searches
+    it: at load, after a build, or before swapping in a rebuilt index.
+    Additions keep the map up to date afterwards.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    if ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+
+def _can_reconstruct(index: faiss.Index) -> bool:
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return True
+    return ivf.direct_map.type != faiss.DirectMap.NoMap
+
+
+def search_bitmap(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    k: int,
+    bitmap: np.ndarray,
+    exact_limit: int = EXACT_SEARCH_LIMIT,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search only the positions set in a packed bitmap.
+
+    Flat indexes and broad filters use an ``IDSelectorBitmap`` inside the
+    index's own search; selective filters on approximate indexes compute
+    exact distances to the matching vectors. IVF indexes need a direct map
+    for that (``enable_reconstruction``); without one they are searched with
+    the selector as well, since a search must never change the index.
+
+    Returns:
+        (distances, labels) shaped like ``index.search`` output
+    """
+    exact = isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+    if not exact and _can_reconstruct(index):
+        bits = np.unpackbits(bitmap, bitorder="little")[:index.ntotal]
+        positions = np.flatnonzero(bits)
+        if len(positions) <= exact_limit:
+            return _exact_subset_search(index, vectors, k, positions)
+
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    return index.search(vectors, k, params=search_parameters(index, selector))
+
+
+def _exact_subset_search(
+    index: faiss.Index, vectors: np.ndarray, k: int, positions: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    distances = np.full((len(vectors), k), np.inf, dtype=np.float32)
+    labels = np.full((len(vectors), k), -1, dtype=np.int64)
+    if not len(positions):
+        return distances, labels
+
+    candidates = index.reconstruct_batch(positions.astype(np.int64))
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        scores = -(vectors @ candidates.T)
+    else:
+        scores = ((vectors[:, None, :] - candidates[None, :, :]) ** 2).sum(axis=2)
+    top = min(k, len(positions))
+    order = np.argsort(scores, axis=1)[:, :top]
+    labels[:, :top] = positions[order]
+    distances[:, :top] = np.take_along_axis(scores, order, axis=1)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        distances[:, :top] = -distances[:, :top]
+    return distances, labels
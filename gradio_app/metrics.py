@@ -0,0 +1,471 @@
+"""
+Latency and Throughput Metrics
+
+A small, dependency-free metrics registry for the retrieval, chat and
+persistence paths: counters, gauges and fixed-bucket histograms, optionally
+split by label values. Recording a value takes one short lock and a bisect,
+so instrumenting hot paths (query embedding, FAISS search) costs on the
+order of a microsecond. ``start_metrics_server`` exposes the registry over
+HTTP in the Prometheus text format (``/metrics``) and as JSON
+(``/metrics.json``); rates such as queries per second follow from the
+histogram counts.
+
+Usage:
+    python gradio_rag_app.py --metrics-port 9100
+    curl http://127.0.0.1:9100/metrics
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from sub-millisecond searches to slow LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0,
+)
+# Upper bounds in bytes, 1 KiB to 4 GiB in powers of four
+SIZE_BUCKETS = tuple(float(1024 * 4 ** i) for i in range(12))
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """
+    Base class for a metric family.
+
+    A metric declared without label names records values itself; otherwise
+    ``labels(...)`` returns the child metric for one combination of values.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def _new_child(self) -> "_Metric":
+        return type(self)(self.name, self.documentation)
+
+    def labels(self, *values: Any, **named: Any) -> "_Metric":
+        """
+        The child metric for a combination of label values.
+
+        Look children up once and keep them where a value is recorded per
+        request; the lookup itself takes the family lock.
+        """
+        if named:
+            values = tuple(named[label] for label in self.label_names)
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+        key = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _series(self) -> List[Tuple[Dict[str, str], "_Metric"]]:
+        if not self.label_names:
+            return [({}, self)]
+        with self._lock:
+            children = list(self._children.items())
+        return [(dict(zip(self.label_names, key)), child) for key, child in children]
+
+    def _samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+    def _json(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def collect(self) -> List[Sample]:
+        """All samples as (sample name, labels, value)."""
+        samples = []
+        for labels, child in self._series():
+            for suffix, extra, value in child._samples():
+                samples.append((self.name + suffix, {**labels, **extra}, value))
+        return samples
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.kind,
+            "help": self.documentation,
+            "series": [{"labels": labels, **child._json()} for labels, child in self._series()],
+        }
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. documents added."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        with self._lock:
+            return self._value
+
+    def _samples(self) -> List[Sample]:
+        return [("", {}, self.value)]
+
+    def _json(self) -> Dict[str, Any]:
+        return {"value": self.value}
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, set directly or read from a callback."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._value = 0.0
+        self._function: Optional[Callable[[], Optional[Callable[[], float]]]] = None
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Read the value from ``function`` whenever metrics are collected.
+
+        Bound methods are held weakly, so a gauge tracking e.g. an index's
+        pending count does not keep the index alive; once the object is
+        gone the gauge falls back to its last set value.
+        """
+        if hasattr(function, "__self__"):
+            self._function = weakref.WeakMethod(function)
+        else:
+            self._function = lambda: function
+
+    @property
+    def value(self) -> float:
+        function = self._function() if self._function is not None else None
+        if function is not None:
+            try:
+                return float(function())
+            except Exception as e:
+                logger.warning(f"Reading gauge {self.name} failed: {e}")
+        with self._lock:
+            return self._value
+
+    def _samples(self) -> List[Sample]:
+        return [("", {}, self.value)]
+
+    def _json(self) -> Dict[str, Any]:
+        return {"value": self.value}
+
+
+class _Timer:
+    """Context manager observing the elapsed time of its block."""
+
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "Histogram"):
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed, cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        # One count per bucket plus the +Inf overflow, non-cumulative
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        """Time the enclosed block: ``with histogram.time(): ...``."""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(per-bucket counts including +Inf, sum, count), read atomically."""
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return self._count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation within its bucket.
+
+        Returns None before the first observation; values beyond the last
+        bucket are reported as that bucket's upper bound.
+        """
+        counts, _, total = self.snapshot()
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for slot, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if slot == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[slot - 1] if slot else 0.0
+                return lower + (self.buckets[slot] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def _samples(self) -> List[Sample]:
+        counts, total_sum, total = self.snapshot()
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(("_bucket", {"le": _format_value(bound)}, cumulative))
+        samples.append(("_sum", {}, total_sum))
+        samples.append(("_count", {}, total))
+        return samples
+
+    def _json(self) -> Dict[str, Any]:
+        _, total_sum, total = self.snapshot()
+        return {
+            "count": total,
+            "sum": total_sum,
+            "mean": total_sum / total if total else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class StallProbe:
+    """
+    Measures how long other Python threads are held up while a block runs.
+
+    A probe thread sleeps for ``interval`` seconds at a time; whenever it
+    wakes late, something (usually a long operation holding the GIL) kept
+    it from running, and request threads were stalled just as long.
+
+    Usage:
+        with StallProbe() as probe:
+            save()
+        probe.total_seconds, probe.max_seconds
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            time.sleep(self.interval)
+            late = time.perf_counter() - started - self.interval
+            if late > 0:
+                self.total_seconds += late
+                self.max_seconds = max(self.max_seconds, late)
+
+    def __enter__(self) -> "StallProbe":
+        self._thread = threading.Thread(target=self._run, daemon=True, name="StallProbe")
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class MetricsRegistry:
+    """Named metrics, rendered together for the HTTP endpoint."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.created = time.time()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labels, **options) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **options)
+            elif type(metric) is not cls or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered as a different metric")
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge."""
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """Get or create a histogram (``buckets`` only applies on creation)."""
+        return self._get_or_create(Histogram, name, documentation, labels, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def _sorted(self) -> List[_Metric]:
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._sorted():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.collect():
+                if labels:
+                    rendered = ",".join(
+                        f'{key}="{_escape(str(val))}"' for key, val in labels.items()
+                    )
+                    sample_name = f"{sample_name}{{{rendered}}}"
+                lines.append(f"{sample_name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """All metrics as JSON-serializable data, with estimated percentiles."""
+        return {
+            "uptime_seconds": round(time.time() - self.created, 3),
+            "metrics": {metric.name: metric.to_dict() for metric in self._sorted()},
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+
+# Process-wide registry the app's modules record into
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """HTTP server exposing a registry at /metrics and /metrics.json."""
+
+    daemon_threads = True
+
+    def __init__(self, address, registry: MetricsRegistry = REGISTRY):
+        super().__init__(address, _MetricsHandler)
+        self.registry = registry
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        registry: MetricsRegistry = self.server.registry
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/metrics":
+            body = registry.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = registry.to_json().encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(
+    host: str = "127.0.0.1", port: int = 0, registry: MetricsRegistry = REGISTRY
+) -> Tuple[MetricsServer, threading.Thread]:
+    """
+    Serve metrics in a daemon thread.
+
+    Args:
+        host: Interface to bind (local only by default)
+        port: Port to bind (0 picks a free port)
+        registry: Registry to expose
+
+    Returns:
+        (server, thread); call ``server.shutdown()`` to stop it
+    """
+    server = MetricsServer((host, port), registry)
+    thread = threading.Thread(target=server.serve_forever, daemon=True, name="Metrics")
+    thread.start()
+    logger.info(f"Serving metrics at {server.url}")
+    return server, thread
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Stand-in Chat Completion Server
+
+A tiny OpenAI-compatible ``/v1/chat/completions`` endpoint built on the
+standard library, so the streaming chat path can be developed and tested
+offline. Streaming requests are answered with server-sent events, one word
+per chunk, optionally delayed to mimic generation speed.
+
+Usage:
+    python mock_llm_server.py --port 8001 --token-delay 0.05
+    python gradio_rag_app.py --llm-base-url http://127.0.0.1:8001/v1
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+def default_reply(messages) -> str:
+    """Deterministic answer naming the question found in the last user message."""
+    prompt = messages[-1].get("content", "") if messages else ""
+    question = prompt.rsplit("Q:", 1)[-1].split("\nA:", 1)[0].strip()
+    return f"Stand-in answer to: {question or prompt.strip()}"
+
+
+class MockCompletionServer(ThreadingHTTPServer):
+    """HTTP server that tracks how many completions are in flight."""
+
+    daemon_threads = True
+
+    def __init__(self, address, reply: Optional[str] = None, token_delay: float = 0.0):
+        super().__init__(address, _CompletionHandler)
+        self.reply = reply
+        self.token_delay = token_delay
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        server: MockCompletionServer = self.server
+        server._enter()
+        try:
+            messages = body.get("messages", [])
+            reply = server.reply if server.reply is not None else default_reply(messages)
+            words = reply.split(" ")
+            usage = {
+                "prompt_tokens": sum(len(m.get("content", "").split()) for m in messages),
+                "completion_tokens": len(words),
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            base = {
+                "id": f"chatcmpl-mock-{server.requests}",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+            }
+            if body.get("stream"):
+                include_usage = (body.get("stream_options") or {}).get("include_usage")
+                self._stream(base, words, usage if include_usage else None)
+            else:
+                self._respond(base, reply, usage)
+        finally:
+            server._exit()
+
+    def _respond(self, base, reply, usage):
+        payload = json.dumps({
+            **base,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, base, words, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(chunk):
+            self.wfile.write(f"data: {chunk}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+            send(json.dumps({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": "stop" if i == len(words) - 1 else None,
+                }],
+            }))
+        if usage is not None:
+            send(json.dumps({
+                **base, "object": "chat.completion.chunk", "choices": [], "usage": usage,
+            }))
+        send("[DONE]")
+
+
+def start_mock_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    reply: Optional[str] = None,
+    token_delay: float = 0.0,
+) -> Tuple[MockCompletionServer, threading.Thread]:
+    """
+    Start the stand-in server in a daemon thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        reply: Fixed answer text; by default the question is echoed back
+        token_delay: Seconds to wait before each streamed word
+
+    Returns:
+        (server, thread); call ``server.shutdown()`` to stop it
+    """
+    server = MockCompletionServer((host, port), reply=reply, token_delay=token_delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in chat completion server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--reply", help="Fixed reply text (default: echo the question)")
+    parser.add_argument(
+        "--token-delay", type=float, default=0.02, help="Seconds per streamed word"
+    )
+    args = parser.parse_args()
+
+    server = MockCompletionServer(
+        (args.host, args.port), reply=args.reply, token_delay=args.token_delay
+    )
+    print(f"Stand-in completion server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -5,15 +5,148 @@ This module provides a wrapper around FAISS indexes that handles persistence
 with batching and async operations to avoid performance bottlenecks.
 """
 
+import atexit
+import os
 import threading
 import time
 import logging
-from typing import List, Optional
+import math
+import pickle
+import uuid
+import warnings
+import weakref
+from dataclasses import replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+import faiss
+import numpy as np
 from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
+try:
+    from .delta_log import DeltaLog, DeltaRecord, SnapshotStaging, update_metadata
+    from .embedding_cache import embed_queries
+    from .concurrency import ReadWriteLock
+    from .lexical_index import BM25Index, tokenize, write_lexical_bytes
+    from .dedup import DEDUP_POLICIES, NearDuplicateIndex, write_dedup_bytes
+    from .index_spec import IndexSpec
+    from .metadata_filter import (
+        FILTER_FIELDS,
+        MetadataIndex,
+        clear_positions,
+        enable_reconstruction,
+        search_bitmap,
+        search_parameters,
+    )
+    from .metrics import REGISTRY, SIZE_BUCKETS, StallProbe
+    from .sqlite_docstore import SqliteDocstore
+    from .rerank import FloatVectorFile, rerank as exact_rerank
+    from .write_ahead_log import WriteAheadLog
+except ImportError:
+    # Fallback for direct execution
+    from delta_log import DeltaLog, DeltaRecord, SnapshotStaging, update_metadata
+    from embedding_cache import embed_queries
+    from concurrency import ReadWriteLock
+    from lexical_index import BM25Index, tokenize, write_lexical_bytes
+    from dedup import DEDUP_POLICIES, NearDuplicateIndex, write_dedup_bytes
+    from index_spec import IndexSpec
+    from metadata_filter import (
+        FILTER_FIELDS,
+        MetadataIndex,
+        clear_positions,
+        enable_reconstruction,
+        search_bitmap,
+        search_parameters,
+    )
+    from metrics import REGISTRY, SIZE_BUCKETS, StallProbe
+    from sqlite_docstore import SqliteDocstore
+    from rerank import FloatVectorFile, rerank as exact_rerank
+    from write_ahead_log import WriteAheadLog
+
 logger = logging.getLogger(__name__)
 
+# Vectors reconstructed per step when dead vectors are purged
+PURGE_BATCH_SIZE = 65536
+
+# What add_documents does once unsaved changes reach max_unsaved: wait for the
+# persistence thread, raise, or stop queueing changes and snapshot them later
+BACKPRESSURE_POLICIES = ("block", "reject", "memory")
+
+# Weight of the latest save in the moving average of save durations
+SAVE_EMA_ALPHA = 0.3
+
+# Longest pause between retries of a failing background save (seconds)
+MAX_SAVE_RETRY_DELAY = 30.0
+
+# Where full snapshots are serialized: on the persistence thread, or in a
+# forked child whose copy-on-write memory keeps the GIL free for requests
+SNAPSHOT_MODES = ("thread", "fork")
+
+EMBED_QUERY_SECONDS = REGISTRY.histogram(
+    "rag_embed_query_seconds", "Time to embed a search query"
+)
+EMBED_DOCUMENTS_SECONDS = REGISTRY.histogram(
+    "rag_embed_documents_seconds", "Time to embed a batch of documents"
+)
+SEARCH_SECONDS = REGISTRY.histogram(
+    "rag_similarity_search_seconds", "Time of one vector search on an index", ["filtered"]
+)
+SAVE_SECONDS = REGISTRY.histogram(
+    "rag_save_seconds", "Time to write a delta segment or full snapshot", ["kind"]
+)
+SAVE_BYTES = REGISTRY.histogram(
+    "rag_save_bytes", "Bytes written per save", ["kind"], buckets=SIZE_BUCKETS
+)
+SNAPSHOT_STALL_SECONDS = REGISTRY.histogram(
+    "rag_snapshot_stall_seconds",
+    "Longest pause of other threads while a full snapshot was written",
+    ["mode"],
+)
+SAVE_FAILURES = REGISTRY.counter("rag_save_failures_total", "Saves that raised an error")
+DOCUMENTS_ADDED = REGISTRY.counter("rag_documents_added_total", "Documents added or upserted")
+DOCUMENTS_DELETED = REGISTRY.counter(
+    "rag_documents_deleted_total", "Documents deleted or replaced by upserts"
+)
+PENDING_DOCUMENTS = REGISTRY.gauge(
+    "rag_pending_documents", "Changes not yet persisted, per index path", ["index"]
+)
+PERSISTENCE_BATCH_SIZE = REGISTRY.gauge(
+    "rag_persistence_batch_size", "Adaptive number of changes per save, per index path", ["index"]
+)
+BACKPRESSURE_EVENTS = REGISTRY.counter(
+    "rag_backpressure_events_total", "Changes that found max_unsaved reached", ["policy"]
+)
+_UNFILTERED_SEARCH_SECONDS = SEARCH_SECONDS.labels(filtered="false")
+_FILTERED_SEARCH_SECONDS = SEARCH_SECONDS.labels(filtered="true")
+
+# Managers with unsaved changes to flush at interpreter exit
+_LIVE_MANAGERS: "weakref.WeakSet[BatchedPersistenceManager]" = weakref.WeakSet()
+
+
+@atexit.register
+def _shutdown_live_managers() -> None:
+    for manager in list(_LIVE_MANAGERS):
+        try:
+            manager.shutdown()
+        except Exception as e:
+            logger.error(f"Final flush of {manager.index_path} failed: {e}")
+
+
+def _pickled(obj: Any) -> Optional[bytes]:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL) if obj is not None else None
+
+
+def _wait_for_child(pid: int) -> None:
+    """Wait for a snapshot process without holding the GIL."""
+    _, status = os.waitpid(pid, 0)
+    code = os.waitstatus_to_exitcode(status)
+    if code != 0:
+        raise RuntimeError(f"Snapshot process exited with status {code}")
+
+
+class PersistenceBackpressureError(RuntimeError):
+    """Unsaved changes reached ``max_unsaved`` and the change was not accepted."""
+
 
 class BatchedPersistenceManager:
     """
@@ -21,9 +154,23 @@ class BatchedPersistenceManager:
 
     This class wraps a FAISS index and provides:
     - Batched document additions
+    - Upserts and deletes by document ID or title, recorded as tombstones
+      that searches filter out until compaction purges the dead vectors
     - Async persistence to disk
-    - Configurable batch size and timing
-    - Thread-safe operations
+    - Incremental delta segments instead of full rewrites on every flush
+    - Background compaction of delta segments into the base snapshot
+    - Optional BM25 lexical index kept in step with the vector index
+    - Optional MinHash LSH near-duplicate detection before embedding
+    - Metadata filters applied inside the FAISS search as ID bitmaps
+    - Event-driven saves whose batch size adapts to the measured save time,
+      with backpressure once unsaved changes reach a limit
+    - A write-ahead log so changes survive a crash before their batch is
+      saved, and full snapshots swapped in atomically
+    - Optional out-of-process snapshots, serialized by a forked child
+    - Optional exact re-ranking of quantized search results from float32
+      vectors kept on disk
+    - Thread-safe operations: concurrent searches, serialized writers, and
+      snapshots that never block searches or capture a half-applied add
     """
 
     def __init__(
@@ -33,6 +180,22 @@ class BatchedPersistenceManager:
         batch_size: int = 5,
         max_wait_time: float = 30.0,
         auto_persist: bool = True,
+        compact_every: int = 8,
+        read_only: bool = False,
+        lexical_index: bool = False,
+        purge_threshold: float = 0.2,
+        dedup: Optional[str] = None,
+        dedup_threshold: float = 0.9,
+        filter_fields: Iterable[str] = FILTER_FIELDS,
+        max_batch_size: Optional[int] = None,
+        save_budget: float = 0.1,
+        max_unsaved: Optional[int] = None,
+        backpressure: str = "block",
+        backpressure_timeout: float = 30.0,
+        wal: bool = True,
+        snapshot_mode: str = "thread",
+        rerank: int = 0,
+        index_spec: Optional[IndexSpec] = None,
     ):
         """
         Initialize the persistence manager.
@@ -40,27 +203,210 @@ class BatchedPersistenceManager:
         Args:
             index: The FAISS index to manage
             index_path: Path where the index should be saved
-            batch_size: Number of documents to accumulate before persisting
-            max_wait_time: Maximum time to wait before persisting (seconds)
+            batch_size: Minimum number of changes to accumulate before persisting
+            max_wait_time: Maximum time an unsaved change waits for a save (seconds)
             auto_persist: Whether to automatically persist based on batch_size/time
+            compact_every: Number of delta segments to accumulate before they
+                are folded into the base snapshot
+            max_batch_size: Upper bound of the adaptive batch size
+                (default: 20 x batch_size)
+            save_budget: Target fraction of wall time spent saving. Saves that
+                take longer make the persistence thread wait for larger batches
+            max_unsaved: Number of unsaved changes at which ``backpressure``
+                applies (None: unlimited)
+            backpressure: "block" waits until the persistence thread catches
+                up, "reject" raises PersistenceBackpressureError, "memory"
+                keeps accepting changes but stops queueing them; the next save
+                then writes a full snapshot instead of a delta segment
+            backpressure_timeout: Seconds "block" waits before raising
+                PersistenceBackpressureError
+            wal: Append every change to a write-ahead log before it is
+                acknowledged, so a crash loses nothing that was not yet saved
+            snapshot_mode: "thread" serializes full snapshots on the persistence
+                thread, which holds the GIL while the docstore is pickled;
+                "fork" serializes them in a forked child process instead.
+                Falls back to "thread" where fork is unavailable
+            rerank: Rescore a shortlist of ``rerank * k`` results with exact
+                float32 vectors from ``vectors.f32`` (see rerank.py); 0
+                searches the index as stored
+            index_spec: Spec the index was built from; if it fell back to a
+                flat index, compaction rebuilds it as requested once enough
+                live vectors exist
+            read_only: Reject additions and never write to disk, e.g. for an
+                index memory-mapped from a shared snapshot
+            lexical_index: Maintain a BM25 inverted index of the documents,
+                persisted as bm25.pkl with each snapshot
+            purge_threshold: Fraction of deleted vectors at which compaction
+                rebuilds the index without them
+            dedup: Near-duplicate policy for ``add_documents`` and ingestion:
+                "reject" drops near-duplicate chunks before embedding, "merge"
+                also records the new title as an alias of the existing chunk;
+                None disables detection
+            dedup_threshold: Estimated Jaccard similarity of word shingles at
+                which chunks count as near-duplicates
+            filter_fields: Metadata fields usable in ``metadata_filter``
+                searches; their value bitmaps are built on the first
+                filtered search
         """
+        if dedup is not None and dedup not in DEDUP_POLICIES:
+            raise ValueError(f"dedup must be one of {DEDUP_POLICIES} or None")
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"backpressure must be one of {BACKPRESSURE_POLICIES}")
+        if not 0 < save_budget <= 1:
+            raise ValueError("save_budget must be in (0, 1]")
+        if snapshot_mode not in SNAPSHOT_MODES:
+            raise ValueError(f"snapshot_mode must be one of {SNAPSHOT_MODES}")
+        if snapshot_mode == "fork" and not hasattr(os, "fork"):
+            logger.warning("fork is not available; writing snapshots on a thread")
+            snapshot_mode = "thread"
         self.index = index
         self.index_path = index_path
         self.batch_size = batch_size
         self.max_wait_time = max_wait_time
         self.auto_persist = auto_persist
+        self.compact_every = max(1, compact_every)
+        self.read_only = read_only
+        self.purge_threshold = purge_threshold
+        self.max_batch_size = max(batch_size, max_batch_size or 20 * batch_size)
+        self.save_budget = save_budget
+        self.max_unsaved = max_unsaved
+        self.backpressure = backpressure
+        self.backpressure_timeout = backpressure_timeout
+        self.snapshot_mode = snapshot_mode
+        self.index_spec = index_spec
+        # Duration and stall time of the latest full snapshot
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+
+        # Delta log for incremental saves
+        self._delta_log = DeltaLog(index_path) if index_path and not read_only else None
+        self._unsaved: List[DeltaRecord] = []
+        self._unsaved_deletes: List[str] = []
+        # (doc_id, metadata fields) of updates to existing documents, e.g. aliases
+        self._unsaved_updates: List[Tuple[str, Dict[str, Any]]] = []
+        # Sequence number of the newest change logged to the write-ahead log
+        self._wal = WriteAheadLog(index_path) if wal and self._delta_log is not None else None
+        self._applied_lsn = 0
 
-        # State tracking
+        # Deleted documents whose vectors are still in the index
+        self._tombstones: Set[str] = set()
+        deleted = DeltaLog(index_path).tombstones() if index_path else set()
+        if deleted and read_only:
+            # A mapped snapshot has no pending segments, so its tombstones
+            # match it; intersecting would unpickle the lazy docstore
+            self._tombstones = deleted
+        elif deleted:
+            self._tombstones = deleted & set(index.index_to_docstore_id.values())
+        # Title -> IDs of live documents, built on first use
+        self._title_ids: Optional[Dict[str, Set[str]]] = None
+        # Positions of tombstoned vectors and the (ntotal, packed bitmap) of
+        # the others, which searches use as an ID selector; rebuilt on demand
+        self._dead_positions: Optional[np.ndarray] = None
+        self._live_bits: Optional[Tuple[int, np.ndarray]] = None
+
+        # State tracking. The persistence thread sleeps on _changed until a
+        # change arrives or the oldest unsaved change is due
         self._pending_docs = 0
         self._last_save_time = time.time()
+        self._dirty_since = self._last_save_time
         self._is_dirty = False
         self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
         self._shutdown = False
+        self._flush_requested = False
+        # Set when queued changes were dropped under the "memory" policy
+        self._snapshot_due = False
+        # Moving average of save durations (seconds), None before the first save
+        self._save_seconds: Optional[float] = None
+        metric_label = index_path or "memory"
+        PENDING_DOCUMENTS.labels(index=metric_label).set_function(self.get_pending_count)
+        PERSISTENCE_BATCH_SIZE.labels(index=metric_label).set_function(
+            self.effective_batch_size
+        )
+
+        # Searches share the index; additions and snapshots exclude each other
+        self._index_lock = ReadWriteLock()
+        self._save_lock = threading.RLock()
+        # Held by a writer from resolving its change until it is applied
+        self._writer_lock = threading.Lock()
+        with self._index_lock.write_locked():
+            # Filtered searches reconstruct IVF vectors but never change the index
+            enable_reconstruction(self.index.index)
+
+        # Callbacks notified with the documents affected by each change
+        self._change_listeners: List[Callable[[List[Document]], None]] = []
+
+        # Optional lexical index, restored from the snapshot and brought up
+        # to date with documents replayed from delta segments
+        self._lexical: Optional[BM25Index] = None
+        self._lexical_synced = True
+        if lexical_index:
+            self._lexical = BM25Index.load(index_path) if index_path else BM25Index()
+            if not read_only:
+                self._sync_lexical()
+            elif len(self._lexical) != index.index.ntotal - len(self._tombstones):
+                # Saved without bm25.pkl: sync on the first lexical search,
+                # which needs the docstore anyway
+                self._lexical_synced = False
+
+        # Optional near-duplicate index, persisted as minhash.pkl with each snapshot
+        self.dedup = dedup
+        self._dedup: Optional[NearDuplicateIndex] = None
+        if dedup:
+            self._dedup = (
+                NearDuplicateIndex.load(index_path, dedup_threshold)
+                if index_path
+                else NearDuplicateIndex(dedup_threshold)
+            )
+            # Only additions consult it, and a read-only index rejects them
+            if not read_only:
+                self._sync_dedup()
+
+        # Metadata field values -> index positions, built on first filtered search
+        self.filter_fields = tuple(filter_fields)
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._metadata_lock = threading.Lock()
+
+        # Full-precision vectors for re-ranking, one row per index position
+        self.rerank = rerank
+        self._vectors: Optional[FloatVectorFile] = None
+        if rerank and index_path:
+            self._vectors = self._open_vectors()
 
         # Background persistence thread
         self._persistence_thread = None
-        if auto_persist and index_path:
+        if auto_persist and index_path and not read_only:
             self._start_persistence_thread()
+        if self._delta_log is not None:
+            _LIVE_MANAGERS.add(self)
+
+    def _open_vectors(self) -> Optional[FloatVectorFile]:
+        """Open vectors.f32 if it has a row for every vector in the index."""
+        ntotal = self.index.index.ntotal
+        try:
+            vectors = FloatVectorFile(
+                self.index_path, self.index.index.d, writable=not self.read_only
+            )
+        except FileNotFoundError:
+            vectors = None
+        if vectors is not None and len(vectors) > ntotal and not self.read_only:
+            # Rows of changes that were lost in a crash
+            vectors.truncate(ntotal)
+        if vectors is None or len(vectors) < ntotal:
+            logger.warning(
+                f"{self.index_path} lacks full-precision vectors for some documents; "
+                "searches are not re-ranked. Rebuild the index with rerank enabled."
+            )
+            if vectors is not None:
+                vectors.close()
+            return None
+        return vectors
+
+    def _as_stored(self, vectors: List[List[float]]) -> np.ndarray:
+        """Vectors as the index stores them (normalized if it normalizes)."""
+        data = np.asarray(vectors, dtype=np.float32)
+        if self.index._normalize_L2:
+            faiss.normalize_L2(data)
+        return data
 
     def _start_persistence_thread(self):
         """Start the background persistence thread."""
@@ -70,74 +416,936 @@ class BatchedPersistenceManager:
         self._persistence_thread.start()
 
     def _persistence_worker(self):
-        """Background worker that handles automatic persistence."""
-        while not self._shutdown:
+        """Background worker that saves each batch as soon as it is due."""
+        retry_delay = 1.0
+        while True:
+            with self._changed:
+                while not self._shutdown:
+                    due, now = self._due_time(), time.time()
+                    if due is not None and due <= now:
+                        break
+                    infinite = due is None or math.isinf(due)
+                    self._changed.wait(None if infinite else min(due - now, threading.TIMEOUT_MAX))
+                if self._shutdown:
+                    # shutdown() flushes whatever is left
+                    return
+                self._flush_requested = False
+
             try:
-                time.sleep(1.0)  # Check every second
+                saved = self._save_now()
+                if saved and self._needs_compaction():
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Error in persistence worker: {e}")
+                saved = False
 
-                with self._lock:
-                    should_save = self._is_dirty and (
-                        self._pending_docs >= self.batch_size
-                        or time.time() - self._last_save_time >= self.max_wait_time
-                    )
+            if saved:
+                retry_delay = 1.0
+            else:
+                # Back off instead of retrying a failing save in a tight loop
+                with self._changed:
+                    self._changed.wait_for(lambda: self._shutdown, timeout=retry_delay)
+                retry_delay = min(2 * retry_delay, MAX_SAVE_RETRY_DELAY)
 
-                if should_save:
-                    self._save_now()
+    def _due_time(self) -> Optional[float]:
+        """
+        When pending changes should be saved, or None if nothing is unsaved
+        (caller holds _lock).
 
-            except Exception as e:
-                logger.error(f"Error in persistence worker: {e}")
+        With save duration ``s``, saving every ``s / save_budget`` seconds
+        keeps saving within the budget. That is the time by which changes
+        arriving at rate ``r`` fill the adaptive batch ``s * r / save_budget``,
+        so no arrival-rate estimate is needed.
+        """
+        if not self._is_dirty:
+            return None
+        if self._flush_requested or self._pending_docs >= self.max_batch_size:
+            return 0.0
+        due = self._dirty_since + self.max_wait_time
+        if self._pending_docs >= self.batch_size:
+            due = min(due, self._dirty_since + (self._save_seconds or 0.0) / self.save_budget)
+        return due
+
+    def effective_batch_size(self) -> int:
+        """Batch size the scheduler currently waits for, given the recent save time."""
+        with self._lock:
+            if self._save_seconds is None or not self._is_dirty:
+                return self.batch_size
+            elapsed = max(time.time() - self._dirty_since, 1e-3)
+            target = math.ceil(self._save_seconds * self._pending_docs / elapsed / self.save_budget)
+        return min(max(target, self.batch_size), self.max_batch_size)
+
+    def _mark_saved(self, seconds: float) -> None:
+        """Update the state after a successful save (caller holds _lock)."""
+        self._pending_docs = self._unsaved_count()
+        self._last_save_time = time.time()
+        self._dirty_since = self._last_save_time
+        self._is_dirty = bool(self._pending_docs or self._snapshot_due)
+        self._save_seconds = (
+            seconds
+            if self._save_seconds is None
+            else SAVE_EMA_ALPHA * seconds + (1 - SAVE_EMA_ALPHA) * self._save_seconds
+        )
+        self._changed.notify_all()
+
+    def _unsaved_count(self) -> int:
+        """Number of queued changes (caller holds _lock)."""
+        return len(self._unsaved) + len(self._unsaved_deletes) + len(self._unsaved_updates)
 
-    def add_documents(self, documents: List[Document]) -> None:
+    def _admit(self) -> None:
+        """Apply the backpressure policy if unsaved changes reached max_unsaved."""
+        if self.max_unsaved is None or self._delta_log is None:
+            return
+
+        def has_room():
+            return self._unsaved_count() < self.max_unsaved
+
+        with self._changed:
+            if has_room():
+                return
+            BACKPRESSURE_EVENTS.labels(policy=self.backpressure).inc()
+            self._flush_requested = True
+            self._changed.notify_all()
+            if self.backpressure == "reject":
+                raise PersistenceBackpressureError(
+                    f"{self.max_unsaved} changes are waiting to be saved; retry later"
+                )
+
+        if self.backpressure == "memory":
+            self._drop_to_memory()
+            return
+
+        if self._persistence_thread is None:
+            # Nobody else will save: flush in this thread
+            self._save_now()
+        with self._changed:
+            if not self._changed.wait_for(
+                lambda: self._shutdown or has_room(), timeout=self.backpressure_timeout
+            ):
+                raise PersistenceBackpressureError(
+                    f"Saves did not catch up with {self.max_unsaved} unsaved changes "
+                    f"within {self.backpressure_timeout}s"
+                )
+
+    def _drop_to_memory(self) -> None:
+        """
+        Stop holding queued changes for a delta segment; the index already
+        has them and the next save writes a full snapshot instead.
+        """
+        # A running save works through _unsaved by position; leave it alone
+        if not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                dropped = self._unsaved_count()
+                self._unsaved, self._unsaved_deletes, self._unsaved_updates = [], [], []
+                self._snapshot_due = True
+        finally:
+            self._save_lock.release()
+        logger.warning(
+            f"Reached {self.max_unsaved} unsaved changes: {dropped} changes are kept "
+            "in memory only until the next full snapshot"
+        )
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
         """
         Add documents to the index with batched persistence.
 
         Args:
             documents: List of documents to add
+
+        Returns:
+            IDs of the added documents
         """
-        # Add documents to the index immediately (in-memory)
-        self.index.add_documents(documents)
+        documents, _ = self.deduplicate(documents)
+        if not documents:
+            return []
+        vectors = self.embed_documents([doc.page_content for doc in documents])
+        return self.add_embedded_documents(documents, vectors)
 
-        # Update persistence state
-        with self._lock:
-            self._pending_docs += len(documents)
-            self._is_dirty = True
+    def add_embedded_documents(
+        self, documents: List[Document], vectors: List[List[float]]
+    ) -> List[str]:
+        """
+        Add documents whose embeddings were already computed, in one index update.
+
+        Args:
+            documents: List of documents to add
+            vectors: Embedding for each document, in the same order
+
+        Returns:
+            IDs of the added documents
+        """
+        return self._apply_changes(documents, vectors)[0]
+
+    def upsert_documents(self, documents: List[Document], by_title: bool = True) -> List[str]:
+        """
+        Add documents, replacing existing versions of them.
+
+        See ``upsert_embedded_documents``.
+        """
+        titles = {doc.metadata["title"] for doc in documents if "title" in doc.metadata}
+        documents, _ = self.deduplicate(documents, replacing_titles=titles if by_title else ())
+        if not documents:
+            return []
+        vectors = self.embed_documents([doc.page_content for doc in documents])
+        return self.upsert_embedded_documents(documents, vectors, by_title=by_title)
+
+    def deduplicate(
+        self, documents: List[Document], replacing_titles: Iterable[str] = ()
+    ) -> Tuple[List[Document], List[Tuple[Document, str]]]:
+        """
+        Drop documents that near-duplicate an indexed chunk or an earlier one
+        in the same list, so they are never embedded.
+
+        With the "merge" policy the dropped document's title is recorded as an
+        alias of the chunk it duplicates (``aliases`` metadata on that chunk).
+
+        Args:
+            documents: Candidate documents
+            replacing_titles: Titles an upsert is about to replace; their
+                chunks are not counted as existing copies
+
+        Returns:
+            (documents to add, [(duplicate document, ID of the kept chunk)])
+        """
+        if self._dedup is None or not documents:
+            return list(documents), []
+
+        signatures = [self._dedup.signature(doc.page_content) for doc in documents]
+        replacing = set(replacing_titles)
+        kept: List[Document] = []
+        duplicates: List[Tuple[Document, str]] = []
+        batch = NearDuplicateIndex(self._dedup.threshold, self._dedup.num_perm)
+
+        with self._index_lock.read_locked():
+            for i, (doc, signature) in enumerate(zip(documents, signatures)):
+                match = self._dedup.query(signature, exclude_titles=replacing)
+                if match is None:
+                    match = batch.query(signature)
+                if match is None:
+                    batch.add(str(i), signature)
+                    kept.append(doc)
+                else:
+                    duplicates.append((doc, match[0]))
+
+        if duplicates and self.dedup == "merge":
+            self._merge_aliases(duplicates)
+        if duplicates:
+            logger.info(f"Skipped {len(duplicates)} near-duplicate documents")
+        return kept, duplicates
+
+    def _merge_aliases(self, duplicates: List[Tuple[Document, str]]) -> None:
+        """
+        Record titles of merged duplicates on the chunks they duplicate.
+
+        The new ``aliases`` metadata is written through the docstore and
+        saved like any other change: logged to the write-ahead log and queued
+        for the next delta segment.
+        """
+        if self.read_only:
+            raise RuntimeError("Index was loaded read-only; documents cannot be changed")
+        updates: Dict[str, Dict[str, Any]] = {}
+        with self._writer_lock:
+            with self._index_lock.read_locked():
+                for doc, target_id in duplicates:
+                    title = doc.metadata.get("title")
+                    target = self.index.docstore.search(target_id)
+                    if title is None or not isinstance(target, Document):
+                        continue  # duplicate within the batch, or since deleted
+                    if title == target.metadata.get("title"):
+                        continue
+                    aliases = updates.get(target_id, target.metadata).get("aliases", [])
+                    if title not in aliases:
+                        updates[target_id] = {"aliases": [*aliases, title]}
+            if not updates:
+                return
+            # Logged before the docstore changes, like any other change
+            lsn = self._log_change([], [], updates)
+            with self._index_lock.write_locked():
+                update_metadata(self.index.docstore, updates)
+                for doc_id, fields in updates.items():
+                    for title in fields["aliases"]:
+                        self._dedup.add_alias(doc_id, title)
+                self._queue_unsaved([], [], updates, lsn)
+
+        if not self.auto_persist and self.index_path:
+            self._save_now()
+
+    def upsert_embedded_documents(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        by_title: bool = True,
+    ) -> List[str]:
+        """
+        Add embedded documents and delete the versions they replace, atomically.
+
+        A document replaces the existing document with its ID and, when
+        ``by_title`` is set, every existing document (e.g. all chunks of an
+        upload) with the same ``title`` metadata. Replaced IDs are not reused:
+        a document whose ID is taken is added under a new ID.
+
+        Returns:
+            IDs of the added documents
+        """
+        replace_ids = [doc.id for doc in documents if getattr(doc, "id", None)]
+        titles = {doc.metadata["title"] for doc in documents if "title" in doc.metadata}
+        ids, _ = self._apply_changes(
+            documents,
+            vectors,
+            delete_ids=replace_ids,
+            delete_titles=titles if by_title else (),
+            fresh_ids=True,
+        )
+        return ids
+
+    def delete(
+        self, ids: Optional[Iterable[str]] = None, titles: Optional[Iterable[str]] = None
+    ) -> int:
+        """
+        Delete documents by ID and/or title.
+
+        Deleted documents are hidden from searches immediately and their
+        vectors are removed by a later compaction.
+
+        Returns:
+            Number of documents deleted
+        """
+        _, removed = self._apply_changes(
+            [], [], delete_ids=ids or (), delete_titles=titles or ()
+        )
+        return len(removed)
+
+    def _apply_changes(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        delete_ids: Iterable[str] = (),
+        delete_titles: Iterable[str] = (),
+        fresh_ids: bool = False,
+    ) -> Tuple[List[str], List[Document]]:
+        """
+        Delete and add documents in one critical section and record both for saving.
+
+        The change is resolved (which IDs it deletes, which IDs it adds) and
+        appended to the write-ahead log before the index is touched, so a
+        failed append leaves the index unchanged and the fsync never holds
+        up searches. ``_writer_lock`` keeps other writers from changing what
+        was resolved until the change is applied.
+
+        Returns:
+            (IDs of the added documents, deleted documents)
+        """
+        if self.read_only:
+            raise RuntimeError("Index was loaded read-only; documents cannot be changed")
+        if len(documents) != len(vectors):
+            raise ValueError("Number of documents and vectors must match")
+        delete_ids = list(delete_ids)
+        delete_titles = list(delete_titles)
+        if not documents and not delete_ids and not delete_titles:
+            return [], []
+        self._admit()
+
+        texts = [doc.page_content for doc in documents]
+        metadatas = [dict(doc.metadata) for doc in documents]
+        ids = [getattr(doc, "id", None) or str(uuid.uuid4()) for doc in documents]
+        terms = [tokenize(text) for text in texts] if self._lexical is not None else []
+        signatures = (
+            [self._dedup.signature(text) for text in texts] if self._dedup is not None else []
+        )
+
+        with self._writer_lock:
+            with self._index_lock.read_locked():
+                if delete_titles:
+                    delete_ids.extend(self._ids_with_titles(delete_titles))
+                deleted_ids = self._live_ids(delete_ids)
+                if fresh_ids:
+                    ids = [
+                        str(uuid.uuid4()) if self._contains(doc_id) else doc_id for doc_id in ids
+                    ]
+            records = [
+                DeltaRecord(doc_id, text, metadata, vector)
+                for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors)
+            ]
+            # Durable before the index changes and the caller sees it as done
+            lsn = self._log_change(records, deleted_ids)
+
+            # Apply the change to the index (in-memory) and queue it for the
+            # next save in the same critical section
+            with self._index_lock.write_locked():
+                removed = self._tombstone(deleted_ids)
+                self._add_to_index(vectors, texts, metadatas, ids, terms, signatures)
+                self._queue_unsaved(records, deleted_ids, {}, lsn)
+                DOCUMENTS_ADDED.inc(len(documents))
+                DOCUMENTS_DELETED.inc(len(removed))
+
+        if removed:
+            logger.info(f"Deleted {len(removed)} documents")
+        self._notify_change(removed + [
+            Document(id=doc_id, page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ])
 
         # If auto-persistence is disabled, save immediately
         if not self.auto_persist and self.index_path:
             self._save_now()
 
+        return ids, removed
+
+    def _log_change(
+        self,
+        records: List[DeltaRecord],
+        deleted_ids: List[str],
+        updates: Optional[Mapping[str, Dict[str, Any]]] = None,
+    ) -> Optional[int]:
+        """Append a change to the write-ahead log; its sequence number, or None."""
+        if self._wal is None or not (records or deleted_ids or updates):
+            return None
+        return self._wal.append(records, deleted_ids, updates)
+
+    def _add_to_index(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        terms: List[List[str]],
+        signatures: List[np.ndarray],
+    ) -> None:
+        """Add embedded documents to the index and side indexes (caller holds the write lock)."""
+        if ids:
+            first_position = self.index.index.ntotal
+            self.index.add_embeddings(
+                text_embeddings=zip(texts, vectors), metadatas=metadatas, ids=ids
+            )
+            if self._vectors is not None:
+                self._vectors.append(self._as_stored(vectors))
+            if self._metadata_index is not None:
+                for offset, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+                    self._metadata_index.add(first_position + offset, doc_id, metadata)
+        for doc_id, doc_terms in zip(ids, terms):
+            self._lexical.add_terms(doc_id, doc_terms)
+        for doc_id, signature, metadata in zip(ids, signatures, metadatas):
+            self._dedup.add(doc_id, signature, metadata.get("title"))
+        if self._title_ids is not None:
+            for doc_id, metadata in zip(ids, metadatas):
+                if "title" in metadata:
+                    self._title_ids.setdefault(metadata["title"], set()).add(doc_id)
+
+    def _queue_unsaved(
+        self,
+        records: List[DeltaRecord],
+        deleted_ids: List[str],
+        updates: Mapping[str, Dict[str, Any]],
+        lsn: Optional[int],
+    ) -> None:
+        """Queue changes applied to the index for the next save."""
+        with self._lock:
+            self._unsaved.extend(records)
+            self._unsaved_deletes.extend(deleted_ids)
+            self._unsaved_updates.extend(updates.items())
+            if lsn is not None:
+                self._applied_lsn = lsn
+            changes = len(records) + len(deleted_ids) + len(updates)
+            if changes:
+                if not self._is_dirty:
+                    self._dirty_since = time.time()
+                self._pending_docs += changes
+                self._is_dirty = True
+                self._changed.notify_all()
+
+    def _live_ids(self, ids: Iterable[str]) -> List[str]:
+        """The given IDs that belong to live documents, without repeats."""
+        return [
+            doc_id for doc_id in dict.fromkeys(ids)
+            if doc_id not in self._tombstones and self._contains(doc_id)
+        ]
+
+    def _contains(self, doc_id: str) -> bool:
+        """Whether a document (live or tombstoned) with this ID is in the index."""
+        return isinstance(self.index.docstore.search(doc_id), Document)
+
+    def _ids_with_titles(self, titles: Iterable[str]) -> Set[str]:
+        """IDs of live documents with the given titles (caller holds _writer_lock)."""
+        if self._title_ids is None:
+            self._title_ids = {}
+            for doc_id, doc in self._iter_documents():
+                title = doc.metadata.get("title")
+                if title is not None:
+                    self._title_ids.setdefault(title, set()).add(doc_id)
+        ids: Set[str] = set()
+        for title in titles:
+            ids.update(self._title_ids.get(title, ()))
+        return ids
+
+    def _tombstone(self, ids: Iterable[str]) -> List[Document]:
+        """Mark live documents deleted (caller holds the write lock)."""
+        removed = []
+        for doc_id in ids:
+            if doc_id in self._tombstones:
+                continue
+            doc = self.index.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                continue
+            self._tombstones.add(doc_id)
+            self._dead_positions = self._live_bits = None
+            if self._lexical is not None:
+                self._lexical.remove(doc_id)
+            if self._dedup is not None:
+                self._dedup.remove(doc_id)
+            title = doc.metadata.get("title")
+            if self._title_ids is not None and title in self._title_ids:
+                self._title_ids[title].discard(doc_id)
+                if not self._title_ids[title]:
+                    del self._title_ids[title]
+            removed.append(
+                Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata)
+            )
+        return removed
+
+    def _iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        """Yield (doc_id, Document) for every live document in the index."""
+        for doc_id in list(self.index.index_to_docstore_id.values()):
+            if doc_id in self._tombstones:
+                continue
+            doc = self.index.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                yield doc_id, doc
+
+    def _sync_lexical(self) -> None:
+        """Add documents missing from the lexical index and drop stale ones."""
+        live = set(self.index.index_to_docstore_id.values()) - self._tombstones
+        added = 0
+        for doc_id, doc in self._iter_documents():
+            if doc_id not in self._lexical:
+                self._lexical.add(doc_id, doc.page_content)
+                added += 1
+        stale = [doc_id for doc_id in self._lexical.doc_ids() if doc_id not in live]
+        for doc_id in stale:
+            self._lexical.remove(doc_id)
+        if added or stale:
+            logger.info(f"Lexical index synced: {added} added, {len(stale)} removed")
+
+    def _sync_dedup(self) -> None:
+        """Add documents missing from the near-duplicate index and drop stale ones."""
+        live = set(self.index.index_to_docstore_id.values()) - self._tombstones
+        added = 0
+        for doc_id, doc in self._iter_documents():
+            if doc_id not in self._dedup:
+                self._dedup.add(
+                    doc_id, self._dedup.signature(doc.page_content), doc.metadata.get("title")
+                )
+                added += 1
+        stale = [doc_id for doc_id in self._dedup.doc_ids() if doc_id not in live]
+        for doc_id in stale:
+            self._dedup.remove(doc_id)
+        if added or stale:
+            logger.info(f"Near-duplicate index synced: {added} added, {len(stale)} removed")
+
+    def add_change_listener(self, listener: Callable[[List[Document]], None]) -> None:
+        """
+        Register a callback invoked with the documents affected by each change,
+        e.g. to invalidate caches built from them.
+        """
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, documents: List[Document]) -> None:
+        for listener in self._change_listeners:
+            try:
+                listener(documents)
+            except Exception as e:
+                logger.error(f"Change listener failed: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the index's embedding function."""
+        embeddings = self.index.embeddings
+        with EMBED_DOCUMENTS_SECONDS.time():
+            if embeddings is not None:
+                return embeddings.embed_documents(texts)
+            return [self.index.embedding_function(text) for text in texts]
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query with the index's embedding function."""
+        embeddings = self.index.embeddings
+        with EMBED_QUERY_SECONDS.time():
+            if embeddings is not None:
+                return embeddings.embed_query(query)
+            return self.index.embedding_function(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several search queries in one model call (see query_batching.py)."""
+        if len(queries) == 1:
+            return [self.embed_query(queries[0])]
+        embeddings = self.index.embeddings
+        with EMBED_QUERY_SECONDS.time():
+            if embeddings is None:
+                return [self.index.embedding_function(query) for query in queries]
+            return embed_queries(embeddings, queries)
+
+    def dead_fraction(self) -> float:
+        """Fraction of the vectors in the index that belong to deleted documents."""
+        total = self.index.index.ntotal
+        return len(self._tombstones) / total if total else 0.0
+
+    def _needs_compaction(self) -> bool:
+        """Check whether enough delta segments or dead vectors exist to compact."""
+        if self._delta_log is None:
+            return False
+        if self._tombstones and self.dead_fraction() >= self.purge_threshold:
+            return True
+        return self._delta_log.pending_count() >= self.compact_every
+
     def _save_now(self) -> bool:
         """
-        Save the index to disk immediately.
+        Save pending changes to disk immediately.
+
+        New and deleted documents are appended as a delta segment when a base
+        snapshot already exists; otherwise a full snapshot is written.
 
         Returns:
             True if save was successful, False otherwise
         """
-        if not self.index_path:
+        if not self.index_path or self.read_only:
             return False
 
+        with self._save_lock:
+            return self._save_delta()
+
+    def _save_delta(self) -> bool:
+        """Append unsaved changes as a delta segment (caller holds _save_lock)."""
         try:
             # Check if save is necessary
             with self._lock:
                 if not self._is_dirty:
                     return True
+                snapshot_due = self._snapshot_due
+                if not snapshot_due:
+                    records, deletes = self._unsaved, self._unsaved_deletes
+                    updates = self._unsaved_updates
+                    self._unsaved, self._unsaved_deletes, self._unsaved_updates = [], [], []
+                    covered_lsn = self._applied_lsn
 
-            # Save to disk (release lock before disk write)
-            self.index.save_local(self.index_path)
+            # Changes dropped to memory are only on disk after a full snapshot
+            if snapshot_due:
+                return self._compact_snapshot()
+
+            def _restore():
+                with self._lock:
+                    self._unsaved = records + self._unsaved
+                    self._unsaved_deletes = deletes + self._unsaved_deletes
+                    self._unsaved_updates = updates + self._unsaved_updates
+
+            if not self._delta_log.has_base():
+                _restore()
+                return self.compact()
+
+            # Write only the changes (release lock before disk write)
+            started = time.perf_counter()
+            try:
+                if self._vectors is not None:
+                    self._vectors.sync()
+                # Later updates of the same document overwrite earlier ones
+                seq = self._delta_log.append(records, deletes, dict(updates))
+            except Exception:
+                _restore()
+                raise
+            seconds = time.perf_counter() - started
+            SAVE_SECONDS.labels(kind="delta").observe(seconds)
+            SAVE_BYTES.labels(kind="delta").observe(
+                os.path.getsize(self._delta_log.segment_path(seq))
+            )
+
+            if self._wal is not None:
+                self._wal.truncate(covered_lsn)
 
             # Reacquire lock to update state
             with self._lock:
-                self._pending_docs = 0
-                self._last_save_time = time.time()
-                self._is_dirty = False
+                self._mark_saved(seconds)
 
-            logger.info(f"Saved FAISS index to {self.index_path}")
+            logger.info(
+                f"Saved {len(records)} additions, {len(deletes)} deletions and "
+                f"{len(updates)} metadata updates as delta segment {seq} in {self.index_path}"
+            )
             return True
 
         except Exception as e:
+            SAVE_FAILURES.inc()
             logger.error(f"Failed to save FAISS index: {e}")
             return False
 
+    def compact(self) -> bool:
+        """
+        Write a full snapshot and fold all delta segments into it.
+
+        If the fraction of deleted vectors has reached ``purge_threshold``,
+        the snapshot is rebuilt without them and replaces the live index.
+
+        Returns:
+            True if compaction was successful, False otherwise
+        """
+        if not self.index_path or self.read_only:
+            return False
+
+        with self._save_lock:
+            return self._compact_snapshot()
+
+    def _snapshot(self) -> FAISS:
+        """
+        Copy the index so it can be serialized without holding any lock.
+
+        The caller must hold the read lock so no addition is half-applied.
+        Documents themselves are shared, only the containers are copied.
+        ``faiss.clone_index`` copies every vector, though, so a thread-mode
+        compaction briefly needs the index's memory twice; with
+        ``snapshot_mode="fork"`` the child serializes its copy-on-write
+        image of the live index instead and nothing is copied up front.
+        """
+        docstore = self.index.docstore
+        if isinstance(docstore, InMemoryDocstore):
+            docstore = InMemoryDocstore(dict(docstore._dict))
+        return FAISS(
+            self.index.embedding_function,
+            faiss.clone_index(self.index.index),
+            docstore,
+            dict(self.index.index_to_docstore_id),
+            normalize_L2=self.index._normalize_L2,
+            distance_strategy=self.index.distance_strategy,
+        )
+
+    def _purge(
+        self, snapshot: FAISS, dead: Set[str], spec: Optional[IndexSpec] = None
+    ) -> FAISS:
+        """
+        Rebuild a snapshot without the vectors and documents of ``dead`` IDs.
+
+        The rebuilt index is a reset clone of the original, so IVF centroids,
+        PQ codebooks and search parameters are kept without retraining. With
+        ``spec``, a new index of the spec's type is trained on a sample of the
+        live vectors instead; ``spec`` is updated to the type actually built.
+        """
+        index = snapshot.index
+        enable_reconstruction(index)
+
+        mapping = snapshot.index_to_docstore_id
+        if spec is None:
+            rebuilt = faiss.clone_index(index)
+            rebuilt.reset()
+        else:
+            live = [p for p in range(index.ntotal) if mapping[p] not in dead]
+            if len(live) > spec.train_sample_size:
+                rng = np.random.default_rng(0)
+                live = sorted(rng.choice(live, spec.train_sample_size, replace=False))
+            sample = np.vstack([index.reconstruct(int(p)) for p in live])
+            rebuilt = spec.build(sample, num_vectors=index.ntotal - len(dead))
+        enable_reconstruction(rebuilt)
+        live_ids: List[str] = []
+        for start in range(0, index.ntotal, PURGE_BATCH_SIZE):
+            count = min(PURGE_BATCH_SIZE, index.ntotal - start)
+            keep = [i for i in range(count) if mapping[start + i] not in dead]
+            if keep:
+                rebuilt.add(index.reconstruct_n(start, count)[keep])
+                live_ids.extend(mapping[start + i] for i in keep)
+
+        docstore = snapshot.docstore
+        if not isinstance(docstore, SqliteDocstore):
+            docstore = InMemoryDocstore({doc_id: docstore.search(doc_id) for doc_id in live_ids})
+        return FAISS(
+            snapshot.embedding_function,
+            rebuilt,
+            docstore,
+            dict(enumerate(live_ids)),
+            normalize_L2=snapshot._normalize_L2,
+            distance_strategy=snapshot.distance_strategy,
+        )
+
+    def _compact_snapshot(self) -> bool:
+        """Write a full snapshot from a consistent image (caller holds _save_lock)."""
+        snapshot_due = False
+        try:
+            started = time.perf_counter()
+            with StallProbe() as probe:
+                staging = SnapshotStaging(self.index_path)
+                try:
+                    # Capture under the read lock: searches continue, additions wait
+                    with self._index_lock.read_locked():
+                        dead = set(self._tombstones)
+                        purge = bool(dead) and (
+                            len(dead) / self.index.index.ntotal >= self.purge_threshold
+                        )
+                        # An index that fell back to flat is rebuilt as requested
+                        upgrade = self.index_spec is not None and self.index_spec.upgrade_due(
+                            self.index.index.ntotal - len(dead)
+                        )
+                        purge = purge or upgrade
+                        with self._lock:
+                            saved = len(self._unsaved)
+                            saved_deletes = len(self._unsaved_deletes)
+                            saved_updates = len(self._unsaved_updates)
+                            through_seq = self._delta_log.last_sequence()
+                            covered_lsn = self._applied_lsn
+                            # The image holds every change dropped to memory so far
+                            snapshot_due, self._snapshot_due = self._snapshot_due, False
+                        # A purge needs the rebuilt index in this process
+                        mode = "thread" if purge else self.snapshot_mode
+                        if mode == "fork":
+                            child = self._fork_snapshot(staging.path, dead, through_seq)
+                        else:
+                            snapshot = self._snapshot()
+                            lexical_bytes = _pickled(self._lexical)
+                            dedup_bytes = _pickled(self._dedup)
+
+                    if mode == "fork":
+                        _wait_for_child(child)
+                    else:
+                        if purge:
+                            mapping = snapshot.index_to_docstore_id
+                            live_positions = [
+                                p for p in range(snapshot.index.ntotal) if mapping[p] not in dead
+                            ]
+                            spec = replace(self.index_spec) if upgrade else None
+                            snapshot = self._purge(snapshot, dead, spec)
+                            if self._vectors is not None:
+                                self._vectors.copy_rows(live_positions, staging.path)
+                            if upgrade:
+                                self._write_spec(staging.path, spec)
+                        self._write_snapshot(
+                            staging.path, snapshot, () if purge else dead,
+                            lexical_bytes, dedup_bytes, through_seq,
+                        )
+                    if self._vectors is not None:
+                        self._vectors.sync()
+                    written = staging.commit()
+                except Exception:
+                    staging.abort()
+                    raise
+            self._delta_log.remove_compacted(through_seq)
+            if self._wal is not None:
+                self._wal.truncate(covered_lsn)
+            SAVE_BYTES.labels(kind="snapshot").observe(written)
+
+            if purge:
+                # Swap in the purged index, re-applying additions made meanwhile;
+                # deletions made meanwhile are still tombstones
+                with self._index_lock.write_locked():
+                    late = self._unsaved[saved:]
+                    if late:
+                        snapshot.add_embeddings(
+                            text_embeddings=[(r.text, r.vector) for r in late],
+                            metadatas=[r.metadata for r in late],
+                            ids=[r.doc_id for r in late],
+                        )
+                    late_updates = self._unsaved_updates[saved_updates:]
+                    if late_updates:
+                        update_metadata(snapshot.docstore, dict(late_updates))
+                    if self._vectors is not None:
+                        # The committed snapshot replaced vectors.f32 with the live rows
+                        self._vectors.reopen()
+                        if late:
+                            self._vectors.append(self._as_stored([r.vector for r in late]))
+                    self.index = snapshot
+                    if upgrade:
+                        self.index_spec = spec
+                    self._tombstones -= dead
+                    self._dead_positions = self._live_bits = None
+                    # Positions changed; rebuilt on the next filtered search
+                    self._metadata_index = None
+                if isinstance(snapshot.docstore, SqliteDocstore):
+                    # The committed snapshot no longer references these rows
+                    snapshot.docstore.delete(list(dead))
+                if upgrade:
+                    logger.info(f"Rebuilt the index as {spec.factory}")
+                if dead:
+                    logger.info(f"Purged {len(dead)} deleted documents from the index")
+                del snapshot
+
+            seconds = time.perf_counter() - started
+            SAVE_SECONDS.labels(kind="snapshot").observe(seconds)
+            SNAPSHOT_STALL_SECONDS.labels(mode=mode).observe(probe.max_seconds)
+            self.last_snapshot = {
+                "mode": mode,
+                "seconds": seconds,
+                "bytes": written,
+                "stall_seconds": probe.total_seconds,
+                "max_stall_seconds": probe.max_seconds,
+            }
+            with self._lock:
+                del self._unsaved[:saved]
+                del self._unsaved_deletes[:saved_deletes]
+                del self._unsaved_updates[:saved_updates]
+                self._mark_saved(seconds)
+
+            logger.info(
+                f"Compacted FAISS index snapshot at {self.index_path} in {seconds:.2f}s "
+                f"({mode}, longest stall {probe.max_seconds * 1000:.0f} ms)"
+            )
+            return True
+
+        except Exception as e:
+            SAVE_FAILURES.inc()
+            if snapshot_due:
+                with self._lock:
+                    self._snapshot_due = True
+            logger.error(f"Failed to compact FAISS index: {e}")
+            return False
+
+    def _write_snapshot(
+        self,
+        directory: str,
+        snapshot: FAISS,
+        dead: Iterable[str],
+        lexical_bytes: Optional[bytes],
+        dedup_bytes: Optional[bytes],
+        through_seq: int,
+    ) -> None:
+        """Write every file of a full snapshot into ``directory``."""
+        snapshot.save_local(directory)
+        self._delta_log.write_tombstones(dead, directory)
+        if lexical_bytes is not None:
+            write_lexical_bytes(directory, lexical_bytes)
+        if dedup_bytes is not None:
+            write_dedup_bytes(directory, dedup_bytes)
+        self._delta_log.write_state(through_seq, directory)
+
+    def _write_spec(self, directory: str, spec: IndexSpec) -> None:
+        """Record the type of a rebuilt index in the persisted spec."""
+        persisted = IndexSpec.load(self.index_path) or replace(spec)
+        persisted.factory = spec.factory
+        persisted.requested = spec.requested
+        persisted.save(directory)
+
+    def _fork_snapshot(self, directory: str, dead: Set[str], through_seq: int) -> int:
+        """
+        Fork a child that writes the index as it is now (caller holds the read lock).
+
+        The child sees a copy-on-write image of the whole process, so nothing
+        is copied or pickled here; only the fork itself pauses other threads.
+
+        Returns:
+            Process ID of the child
+        """
+        with warnings.catch_warnings():
+            # Python 3.12+ warns about forking a multi-threaded process; the
+            # child below only serializes and exits
+            warnings.simplefilter("ignore", DeprecationWarning)
+            pid = os.fork()
+        if pid:
+            return pid
+
+        # Child: only this thread exists, so stay clear of logging and any
+        # lock another thread may have held at the fork
+        status = 1
+        try:
+            self._write_snapshot(
+                directory, self.index, dead,
+                _pickled(self._lexical), _pickled(self._dedup), through_seq,
+            )
+            status = 0
+        except BaseException as e:
+            os.write(2, f"Snapshot process failed: {e}\n".encode("utf-8", "replace"))
+        finally:
+            os._exit(status)
+
     def force_save(self) -> bool:
         """
         Force an immediate save of the index.
@@ -157,33 +1365,225 @@ class BatchedPersistenceManager:
         with self._lock:
             return self._is_dirty
 
-    def shutdown(self):
-        """Shutdown the persistence manager and save any pending changes."""
-        self._shutdown = True
+    def shutdown(self) -> bool:
+        """
+        Stop the persistence thread, then flush every pending change.
 
-        # Save any pending changes
-        if self._is_dirty:
-            self._save_now()
+        Safe to call more than once. Managers that are never shut down are
+        flushed at interpreter exit.
 
-        # Wait for the persistence thread to finish
-        if self._persistence_thread and self._persistence_thread.is_alive():
-            self._persistence_thread.join(timeout=5.0)
+        Returns:
+            True if nothing is left unsaved
+        """
+        with self._changed:
+            self._shutdown = True
+            self._changed.notify_all()
 
-    def __del__(self):
-        """Ensure clean shutdown when the object is destroyed."""
-        try:
-            self.shutdown()
-        except Exception:
-            pass
+        # Let a save in progress finish before the final flush
+        thread = self._persistence_thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join()
+        _LIVE_MANAGERS.discard(self)
+
+        saved = self._delta_log is None or not self.is_dirty() or self._save_now()
+        if not saved:
+            logger.error(f"Final flush failed; unsaved changes to {self.index_path} remain")
+        if self._wal is not None:
+            self._wal.close()
+        return saved
 
-    # Delegate other methods to the underlying index
+    def __enter__(self) -> "BatchedPersistenceManager":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    # Delegate other methods to the underlying index. Queries are embedded
+    # before taking the read lock so slow embedding calls never delay writers.
     def similarity_search(self, query: str, k: int = 1, **kwargs):
         """Search for similar documents."""
-        return self.index.similarity_search(query, k=k, **kwargs)
+        return self.similarity_search_by_vector(self.embed_query(query), k=k, **kwargs)
 
     def similarity_search_with_score(self, query: str, k: int = 1, **kwargs):
         """Search for similar documents with similarity scores."""
-        return self.index.similarity_search_with_score(query, k=k, **kwargs)
+        return self.similarity_search_with_score_by_vector(
+            self.embed_query(query), k=k, **kwargs
+        )
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 1, **kwargs):
+        """Search for documents similar to an embedding vector."""
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 1,
+        metadata_filter: Optional[Mapping[str, Any]] = None,
+        **kwargs,
+    ):
+        """
+        Search for documents similar to an embedding vector, with scores.
+
+        ``metadata_filter`` (see metadata_filter.py) restricts the search to
+        matching documents inside FAISS; LangChain's ``filter`` keyword still
+        post-filters over-fetched candidates.
+        """
+        if metadata_filter:
+            with _FILTERED_SEARCH_SECONDS.time(), self._index_lock.read_locked():
+                return self._filtered_search(embedding, k, metadata_filter)
+        with _UNFILTERED_SEARCH_SECONDS.time(), self._index_lock.read_locked():
+            dead = self._tombstones
+            if self._vectors is not None and not kwargs:
+                return self._reranked_search(embedding, k)
+            if not dead:
+                return self.index.similarity_search_with_score_by_vector(
+                    embedding, k=k, **kwargs
+                )
+            if not kwargs:
+                scores, positions = self._search_live(self._as_stored([embedding]), k)
+                return self._documents_at(
+                    (int(position), float(score))
+                    for score, position in zip(scores[0], positions[0])
+                    if position != -1
+                )
+            # LangChain's own search takes no ID selector: over-fetch so that k
+            # live documents remain after dropping tombstones
+            if kwargs.get("filter") is not None:
+                kwargs["fetch_k"] = kwargs.get("fetch_k", 20) + len(dead)
+            results = self.index.similarity_search_with_score_by_vector(
+                embedding, k=k + len(dead), **kwargs
+            )
+            return [(doc, score) for doc, score in results if doc.id not in dead][:k]
+
+    def _metadata(self) -> MetadataIndex:
+        """The metadata index, built on first use (caller holds the read lock)."""
+        with self._metadata_lock:
+            if self._metadata_index is None:
+                metadata_index = MetadataIndex(self.filter_fields)
+                mapping = self.index.index_to_docstore_id
+                docstore = self.index.docstore
+                if isinstance(docstore, SqliteDocstore):
+                    # Read metadata columns only; the text stays on disk
+                    metadatas = docstore.search_metadata(mapping.values())
+                    for position, doc_id in mapping.items():
+                        if doc_id in metadatas:
+                            metadata_index.add(position, doc_id, metadatas[doc_id])
+                else:
+                    for position, doc_id in mapping.items():
+                        doc = docstore.search(doc_id)
+                        if isinstance(doc, Document):
+                            metadata_index.add(position, doc_id, doc.metadata)
+                self._metadata_index = metadata_index
+                logger.info(f"Built metadata filter index over {self.filter_fields}")
+            return self._metadata_index
+
+    def _filtered_search(
+        self, embedding: List[float], k: int, metadata_filter: Mapping[str, Any]
+    ) -> List[Tuple[Document, float]]:
+        """Search only documents matching a metadata filter (caller holds the read lock)."""
+        metadata_index = self._metadata()
+        ntotal = self.index.index.ntotal
+        bitmap = metadata_index.bitmap(metadata_filter, ntotal)
+        if self._tombstones:
+            clear_positions(bitmap, metadata_index.positions_of(self._tombstones))
+
+        vector = self._as_stored([embedding])
+        if self._vectors is not None:
+            _, positions = search_bitmap(self.index.index, vector, k * self.rerank, bitmap)
+            shortlist = [position for position in positions[0] if position != -1]
+            return self._documents_at(
+                exact_rerank(vector[0], shortlist, self._vectors, self.index.index.metric_type, k)
+            )
+        scores, positions = search_bitmap(self.index.index, vector, k, bitmap)
+
+        results = []
+        for score, position in zip(scores[0], positions[0]):
+            if position == -1:
+                continue
+            doc = self.index.docstore.search(self.index.index_to_docstore_id[position])
+            if isinstance(doc, Document):
+                results.append((doc, float(score)))
+        return results
+
+    def _live_bitmap(self) -> np.ndarray:
+        """
+        Packed bitmap of the positions of live vectors (caller holds the read lock).
+
+        Deleted positions are found with one pass over ``index_to_docstore_id``
+        after tombstones change; additions only extend the bitmap.
+        """
+        ntotal = self.index.index.ntotal
+        with self._metadata_lock:
+            if self._live_bits is None or self._live_bits[0] != ntotal:
+                if self._dead_positions is None:
+                    dead = self._tombstones
+                    self._dead_positions = np.fromiter(
+                        (p for p, d in self.index.index_to_docstore_id.items() if d in dead),
+                        dtype=np.int64,
+                    )
+                bitmap = np.full((ntotal + 7) // 8, 0xFF, dtype=np.uint8)
+                clear_positions(bitmap, self._dead_positions)
+                self._live_bits = (ntotal, bitmap)
+            return self._live_bits[1]
+
+    def _search_live(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the index for live vectors only (caller holds the read lock)."""
+        index = self.index.index
+        if not self._tombstones:
+            return index.search(vectors, k)
+        bitmap = self._live_bitmap()
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        return index.search(vectors, k, params=search_parameters(index, selector))
+
+    def _reranked_search(self, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Search a shortlist in the index, then rescore it exactly (caller holds the read lock)."""
+        vector = self._as_stored([embedding])
+        _, positions = self._search_live(vector, k * self.rerank)
+        shortlist = [position for position in positions[0] if position != -1]
+        return self._documents_at(
+            exact_rerank(vector[0], shortlist, self._vectors, self.index.index.metric_type, k)
+        )
+
+    def _documents_at(self, ranked: Iterable[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        """Documents for (position, score) pairs, skipping missing ones."""
+        results = []
+        for position, score in ranked:
+            doc = self.index.docstore.search(self.index.index_to_docstore_id[position])
+            if isinstance(doc, Document):
+                results.append((doc, score))
+        return results
+
+    def lexical_search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """
+        Search the BM25 index without embedding the query.
+
+        Returns:
+            (Document, BM25 score) pairs, best first
+        """
+        if self._lexical is None:
+            raise RuntimeError("Lexical index is not enabled for this index")
+        if not self._lexical_synced:
+            with self._metadata_lock:
+                if not self._lexical_synced:
+                    self._sync_lexical()
+                    self._lexical_synced = True
+        with self._index_lock.read_locked():
+            hits = self._lexical.search(query, k)
+            docs = [(self.index.docstore.search(doc_id), score) for doc_id, score in hits]
+        return [(doc, score) for doc, score in docs if isinstance(doc, Document)]
+
+    @property
+    def has_lexical_index(self) -> bool:
+        """Whether a BM25 index is maintained alongside the vector index."""
+        return self._lexical is not None
+
+    @property
+    def has_dedup(self) -> bool:
+        """Whether near-duplicate detection is enabled."""
+        return self._dedup is not None
 
     @property
     def docstore(self):
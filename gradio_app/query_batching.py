@@ -0,0 +1,141 @@
+"""
+Micro-batched Query Embedding
+
+Each retrieval embeds its question on its own. With a local model, concurrent
+requests then run many one-row forward passes that contend for the same
+cores, while one pass over a batch of rows costs little more than a single
+row. ``QueryCoalescer`` holds a query for at most ``window`` seconds so that
+queries arriving meanwhile for the same index are embedded in one
+``embed_queries`` call, then hands every caller its own vector back. Models
+without a batched query method still embed each query with ``embed_query``,
+so a query gets the same vector whether or not it shared a batch.
+
+There is no background thread: the first caller of a batch waits out the
+window (or until ``max_batch`` queries have joined), embeds the batch and
+wakes the others. Each caller then runs its own vector search; FAISS
+releases the GIL while searching, so those searches still run in parallel.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    # Fallback for direct execution
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WINDOW = 0.005
+DEFAULT_MAX_BATCH = 32
+
+QUERY_BATCH_SIZE = REGISTRY.histogram(
+    "rag_query_batch_size",
+    "Queries embedded together by the query coalescer",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+QUERY_QUEUE_SECONDS = REGISTRY.histogram(
+    "rag_query_queue_seconds", "Time a query waited for its batch to start embedding"
+)
+
+
+class _Pending:
+    __slots__ = ("query", "enqueued", "vector", "error", "done")
+
+    def __init__(self, query: str):
+        self.query = query
+        self.enqueued = time.perf_counter()
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class _Batch:
+    __slots__ = ("index", "items", "full")
+
+    def __init__(self, index: Any):
+        self.index = index
+        self.items: List[_Pending] = []
+        self.full = threading.Event()
+
+
+class QueryCoalescer:
+    """
+    Embeds concurrent queries for the same index in shared batches.
+
+    Usage:
+        coalescer = QueryCoalescer(window=0.005, max_batch=32)
+        vector = coalescer.embed(index, "What is RAG?")
+        docs = index.similarity_search_by_vector(vector, k=4)
+    """
+
+    def __init__(self, window: float = DEFAULT_BATCH_WINDOW, max_batch: int = DEFAULT_MAX_BATCH):
+        """
+        Args:
+            window: Seconds the first query of a batch waits for others
+            max_batch: Queries at which a batch is embedded without waiting
+                out the window
+        """
+        if window < 0:
+            raise ValueError("window must not be negative")
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.window = window
+        self.max_batch = max_batch
+        # Batches still accepting queries, by index identity
+        self._open: Dict[int, _Batch] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, index: Any, query: str) -> List[float]:
+        """
+        Embed ``query`` with ``index``'s embedding function, batched with others.
+
+        Raises:
+            Whatever embedding the batch raised
+        """
+        item = _Pending(query)
+        key = id(index)
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch(index)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            self._run(batch)
+        else:
+            item.done.wait()
+
+        if item.error is not None:
+            raise item.error
+        return item.vector
+
+    @staticmethod
+    def _run(batch: _Batch) -> None:
+        """Embed a closed batch and wake its callers."""
+        started = time.perf_counter()
+        QUERY_BATCH_SIZE.observe(len(batch.items))
+        for item in batch.items:
+            QUERY_QUEUE_SECONDS.observe(started - item.enqueued)
+        try:
+            vectors = batch.index.embed_queries([item.query for item in batch.items])
+            for item, vector in zip(batch.items, vectors):
+                item.vector = vector
+        except BaseException as e:
+            logger.error(f"Embedding a batch of {len(batch.items)} queries failed: {e}")
+            for item in batch.items:
+                item.error = e
+        finally:
+            for item in batch.items:
+                item.done.set()
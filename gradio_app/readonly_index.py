@@ -0,0 +1,109 @@
+"""
+Memory-mapped, Read-only FAISS Loading
+
+``FAISS.load_local`` copies the whole vector file and unpickles the full
+docstore into every process that loads it. This module maps the vector file
+from disk instead, so several worker processes on one machine share a single
+copy through the page cache, and defers unpickling the docstore until the
+first search actually needs a document.
+"""
+
+import logging
+import os
+import pickle
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Union
+
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# IO_FLAG_MMAP_IFC maps flat vector storage without copying it (faiss >= 1.10);
+# older releases only support mapping inverted lists with IO_FLAG_MMAP.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class _LazyPickle:
+    """Unpickles ``index.pkl`` on first access and caches the result."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    with open(self.path, "rb") as f:
+                        value = pickle.load(f)
+                    # Disk-backed docstores reopen their files next to index.pkl
+                    bind = getattr(value[0], "bind", None)
+                    if bind is not None:
+                        bind(os.path.dirname(self.path))
+                    self._value = value
+                    logger.info(f"Loaded docstore from {self.path}")
+        return self._value
+
+    def is_loaded(self) -> bool:
+        return self._value is not None
+
+
+class LazyDocstore(Docstore):
+    """Read-only docstore that is loaded from disk on first lookup."""
+
+    def __init__(self, source: _LazyPickle):
+        self._source = source
+
+    def search(self, search: str) -> Union[str, Document]:
+        docstore, _ = self._source.get()
+        return docstore.search(search)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"_source": self._source.path}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._source = _LazyPickle(state["_source"])
+
+
+class LazyIndexMapping(Mapping):
+    """Read-only view of ``index_to_docstore_id`` loaded on first access."""
+
+    def __init__(self, source: _LazyPickle):
+        self._source = source
+
+    def _mapping(self) -> Dict[int, str]:
+        return self._source.get()[1]
+
+    def __getitem__(self, key: int) -> str:
+        return self._mapping()[key]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._mapping())
+
+    def __len__(self) -> int:
+        return len(self._mapping())
+
+
+def load_mmap_index(path: str, embeddings: Embeddings, index_name: str = "index") -> FAISS:
+    """
+    Open a saved FAISS index with memory-mapped vectors and a lazy docstore.
+
+    The returned index is read-only: adding documents to it is not supported.
+
+    Args:
+        path: Directory written by ``FAISS.save_local``
+        embeddings: Embeddings used to embed queries
+        index_name: Base name of the ``.faiss``/``.pkl`` files
+
+    Returns:
+        FAISS vector store backed by the mapped index file
+    """
+    index = faiss.read_index(os.path.join(path, f"{index_name}.faiss"), MMAP_FLAGS)
+    source = _LazyPickle(os.path.join(path, f"{index_name}.pkl"))
+    return FAISS(embeddings, index, LazyDocstore(source), LazyIndexMapping(source))
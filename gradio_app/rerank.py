@@ -0,0 +1,119 @@
+"""
+Exact Re-ranking from Full-precision Vectors on Disk
+
+Scalar-quantized indexes (``IndexSpec.storage`` "float16" or "int8") keep
+vectors at half or a quarter of their float32 size, at some cost in recall.
+``FloatVectorFile`` keeps the float32 vectors in ``vectors.f32`` next to the
+index, one row per index position, and is read with ``pread`` only for the
+shortlist a search returns. ``rerank`` rescores that shortlist exactly, so
+most of the recall comes back while the vectors in RAM stay compressed.
+"""
+
+import logging
+import os
+import threading
+from typing import Iterable, List, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+
+
+class FloatVectorFile:
+    """Append-only float32 vectors stored in index position order."""
+
+    def __init__(self, directory: str, dim: int, writable: bool = True):
+        self.path = os.path.join(directory, VECTORS_FILE)
+        self.dim = dim
+        self.writable = writable
+        self._row_bytes = 4 * dim
+        self._lock = threading.Lock()
+        self._fd = -1
+        self._fd = self._open()
+
+    def _open(self) -> int:
+        if self.writable:
+            return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return os.open(self.path, os.O_RDONLY)
+
+    def __len__(self) -> int:
+        return os.fstat(self._fd).st_size // self._row_bytes
+
+    def append(self, vectors: Sequence[Sequence[float]]) -> None:
+        """Write rows for positions following the current last one."""
+        data = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            os.pwrite(self._fd, data.tobytes(), len(self) * self._row_bytes)
+
+    def rows(self, positions: Sequence[int]) -> np.ndarray:
+        """Read the vectors at ``positions``."""
+        out = np.empty((len(positions), self.dim), dtype=np.float32)
+        for i, position in enumerate(positions):
+            out[i] = np.frombuffer(
+                os.pread(self._fd, self._row_bytes, int(position) * self._row_bytes),
+                dtype=np.float32,
+            )
+        return out
+
+    def truncate(self, count: int) -> None:
+        """Drop rows from ``count`` on, e.g. left by changes lost in a crash."""
+        with self._lock:
+            os.ftruncate(self._fd, count * self._row_bytes)
+
+    def sync(self) -> None:
+        """fsync the file before a save records the positions it covers."""
+        os.fsync(self._fd)
+
+    def copy_rows(self, positions: Iterable[int], directory: str) -> None:
+        """Write the rows at ``positions``, in order, as ``vectors.f32`` in ``directory``."""
+        positions = list(positions)
+        with open(os.path.join(directory, VECTORS_FILE), "wb") as f:
+            for start in range(0, len(positions), 65536):
+                f.write(self.rows(positions[start:start + 65536]).tobytes())
+
+    def reopen(self) -> None:
+        """Switch to the file now at ``path``, e.g. after a snapshot replaced it."""
+        with self._lock:
+            os.close(self._fd)
+            self._fd = self._open()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+    def __del__(self):
+        self.close()
+
+
+def rerank(
+    query: np.ndarray,
+    positions: Sequence[int],
+    vectors: FloatVectorFile,
+    metric_type: int,
+    k: int,
+) -> List[Tuple[int, float]]:
+    """
+    Rescore a shortlist with exact float32 distances.
+
+    Scores follow the index metric: squared L2 distance (smaller is closer)
+    or inner product (larger is closer).
+
+    Returns:
+        Up to ``k`` (position, score) pairs, best first
+    """
+    if not len(positions):
+        return []
+    candidates = vectors.rows(positions)
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        scores = candidates @ query
+        order = np.argsort(-scores)
+    else:
+        diff = candidates - query
+        scores = np.einsum("ij,ij->i", diff, diff)
+        order = np.argsort(scores)
+    return [(int(positions[i]), float(scores[i])) for i in order[:k]]
@@ -0,0 +1,430 @@
+"""
+Sharded Vector Index with Scatter-Gather Search
+
+One ``BatchedPersistenceManager`` keeps the whole corpus in one FAISS index
+searched by one thread per query. ``ShardedIndexManager`` splits documents
+across N managers, each with its own index directory (``shard-000`` ...),
+delta log and persistence thread. Documents are routed by a hash of their
+title (or ID when untitled), so all chunks of a document live on one shard
+and upserts and deletes by title stay local. Searches run on every shard in
+parallel; FAISS releases the GIL while searching, so shards use separate
+cores, and the per-shard top-k lists are merged into the global top-k.
+"""
+
+import heapq
+import json
+import logging
+import os
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+try:
+    from .faiss_helper import get_embeddings, load_or_build_index
+    from .index_spec import IndexSpec
+    from .persistence_manager import BatchedPersistenceManager
+except ImportError:
+    # Fallback for direct execution
+    from faiss_helper import get_embeddings, load_or_build_index
+    from index_spec import IndexSpec
+    from persistence_manager import BatchedPersistenceManager
+
+logger = logging.getLogger(__name__)
+
+SHARDS_FILE = "shards.json"
+DEFAULT_SHARDS = 4
+
+
+def shard_key(document: Document) -> str:
+    """Routing key of a document: its title, or its ID if it has no title."""
+    title = document.metadata.get("title")
+    return str(title) if title is not None else document.id
+
+
+def hash_shard(key: str, num_shards: int) -> int:
+    """Shard of a routing key, stable across processes and restarts."""
+    return zlib.crc32(key.encode("utf-8")) % num_shards
+
+
+def shard_path(path: str, shard: int) -> str:
+    """Index directory of one shard."""
+    return os.path.join(path, f"shard-{shard:03d}")
+
+
+def read_shard_count(path: str) -> Optional[int]:
+    """Number of shards of the sharded index at ``path``, or None if it is not sharded."""
+    try:
+        with open(os.path.join(path, SHARDS_FILE), encoding="utf-8") as f:
+            return int(json.load(f)["shards"])
+    except FileNotFoundError:
+        return None
+
+
+class ShardedIndexManager:
+    """
+    Hash-partitioned set of BatchedPersistenceManager shards.
+
+    Offers the manager methods used by the app and ingestion code, so it can
+    stand in for a single BatchedPersistenceManager.
+    """
+
+    def __init__(
+        self,
+        shards: Sequence[BatchedPersistenceManager],
+        index_path: Optional[str] = None,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Args:
+            shards: One persistence manager per shard, in shard order
+            index_path: Directory holding the shard directories
+            max_workers: Threads for parallel shard operations (default: one per shard)
+        """
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.shards = list(shards)
+        self.index_path = index_path
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards), thread_name_prefix="IndexShard"
+        )
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shards)
+
+    def shard_for(self, key: str) -> int:
+        """Shard that a routing key (title or document ID) belongs to."""
+        return hash_shard(key, len(self.shards))
+
+    def _map(self, fn: Callable[[BatchedPersistenceManager], Any], shards=None) -> List[Any]:
+        """Run ``fn`` on the given shards (default: all) in parallel."""
+        shards = self.shards if shards is None else shards
+        if len(shards) == 1:
+            return [fn(shards[0])]
+        return list(self._executor.map(fn, shards))
+
+    def _route(self, documents: List[Document]) -> Dict[int, List[int]]:
+        """Give documents IDs where missing and group their positions by shard."""
+        routes: Dict[int, List[int]] = {}
+        for i, doc in enumerate(documents):
+            if not getattr(doc, "id", None):
+                doc.id = str(uuid.uuid4())
+            routes.setdefault(self.shard_for(shard_key(doc)), []).append(i)
+        return routes
+
+    def _apply_routed(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        apply: Callable[[BatchedPersistenceManager, List[Document], List[List[float]]], List[str]],
+    ) -> List[str]:
+        """Apply a change to each shard's share of the documents; IDs keep input order."""
+        if len(documents) != len(vectors):
+            raise ValueError("Number of documents and vectors must match")
+        routes = self._route(documents)
+        order = list(routes)
+
+        def _apply(shard: BatchedPersistenceManager) -> List[str]:
+            positions = routes[self.shards.index(shard)]
+            return apply(
+                shard, [documents[i] for i in positions], [vectors[i] for i in positions]
+            )
+
+        ids: List[Optional[str]] = [None] * len(documents)
+        results = self._map(_apply, [self.shards[s] for s in order])
+        for shard, shard_ids in zip(order, results):
+            for position, doc_id in zip(routes[shard], shard_ids):
+                ids[position] = doc_id
+        return ids
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        """Embed and add documents, each to the shard its key hashes to."""
+        documents, _ = self.deduplicate(documents)
+        if not documents:
+            return []
+        vectors = self.embed_documents([doc.page_content for doc in documents])
+        return self.add_embedded_documents(documents, vectors)
+
+    def add_embedded_documents(
+        self, documents: List[Document], vectors: List[List[float]]
+    ) -> List[str]:
+        """Add embedded documents; shards are updated in parallel."""
+        return self._apply_routed(
+            documents, vectors, lambda shard, docs, vecs: shard.add_embedded_documents(docs, vecs)
+        )
+
+    def upsert_documents(self, documents: List[Document], by_title: bool = True) -> List[str]:
+        """Add documents, replacing existing versions of them (see the shard method)."""
+        titles = {doc.metadata["title"] for doc in documents if "title" in doc.metadata}
+        documents, _ = self.deduplicate(documents, replacing_titles=titles if by_title else ())
+        if not documents:
+            return []
+        vectors = self.embed_documents([doc.page_content for doc in documents])
+        return self.upsert_embedded_documents(documents, vectors, by_title=by_title)
+
+    def upsert_embedded_documents(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        by_title: bool = True,
+    ) -> List[str]:
+        """
+        Add embedded documents and delete the versions they replace.
+
+        Every version of a title lives on the same shard, so each shard
+        replaces its documents atomically.
+        """
+        return self._apply_routed(
+            documents,
+            vectors,
+            lambda shard, docs, vecs: shard.upsert_embedded_documents(
+                docs, vecs, by_title=by_title
+            ),
+        )
+
+    def deduplicate(
+        self, documents: List[Document], replacing_titles: Iterable[str] = ()
+    ) -> Tuple[List[Document], List[Tuple[Document, str]]]:
+        """
+        Drop near-duplicates of chunks on any shard or earlier in the list.
+
+        Survivors of one shard's check are checked against the next shard.
+        """
+        replacing_titles = list(replacing_titles)
+        kept, duplicates = list(documents), []
+        for shard in self.shards:
+            if not kept or not shard.has_dedup:
+                break
+            kept, skipped = shard.deduplicate(kept, replacing_titles=replacing_titles)
+            duplicates.extend(skipped)
+        return kept, duplicates
+
+    def delete(
+        self, ids: Optional[Iterable[str]] = None, titles: Optional[Iterable[str]] = None
+    ) -> int:
+        """
+        Delete documents by ID and/or title.
+
+        Titles go to their shard only; IDs are looked up on every shard,
+        since upserts may give a document a fresh ID on its title's shard.
+        """
+        ids = list(ids or ())
+        by_shard: Dict[int, List[str]] = {}
+        for title in titles or ():
+            by_shard.setdefault(self.shard_for(str(title)), []).append(title)
+        targets = list(range(len(self.shards))) if ids else list(by_shard)
+        if not targets:
+            return 0
+        counts = self._map(
+            lambda shard: shard.delete(
+                ids=ids, titles=by_shard.get(self.shards.index(shard), ())
+            ),
+            [self.shards[s] for s in targets],
+        )
+        return sum(counts)
+
+    @property
+    def has_dedup(self) -> bool:
+        return self.shards[0].has_dedup
+
+    @property
+    def has_lexical_index(self) -> bool:
+        return self.shards[0].has_lexical_index
+
+    @property
+    def read_only(self) -> bool:
+        return all(shard.read_only for shard in self.shards)
+
+    @property
+    def filter_fields(self) -> Tuple[str, ...]:
+        return self.shards[0].filter_fields
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the shards' (shared) embedding function."""
+        return self.shards[0].embed_documents(texts)
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query once for all shards."""
+        return self.shards[0].embed_query(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries in one model call for all shards."""
+        return self.shards[0].embed_queries(queries)
+
+    def _merge(
+        self, results: Iterable[List[Tuple[Document, float]]], k: int, higher_is_better: bool
+    ) -> List[Tuple[Document, float]]:
+        hits = [hit for shard_hits in results for hit in shard_hits]
+        select = heapq.nlargest if higher_is_better else heapq.nsmallest
+        return select(k, hits, key=lambda hit: hit[1])
+
+    def similarity_search(self, query: str, k: int = 1, **kwargs):
+        """Search all shards for similar documents."""
+        return self.similarity_search_by_vector(self.embed_query(query), k=k, **kwargs)
+
+    def similarity_search_with_score(self, query: str, k: int = 1, **kwargs):
+        """Search all shards for similar documents with scores."""
+        return self.similarity_search_with_score_by_vector(
+            self.embed_query(query), k=k, **kwargs
+        )
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 1, **kwargs):
+        """Search all shards for documents similar to an embedding vector."""
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 1, **kwargs
+    ) -> List[Tuple[Document, float]]:
+        """
+        Scatter a search to every shard in parallel and gather the global top-k.
+
+        Accepts the keyword arguments of the shard method, e.g. ``metadata_filter``.
+        """
+        results = self._map(
+            lambda shard: shard.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+        )
+        strategy = self.shards[0].index.distance_strategy
+        return self._merge(results, k, strategy == DistanceStrategy.MAX_INNER_PRODUCT)
+
+    def lexical_search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """
+        BM25 search on every shard, merged by score.
+
+        Each shard scores with its own term statistics, which approximate the
+        global ones when documents are spread evenly.
+        """
+        return self._merge(self._map(lambda shard: shard.lexical_search(query, k)), k, True)
+
+    def add_change_listener(self, listener: Callable[[List[Document]], None]) -> None:
+        """Register a change callback on every shard."""
+        for shard in self.shards:
+            shard.add_change_listener(listener)
+
+    def compact(self) -> bool:
+        """Compact every shard's snapshot; True if all succeeded."""
+        return all(self._map(lambda shard: shard.compact()))
+
+    def force_save(self) -> bool:
+        """Save every shard; True if all succeeded."""
+        return all(self._map(lambda shard: shard.force_save()))
+
+    def get_pending_count(self) -> int:
+        return sum(shard.get_pending_count() for shard in self.shards)
+
+    def is_dirty(self) -> bool:
+        return any(shard.is_dirty() for shard in self.shards)
+
+    def shard_sizes(self) -> List[int]:
+        """Number of vectors (including tombstones) in each shard."""
+        return [shard.index.index.ntotal for shard in self.shards]
+
+    def shutdown(self) -> None:
+        """Shut down every shard, saving pending changes, and stop the thread pool."""
+        self._map(lambda shard: shard.shutdown())
+        self._executor.shutdown(wait=True)
+
+
+def _build_shards(
+    docs: Dict[str, str], num_shards: int, embeddings, spec: IndexSpec
+) -> List[FAISS]:
+    """
+    Build the initial shard vector stores from ``docs``.
+
+    Every shard's index is trained on all initial vectors, so IVF/PQ shards
+    share centroids and shards that receive no documents still get a
+    trained index of the right dimension.
+
+    Raises:
+        ValueError: If ``docs`` is empty
+    """
+    titles = list(docs)
+    texts = [docs[title] for title in titles]
+    vectors = embeddings.embed_documents(texts)
+    trained = spec.build(vectors)
+    stores = [
+        FAISS(embeddings, faiss.clone_index(trained), InMemoryDocstore(), {})
+        for _ in range(num_shards)
+    ]
+    for title, text, vector in zip(titles, texts, vectors):
+        stores[hash_shard(title, num_shards)].add_embeddings(
+            [(text, vector)], metadatas=[{"title": title}]
+        )
+    return stores
+
+
+def load_or_build_sharded_index(
+    docs: Dict[str, str],
+    path: Optional[str] = None,
+    *,
+    shards: Optional[int] = None,
+    use_openai: bool = True,
+    embedding_cache: Optional[str] = None,
+    index_spec: Optional[IndexSpec] = None,
+    max_workers: Optional[int] = None,
+    lazy_embeddings: bool = False,
+    **kwargs,
+) -> ShardedIndexManager:
+    """
+    Load a sharded index from ``path`` or build one from ``docs``.
+
+    Args:
+        docs: Dictionary of document titles to content for a new index
+        path: Directory holding ``shards.json`` and one directory per shard;
+            None keeps the shards in memory
+        shards: Number of shards for a new index (default: DEFAULT_SHARDS);
+            an existing index keeps the count recorded in ``shards.json``
+        use_openai: Whether to use OpenAI embeddings
+        embedding_cache: Optional SQLite embedding cache shared by the shards
+        index_spec: FAISS index type of every shard
+        max_workers: Threads for parallel shard operations
+        lazy_embeddings: Create the shared embedding model on first use
+        **kwargs: Passed to ``load_or_build_index`` for every shard (batch
+            size, lexical index, dedup, filter fields, ...)
+
+    Returns:
+        ShardedIndexManager over the shards
+    """
+    if shards is not None and shards < 1:
+        raise ValueError("shards must be at least 1")
+    existing = read_shard_count(path) if path else None
+    if existing is None and path and os.path.exists(os.path.join(path, "index.faiss")):
+        raise ValueError(f"{path} holds an unsharded index; load it without --shards")
+    if existing is not None and shards is not None and existing != shards:
+        logger.warning(f"{path} has {existing} shards; ignoring the requested {shards}")
+    num_shards = existing or shards or DEFAULT_SHARDS
+
+    embeddings = get_embeddings(use_openai, cache_path=embedding_cache, lazy=lazy_embeddings)
+    spec = replace(index_spec) if index_spec else IndexSpec()
+    stores: List[Optional[FAISS]] = [None] * num_shards
+    if existing is None:
+        stores = _build_shards(docs, num_shards, embeddings, spec)
+
+    managers = [
+        load_or_build_index(
+            {},
+            shard_path(path, shard) if path else None,
+            use_openai=use_openai,
+            embedding_cache=embedding_cache,
+            # New shards persist the spec as built, including any fallback
+            index_spec=index_spec if existing is not None else spec,
+            embeddings=embeddings,
+            index=stores[shard],
+            **kwargs,
+        )
+        for shard in range(num_shards)
+    ]
+    if path and existing is None:
+        with open(os.path.join(path, SHARDS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"shards": num_shards}, f)
+    return ShardedIndexManager(managers, index_path=path, max_workers=max_workers)
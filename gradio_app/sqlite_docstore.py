@@ -0,0 +1,178 @@
+"""
+SQLite-backed Docstore
+
+LangChain's ``InMemoryDocstore`` keeps the full text of every chunk in RAM and
+``save_local`` pickles all of it with every snapshot, although most of it is
+never read between restarts. ``SqliteDocstore`` keeps ``page_content`` and
+metadata in ``docstore.sqlite`` next to the index instead. Searches fetch
+only the documents they return, new documents are inserted without touching
+existing rows, and a snapshot pickles nothing but the file name, so resident
+memory is dominated by the vectors.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+DOCSTORE_FILE = "docstore.sqlite"
+DOCSTORE_BACKENDS = ("memory", "sqlite")
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+class SqliteDocstore(Docstore, AddableMixin):
+    """
+    Docstore whose documents live in a SQLite file and are read on demand.
+
+    Pickling keeps only the file name, so the store is re-attached to the
+    index directory with ``bind`` after the snapshot is unpickled.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.path: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if directory is not None:
+            self.bind(directory)
+
+    def bind(self, directory: str) -> None:
+        """Open (creating if needed) ``docstore.sqlite`` in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, DOCSTORE_FILE)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self.path = path
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Snapshots reference these rows, so they must survive power loss
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id TEXT PRIMARY KEY,"
+                " page_content TEXT NOT NULL,"
+                " metadata BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError("SqliteDocstore is not bound to an index directory")
+        return self._conn
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Fetch one document, or a "not found" message as InMemoryDocstore does."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT page_content, metadata FROM documents WHERE id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=pickle.loads(row[1]))
+
+    def mget(self, ids: Iterable[str]) -> Dict[str, Document]:
+        """Fetch several documents in batched queries."""
+        ids = list(ids)
+        found: Dict[str, Document] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                chunk = ids[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for doc_id, text, metadata in conn.execute(
+                    f"SELECT id, page_content, metadata FROM documents"
+                    f" WHERE id IN ({placeholders})",
+                    chunk,
+                ):
+                    found[doc_id] = Document(
+                        id=doc_id, page_content=text, metadata=pickle.loads(metadata)
+                    )
+        return found
+
+    def search_metadata(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch only the metadata of several documents, never their text."""
+        ids = list(ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                chunk = ids[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for doc_id, metadata in conn.execute(
+                    f"SELECT id, metadata FROM documents WHERE id IN ({placeholders})", chunk
+                ):
+                    found[doc_id] = pickle.loads(metadata)
+        return found
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Insert documents in one transaction; replayed IDs overwrite their rows."""
+        rows = [
+            (
+                doc_id,
+                doc.page_content,
+                pickle.dumps(doc.metadata, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+            for doc_id, doc in texts.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, page_content, metadata) VALUES (?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+
+    def delete(self, ids: List) -> None:
+        """Remove documents, e.g. once a purge dropped their vectors."""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("DELETE FROM documents WHERE id = ?", [(i,) for i in ids])
+            conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"filename": DOCSTORE_FILE}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.path = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+
+def move_to_sqlite(index: FAISS, directory: str) -> SqliteDocstore:
+    """
+    Copy the documents of an in-memory docstore into ``directory`` and swap it in.
+
+    Returns:
+        The new SqliteDocstore, also assigned to ``index.docstore``
+    """
+    store = SqliteDocstore(directory)
+    docstore = index.docstore
+    if isinstance(docstore, InMemoryDocstore):
+        store.add(dict(docstore._dict))
+    else:
+        docs = {doc_id: docstore.search(doc_id) for doc_id in index.index_to_docstore_id.values()}
+        store.add({doc_id: doc for doc_id, doc in docs.items() if isinstance(doc, Document)})
+    index.docstore = store
+    logger.info(f"Moved {len(store)} documents to {store.path}")
+    return store
@@ -0,0 +1,169 @@
+"""
+Startup Timing and Background Loading
+
+A cold start used to import every dependency, load the embedding model and
+the index, and only then build the UI. ``BackgroundLoader`` loads the index
+in a daemon thread while the UI starts, signals readiness through an event,
+and then runs warm-up hooks (first embedding, first search, tokenizer, LLM
+client) so the first real request does not pay for them. ``StartupTimer``
+records how long each phase took, as a printable breakdown and as JSON, so
+cold-start regressions show up in logs.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Taken when this module is first imported, i.e. early in the app's startup
+PROCESS_START = time.perf_counter()
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    """Records named startup phases relative to a common start time."""
+
+    def __init__(self, start: Optional[float] = None):
+        """
+        Args:
+            start: perf_counter() value phases are measured from
+                (default: when this module was imported)
+        """
+        self.start = PROCESS_START if start is None else start
+        self._phases: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, began: float, duration: float) -> None:
+        """Record a phase that began at perf_counter() ``began``."""
+        with self._lock:
+            self._phases.append((name, began - self.start, duration))
+        logger.info(f"Startup phase '{name}' took {duration:.3f}s")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one phase."""
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, began, time.perf_counter() - began)
+
+    def mark(self, name: str) -> float:
+        """Record a milestone (e.g. "ui ready"); returns seconds since start."""
+        now = time.perf_counter()
+        self.record(name, now, 0.0)
+        return now - self.start
+
+    def phases(self) -> List[Dict[str, float]]:
+        """Phases in the order they started, as dicts."""
+        with self._lock:
+            phases = sorted(self._phases, key=lambda phase: phase[1])
+        return [
+            {"phase": name, "start": round(offset, 4), "seconds": round(duration, 4)}
+            for name, offset, duration in phases
+        ]
+
+    def report(self) -> str:
+        """Human-readable breakdown, one phase per line."""
+        lines = ["⏱️  Startup timing:"]
+        for phase in self.phases():
+            if phase["seconds"]:
+                lines.append(
+                    f"   - {phase['phase']}: {phase['seconds']:.3f}s "
+                    f"(from +{phase['start']:.3f}s)"
+                )
+            else:
+                lines.append(f"   - {phase['phase']} at +{phase['start']:.3f}s")
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        """Write the phases as JSON, e.g. for tracking cold starts over time."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"phases": self.phases()}, f, indent=2)
+
+
+class BackgroundLoader(Generic[T]):
+    """
+    Runs a loader in a daemon thread, then its warm-up hooks.
+
+    ``ready`` is set as soon as the loader returns (or fails); ``warmed`` once
+    every warm-up hook has run. Warm-up failures are logged, not raised.
+    """
+
+    def __init__(self, name: str, load: Callable[[], T], timer: Optional[StartupTimer] = None):
+        """
+        Args:
+            name: Phase name used for timing and logs
+            load: Function producing the loaded object
+            timer: Timer recording the load and warm-up phases
+        """
+        self.name = name
+        self._load = load
+        self.timer = timer or StartupTimer()
+        self._warm_ups: List[Tuple[str, Callable[[T], None]]] = []
+        self.ready = threading.Event()
+        self.warmed = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add_warm_up(self, name: str, hook: Callable[[T], None]) -> None:
+        """Run ``hook(result)`` after a successful load, before ``warmed`` is set."""
+        self._warm_ups.append((name, hook))
+
+    def start(self) -> "BackgroundLoader[T]":
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name=f"Load-{self.name}"
+        )
+        self._thread.start()
+        return self
+
+    def run(self) -> T:
+        """Load and warm up in the calling thread instead."""
+        self._run()
+        return self.wait(0)
+
+    def _run(self) -> None:
+        try:
+            with self.timer.phase(self.name):
+                self.result = self._load()
+        except Exception as e:
+            logger.error(f"Loading {self.name} failed: {e}")
+            self.error = e
+        finally:
+            self.ready.set()
+
+        if self.error is None:
+            for name, hook in self._warm_ups:
+                try:
+                    with self.timer.phase(f"warm-up: {name}"):
+                        hook(self.result)
+                except Exception as e:
+                    logger.warning(f"Warm-up '{name}' failed: {e}")
+        self.warmed.set()
+
+    def wait(self, timeout: Optional[float] = None) -> T:
+        """
+        Block until loading finished and return the result.
+
+        Raises:
+            TimeoutError: If loading is still running after ``timeout`` seconds
+            RuntimeError: If the loader failed
+        """
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"{self.name} is still loading")
+        if self.error is not None:
+            raise RuntimeError(f"Loading {self.name} failed: {self.error}") from self.error
+        return self.result
+
+    @property
+    def status(self) -> str:
+        """Load state: "loading", "ready" or "failed"."""
+        if not self.ready.is_set():
+            return "loading"
+        return "failed" if self.error is not None else "ready"
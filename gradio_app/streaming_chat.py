@@ -0,0 +1,143 @@
+"""
+Async Streaming Chat Completions
+
+``StreamingChatClient`` streams completion tokens from any OpenAI-compatible
+endpoint (the OpenAI API, a local model server or ``mock_llm_server.py``)
+without blocking the event loop. A per-process semaphore caps the number of
+generations in flight; extra requests wait for a slot instead of piling onto
+the backend.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    # Fallback for direct execution
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LLM_COMPLETION_SECONDS = REGISTRY.histogram(
+    "rag_llm_completion_seconds", "Time from sending a chat request to its last token", ["mode"]
+)
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "rag_llm_first_token_seconds", "Time from sending a streamed chat request to its first token"
+)
+LLM_TOKENS = REGISTRY.counter(
+    "rag_llm_tokens_total", "Tokens reported by the chat endpoint", ["kind"]
+)
+_STREAM_SECONDS = LLM_COMPLETION_SECONDS.labels(mode="stream")
+
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+DEFAULT_MAX_CONCURRENT_CHATS = 8
+
+
+def record_token_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Count tokens reported by the chat endpoint (missing counts are skipped)."""
+    if prompt_tokens:
+        LLM_TOKENS.labels(kind="prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(kind="completion").inc(completion_tokens)
+
+
+class StreamingChatClient:
+    """Async chat completion client with a concurrency limit."""
+
+    def __init__(
+        self,
+        model: str = DEFAULT_CHAT_MODEL,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_CHATS,
+        temperature: float = 0,
+    ):
+        """
+        Args:
+            model: Chat model name sent to the endpoint
+            base_url: OpenAI-compatible API base URL (default: OpenAI)
+            api_key: API key (default: ``OPENAI_API_KEY``)
+            max_concurrent: Maximum generations streaming at once in this process
+            temperature: Sampling temperature
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY", "sk-...")
+        self.max_concurrent = max_concurrent
+        self.temperature = temperature
+        self._client = None
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+
+    @property
+    def client(self):
+        """AsyncOpenAI client, created on first use."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    @property
+    def in_flight(self) -> int:
+        """Number of generations currently holding a slot."""
+        return self._active
+
+    async def stream(
+        self, messages: List[Dict[str, str]], usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield content deltas of a chat completion as they arrive.
+
+        Args:
+            messages: Chat messages in OpenAI format
+            usage: Optional dict filled with ``prompt_tokens`` and
+                ``completion_tokens`` if the endpoint reports them
+
+        Yields:
+            Text fragments of the answer
+        """
+        await self._semaphore.acquire()
+        self._active += 1
+        started = time.perf_counter()
+        first_token = True
+        reported: Dict[str, int] = {}
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in response:
+                if chunk.usage is not None:
+                    reported["prompt_tokens"] = chunk.usage.prompt_tokens
+                    reported["completion_tokens"] = chunk.usage.completion_tokens
+                    if usage is not None:
+                        usage.update(reported)
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if first_token:
+                            LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                            first_token = False
+                        yield delta
+            _STREAM_SECONDS.observe(time.perf_counter() - started)
+            record_token_usage(reported.get("prompt_tokens"), reported.get("completion_tokens"))
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    async def complete(
+        self, messages: List[Dict[str, str]], usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """Collect a streamed completion into a single string."""
+        parts = [delta async for delta in self.stream(messages, usage)]
+        return "".join(parts).strip()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the semantic answer cache.
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from answer_cache import SemanticAnswerCache  # noqa: E402
+
+
+def _doc(doc_id, title="Notes"):
+    return Document(id=doc_id, page_content=f"content of {doc_id}", metadata={"title": title})
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    """Test cases for SemanticAnswerCache"""
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache(similarity_threshold=0.9, ttl=60, max_entries=2)
+        self.context = [_doc("a"), _doc("b")]
+        self.cache.store([1.0, 0.0], self.context, 2, "cached answer")
+
+    def test_similar_query_with_same_context_hits(self):
+        self.assertEqual(self.cache.lookup([0.99, 0.05], self.context, 2), "cached answer")
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_dissimilar_query_misses(self):
+        self.assertIsNone(self.cache.lookup([0.0, 1.0], self.context, 2))
+
+    def test_different_context_or_top_k_misses(self):
+        self.assertIsNone(self.cache.lookup([1.0, 0.0], [_doc("a"), _doc("c")], 2))
+        self.assertIsNone(self.cache.lookup([1.0, 0.0], self.context, 3))
+
+    def test_entries_expire(self):
+        with patch("answer_cache.time.time", return_value=10**12):
+            self.assertIsNone(self.cache.lookup([1.0, 0.0], self.context, 2))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.store([0.0, 1.0], [_doc("c")], 1, "second")
+        self.cache.lookup([1.0, 0.0], self.context, 2)
+        self.cache.store([0.6, 0.8], [_doc("d")], 1, "third")
+        self.assertEqual(self.cache.lookup([1.0, 0.0], self.context, 2), "cached answer")
+        self.assertIsNone(self.cache.lookup([0.0, 1.0], [_doc("c")], 1))
+
+    def test_changed_documents_invalidate_answers(self):
+        self.assertEqual(self.cache.invalidate([_doc("z", title="Other")]), 0)
+        self.assertEqual(self.cache.invalidate([_doc("new", title="Notes")]), 1)
+        self.assertIsNone(self.cache.lookup([1.0, 0.0], self.context, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the retrieval benchmark harness.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_retrieval import (  # noqa: E402
+    HashEmbeddings,
+    run_suite,
+    synthetic_corpus,
+    synthetic_queries,
+)
+from index_spec import IndexSpec  # noqa: E402
+
+
+class TestBenchmarkRetrieval(unittest.TestCase):
+    """Test cases for synthetic corpora and benchmark reports"""
+
+    def test_corpus_and_embeddings_are_deterministic(self):
+        docs = synthetic_corpus(50)
+        self.assertEqual(docs, synthetic_corpus(50))
+        self.assertEqual(synthetic_queries(docs, 5), synthetic_queries(docs, 5))
+        embeddings = HashEmbeddings(dim=32)
+        text = next(iter(docs.values()))
+        self.assertEqual(embeddings.embed_query(text), embeddings.embed_documents([text])[0])
+
+    def test_report_covers_every_spec(self):
+        report = run_suite(
+            [300], [IndexSpec("flat"), IndexSpec("hnsw")], num_queries=10, k=5, dim=32
+        )
+        flat, hnsw = report["results"]
+        self.assertEqual(flat["recall_at_5"], 1.0)
+        self.assertEqual(hnsw["factory"], "HNSW32")
+        for result in (flat, hnsw):
+            self.assertEqual(result["corpus_size"], 300)
+            self.assertGreater(result["qps"], 0)
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+            self.assertGreater(result["disk_bytes"], 0)
+        json.dumps(report)
+
+    def test_quantized_storage_is_compared_to_float32(self):
+        report = run_suite(
+            [300],
+            [IndexSpec("flat"), IndexSpec("flat", storage="int8", rerank=4)],
+            num_queries=10, k=5, dim=32,
+        )
+        baseline, quantized = report["results"]
+        self.assertNotIn("vs_float32", baseline)
+        self.assertEqual(quantized["factory"], "SQ8")
+        comparison = quantized["vs_float32"]
+        self.assertLess(comparison["index_bytes_ratio"], 0.5)
+        self.assertGreater(comparison["index_bytes_saved"], 0)
+        self.assertLessEqual(comparison["recall_lost"], 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk directory ingestion.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_ingest import MANIFEST_FILE, bulk_ingest  # noqa: E402
+from test_persistence_manager import IndexTestCase  # noqa: E402
+
+
+class TestBulkIngest(IndexTestCase):
+    """Test cases for bulk_ingest"""
+
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.tmpdir, "corpus")
+        os.makedirs(os.path.join(self.root, "nested"))
+        self._write("a.txt", "Guido van Rossum created Python in 1991.")
+        self._write("nested/b.md", "FAISS performs fast similarity search over vectors.")
+        self._write("nested/c.json", json.dumps({"topic": "retrieval augmented generation"}))
+        self._write("ignored.bin", "not ingested")
+
+    def _write(self, rel_path, text):
+        with open(os.path.join(self.root, rel_path), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def _ingest(self, **kwargs):
+        return bulk_ingest(self.root, self.path, use_openai=False, workers=2, **kwargs)
+
+    def test_builds_index_and_manifest(self):
+        result = self._ingest()
+        self.assertEqual((result.files_scanned, result.files_ingested), (3, 3))
+
+        with open(os.path.join(self.path, MANIFEST_FILE)) as f:
+            files = json.load(f)["files"]
+        self.assertEqual(set(files), {"a.txt", "nested/b.md", "nested/c.json"})
+
+        manager = self._load()
+        hits = manager.similarity_search("fast similarity search FAISS vectors", k=1)
+        self.assertEqual(hits[0].metadata["title"], "nested/b.md")
+        self.assertEqual(hits[0].id, files["nested/b.md"]["ids"][0])
+        manager.shutdown()
+
+    def test_existing_empty_directory_is_a_new_index(self):
+        os.makedirs(self.path)
+        result = self._ingest()
+        self.assertEqual(result.files_ingested, 3)
+        manager = self._load()
+        self.assertEqual(manager.index.index.ntotal, 3)
+        manager.shutdown()
+
+    def test_rerun_only_processes_new_and_changed_files(self):
+        self._ingest()
+        embedded = self.embeddings.embedded_texts
+
+        result = self._ingest()
+        self.assertEqual((result.files_ingested, result.files_unchanged), (0, 3))
+        self.assertEqual(self.embeddings.embedded_texts, embedded)
+
+        self._write("a.txt", "Python 3 was released in 2008.")
+        self._write("d.txt", "A brand new document about tokenizers.")
+        os.utime(os.path.join(self.root, "nested/b.md"), ns=(1, 1))
+        result = self._ingest(checkpoint_every=1)
+        self.assertEqual((result.files_ingested, result.files_unchanged), (2, 2))
+
+        manager = self._load()
+        hits = manager.similarity_search("new document about tokenizers", k=1)
+        self.assertEqual(hits[0].metadata["source"], "d.txt")
+        sources = [doc.metadata["source"] for doc in manager.similarity_search("Python", k=10)]
+        self.assertEqual(sources.count("a.txt"), 1)
+        manager.shutdown()
+
+    def test_prune_deletes_removed_files(self):
+        self._ingest()
+        os.remove(os.path.join(self.root, "a.txt"))
+        result = self._ingest(prune=True)
+        self.assertEqual(result.files_removed, 1)
+
+        manager = self._load()
+        sources = {doc.metadata["source"] for doc in manager.similarity_search("Python", k=10)}
+        self.assertNotIn("a.txt", sources)
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted context packing.
+"""
+
+import os
+import sys
+import unittest
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from context_packing import TokenUsageLedger, pack_context  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from tokens import WhitespaceTokenizer  # noqa: E402
+
+
+def _doc(text, **metadata):
+    return Document(page_content=text, metadata=metadata)
+
+
+class TestPackContext(unittest.TestCase):
+    """Test cases for pack_context"""
+
+    def setUp(self):
+        self.tokenizer = WhitespaceTokenizer()
+
+    def _pack(self, docs, budget=1000):
+        return pack_context(docs, budget, tokenizer=self.tokenizer)
+
+    def test_everything_fits_unchanged(self):
+        docs = [_doc("alpha beta\ngamma"), _doc("delta epsilon")]
+        packed = self._pack(docs)
+        self.assertEqual(packed.text, "alpha beta\ngamma\ndelta epsilon")
+        self.assertEqual(packed.tokens, 5)
+        self.assertEqual((packed.duplicates, packed.truncated, packed.dropped), (0, 0, 0))
+
+    def test_duplicates_and_contained_passages_are_skipped(self):
+        docs = [
+            _doc("one two three four five six seven eight nine ten"),
+            _doc("one two three four five six seven eight nine ten"),
+            _doc("two three four five six seven eight nine ten"),
+            _doc("something else entirely"),
+        ]
+        packed = self._pack(docs)
+        self.assertEqual(packed.duplicates, 2)
+        self.assertEqual(len(packed.documents), 2)
+
+    def test_overlap_between_consecutive_chunks_is_trimmed(self):
+        first = " ".join(f"w{i}" for i in range(40))
+        second = " ".join(f"w{i}" for i in range(30, 70))
+        docs = [_doc(first, title="T", chunk=0), _doc(second, title="T", chunk=1)]
+        packed = self._pack(docs)
+        self.assertEqual(packed.input_tokens, 80)
+        self.assertEqual(packed.tokens, 70)
+        self.assertEqual(packed.text.split(), [f"w{i}" for i in range(70)])
+
+    def test_budget_truncates_then_drops_lower_ranked_passages(self):
+        docs = [_doc(" ".join(f"{name}{i}" for i in range(50))) for name in "abc"]
+        packed = self._pack(docs, budget=90)
+        self.assertLessEqual(packed.tokens, 90)
+        self.assertEqual(packed.truncated, 1)
+        self.assertEqual(packed.dropped, 1)
+        self.assertTrue(packed.text.split()[-1].startswith("b"))
+
+        packed = self._pack(docs, budget=60)
+        self.assertEqual((packed.truncated, packed.dropped), (0, 2))
+        self.assertEqual(packed.tokens, 50)
+
+    def test_ledger_accumulates_savings(self):
+        tokens = REGISTRY.get("rag_context_tokens_total")
+        sent_before = tokens.labels(kind="sent").value
+        retrieved_before = tokens.labels(kind="retrieved").value
+        ledger = TokenUsageLedger()
+        packed = self._pack([_doc("a b c"), _doc("a b c")])
+        ledger.record(packed, prompt_tokens=20, completion_tokens=5)
+        self.assertEqual(ledger.requests, 1)
+        self.assertEqual(ledger.context_tokens_retrieved - ledger.context_tokens_sent, 3)
+        self.assertIn("3 context tokens saved", ledger.summary())
+        self.assertEqual(tokens.labels(kind="retrieved").value - retrieved_before, 6)
+        self.assertEqual(tokens.labels(kind="sent").value - sent_before, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for MinHash LSH near-duplicate detection.
+"""
+
+import os
+import sys
+import unittest
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dedup import DEDUP_FILE, NearDuplicateIndex  # noqa: E402
+from ingestion import ingest_blocks  # noqa: E402
+from test_persistence_manager import IndexTestCase, crash  # noqa: E402
+
+PASSAGE = (
+    "Retrieval augmented generation combines a language model with a retriever "
+    "that looks up passages from an external corpus and adds them to the prompt "
+    "so that answers are grounded in the retrieved documents rather than in the "
+    "parameters of the model alone which reduces hallucinations on niche topics"
+)
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    """Test cases for NearDuplicateIndex"""
+
+    def setUp(self):
+        self.index = NearDuplicateIndex(threshold=0.8)
+        self.index.add("a", self.index.signature(PASSAGE), title="RAG")
+
+    def test_small_edit_is_a_near_duplicate(self):
+        edited = PASSAGE.replace("niche topics", "niche subjects")
+        match = self.index.query(self.index.signature(edited))
+        self.assertEqual(match[0], "a")
+        self.assertGreaterEqual(match[1], 0.8)
+
+    def test_different_text_is_not(self):
+        other = "Python was created by Guido van Rossum and first released in 1991"
+        self.assertIsNone(self.index.query(self.index.signature(other)))
+
+    def test_excluded_titles_and_removed_documents_do_not_match(self):
+        signature = self.index.signature(PASSAGE)
+        self.assertIsNone(self.index.query(signature, exclude_titles=["RAG"]))
+        self.index.remove("a")
+        self.assertIsNone(self.index.query(signature))
+        self.assertEqual(len(self.index), 0)
+
+
+class TestManagerDedup(IndexTestCase):
+    """Test cases for near-duplicate detection in BatchedPersistenceManager"""
+
+    def test_reject_skips_embedding_duplicates(self):
+        manager = self._load(dedup="reject")
+        manager.add_documents([Document(page_content=PASSAGE, metadata={"title": "A"})])
+        embedded = self.embeddings.embedded_texts
+
+        ids = manager.add_documents([
+            Document(page_content=PASSAGE + " today", metadata={"title": "B"}),
+            Document(page_content="Tokenizers split text into tokens", metadata={"title": "C"}),
+            Document(page_content="Tokenizers split text into tokens", metadata={"title": "D"}),
+        ])
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(self.embeddings.embedded_texts, embedded + 1)
+        manager.shutdown()
+
+    def test_merge_records_alias_and_index_is_persisted(self):
+        manager = self._load(dedup="merge", compact_every=100)
+        (doc_id,) = manager.add_documents(
+            [Document(page_content=PASSAGE, metadata={"title": "A"})]
+        )
+        manager.add_documents([Document(page_content=PASSAGE, metadata={"title": "B"})])
+        self.assertEqual(manager.docstore.search(doc_id).metadata["aliases"], ["B"])
+        manager.compact()
+        manager.shutdown()
+        self.assertTrue(os.path.exists(os.path.join(self.path, DEDUP_FILE)))
+
+        reloaded = self._load(dedup="reject")
+        self.assertIn(doc_id, reloaded._dedup)
+        self.assertEqual(reloaded.docstore.search(doc_id).metadata["aliases"], ["B"])
+        self.assertEqual(
+            reloaded.add_documents([Document(page_content=PASSAGE, metadata={"title": "C"})]),
+            [],
+        )
+        reloaded.shutdown()
+
+    def test_merged_aliases_are_saved_as_metadata_updates(self):
+        for docstore in ("memory", "sqlite"):
+            with self.subTest(docstore=docstore):
+                self.path = os.path.join(self.tmpdir, docstore)
+                manager = self._load(dedup="merge", docstore=docstore, compact_every=100)
+                (doc_id,) = manager.add_documents(
+                    [Document(page_content=PASSAGE, metadata={"title": "A"})]
+                )
+                manager.add_documents([Document(page_content=PASSAGE, metadata={"title": "B"})])
+                manager.shutdown()
+
+                # Replayed from a delta segment, not a snapshot
+                reloaded = self._load(dedup="merge", docstore=docstore, compact_every=100)
+                self.assertEqual(reloaded.docstore.search(doc_id).metadata["aliases"], ["B"])
+                reloaded.add_documents([Document(page_content=PASSAGE, metadata={"title": "C"})])
+                reloaded.shutdown()
+
+                reloaded = self._load(dedup="merge", docstore=docstore)
+                self.assertEqual(
+                    reloaded.docstore.search(doc_id).metadata["aliases"], ["B", "C"]
+                )
+                reloaded.shutdown()
+
+    def test_merged_alias_survives_a_crash(self):
+        manager = self._load(dedup="merge", auto_persist=True, batch_size=100, max_wait_time=60)
+        (doc_id,) = manager.add_documents(
+            [Document(page_content=PASSAGE, metadata={"title": "A"})]
+        )
+        manager.add_documents([Document(page_content=PASSAGE, metadata={"title": "B"})])
+        self.assertEqual(manager.get_pending_count(), 2)
+        crash(manager)
+
+        reloaded = self._load()
+        self.assertEqual(reloaded.docstore.search(doc_id).metadata["aliases"], ["B"])
+        reloaded.shutdown()
+
+    def test_reupload_with_same_title_is_not_rejected(self):
+        manager = self._load(dedup="reject")
+        ingest_blocks(manager, [PASSAGE], "A")
+        result = ingest_blocks(manager, [PASSAGE + " again"], "A", replace=True)
+        self.assertEqual((result.chunks, result.duplicates), (1, 0))
+        result = ingest_blocks(manager, [PASSAGE], "B", replace=True)
+        self.assertEqual((result.chunks, result.duplicates), (0, 1))
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the named index registry.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from faiss_helper import load_or_build_index  # noqa: E402
+from index_registry import IndexRegistry  # noqa: E402
+from test_persistence_manager import DOCS, IndexTestCase  # noqa: E402
+
+
+class TestIndexRegistry(IndexTestCase):
+    """Test cases for IndexRegistry"""
+
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.tmpdir, "indexes")
+        self.loads = []
+
+    def _open(self, name, path):
+        self.loads.append(name)
+        # Batches far larger than the tests write, so changes stay unsaved until flushed
+        return load_or_build_index(
+            DOCS, path=path, auto_persist=True, batch_size=1000, max_wait_time=3600
+        )
+
+    def _registry(self, **kwargs):
+        kwargs.setdefault("root", self.root)
+        return IndexRegistry(self._open, **kwargs)
+
+    def test_loads_on_first_use_and_lists_names(self):
+        registry = self._registry(paths={"physics": os.path.join(self.tmpdir, "physics")})
+        self.assertEqual(registry.names(), ["physics"])
+        self.assertEqual(registry.resident(), [])
+
+        with registry.use("physics") as index:
+            self.assertEqual(len(index.similarity_search("Python", k=1)), 1)
+        with registry.use("chemistry"):
+            pass
+        registry.get("physics")
+
+        self.assertEqual(self.loads, ["physics", "chemistry"])
+        self.assertEqual(registry.names(), ["chemistry", "physics"])
+        self.assertEqual(registry.resident(), ["chemistry", "physics"])
+        registry.shutdown()
+
+    def test_eviction_flushes_unsaved_changes(self):
+        registry = self._registry(max_resident=1)
+        with registry.use("a") as index:
+            index.add_documents([Document(page_content="Entropy always increases.")])
+            self.assertTrue(index.is_dirty())
+
+        # Loading b evicts a, which must save the pending document first
+        registry.get("b")
+        self.assertEqual(registry.resident(), ["b"])
+        self.assertFalse(index.is_dirty())
+
+        with registry.use("a") as reloaded:
+            self.assertIsNot(reloaded, index)
+            top = reloaded.similarity_search("Entropy always increases.", k=1)[0]
+            self.assertEqual(top.page_content, "Entropy always increases.")
+        self.assertEqual(self.loads, ["a", "b", "a"])
+        registry.shutdown()
+
+    def test_index_in_use_is_not_evicted(self):
+        registry = self._registry(max_resident=1)
+        with registry.use("a") as index:
+            registry.get("b")
+            # b is idle and newer, but a is held, so b goes instead
+            self.assertEqual(registry.resident(), ["a"])
+            self.assertEqual(len(index.similarity_search("Python", k=1)), 1)
+        registry.shutdown()
+
+    def test_byte_budget(self):
+        registry = self._registry(max_resident=8, max_resident_bytes=1)
+        registry.get("a")
+        registry.get("b")
+        self.assertEqual(registry.resident(), ["b"])
+        self.assertGreater(registry.stats()["resident_bytes"], 0)
+        registry.shutdown()
+
+    def test_unknown_and_invalid_names(self):
+        registry = self._registry(root=None, paths={"a": self.path})
+        with self.assertRaises(KeyError):
+            registry.get("b")
+        with self.assertRaises(ValueError):
+            self._registry().get("../escape")
+        with self.assertRaises(ValueError):
+            IndexRegistry(self._open, paths={".hidden": self.path})
+        self.assertEqual(self.loads, [])
+
+    def test_concurrent_requests_load_once(self):
+        slow_open = self._open
+
+        def open_slowly(name, path):
+            time.sleep(0.1)
+            return slow_open(name, path)
+
+        registry = IndexRegistry(open_slowly, root=self.root)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.get("a")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, ["a"])
+        self.assertEqual(len({id(index) for index in results}), 1)
+        registry.shutdown()
+
+    def test_failed_load_is_retried(self):
+        attempts = []
+
+        def flaky_open(name, path):
+            attempts.append(name)
+            if len(attempts) == 1:
+                raise OSError("disk unavailable")
+            return self._open(name, path)
+
+        registry = IndexRegistry(flaky_open, root=self.root)
+        with self.assertRaises(OSError):
+            registry.get("a")
+        self.assertEqual(registry.resident(), [])
+        registry.get("a")
+        self.assertEqual(registry.resident(), ["a"])
+        registry.shutdown()
+
+
+if __name__ == "__main__":
+    import unittest
+
+    unittest.main()
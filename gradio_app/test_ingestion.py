@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming document ingestion.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ingestion import chunk_text_stream, ingest_file  # noqa: E402
+from tokens import WhitespaceTokenizer  # noqa: E402
+from test_persistence_manager import DOCS, IndexTestCase  # noqa: E402
+
+
+class TestChunking(unittest.TestCase):
+    """Test cases for token-bounded overlapping chunks"""
+
+    def setUp(self):
+        self.tokenizer = WhitespaceTokenizer()
+        self.words = [f"w{i}" for i in range(100)]
+
+    def _chunks(self, blocks, size=10, overlap=2):
+        return list(chunk_text_stream(blocks, size, overlap, self.tokenizer))
+
+    def test_chunks_are_bounded_and_overlap(self):
+        chunks = self._chunks([" ".join(self.words)])
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk.split()), 10)
+        for prev, nxt in zip(chunks, chunks[1:]):
+            self.assertEqual(prev.split()[-2:], nxt.split()[:2])
+        self.assertEqual(chunks[-1].split()[-1], "w99")
+
+    def test_words_split_across_blocks_are_rejoined(self):
+        text = " ".join(self.words)
+        blocks = [text[i:i + 7] for i in range(0, len(text), 7)]
+        self.assertEqual(self._chunks(blocks), self._chunks([text]))
+
+    def test_overlap_must_be_smaller_than_chunk(self):
+        with self.assertRaises(ValueError):
+            self._chunks(["a b c"], size=4, overlap=4)
+
+
+class TestIngestFile(IndexTestCase):
+    """Test cases for ingesting uploaded files into the index"""
+
+    def test_large_file_becomes_many_chunks(self):
+        manager = self._load()
+        path = os.path.join(self.tmpdir, "notes.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(" ".join(f"word{i}" for i in range(2000)))
+
+        updates = []
+        result = ingest_file(
+            manager, path, "Notes", chunk_tokens=100, overlap_tokens=10,
+            embed_batch_size=4, progress=updates.append,
+        )
+
+        self.assertGreater(result.chunks, 10)
+        self.assertEqual(manager.index.index.ntotal, len(DOCS) + result.chunks)
+        self.assertEqual(len(updates), -(-result.chunks // 4))
+        self.assertEqual(updates[-1].fraction, 1.0)
+        hit = manager.similarity_search("word1500", k=1)[0]
+        self.assertEqual(hit.metadata["title"], "Notes")
+        self.assertEqual(hit.metadata["source"], "notes.txt")
+        manager.shutdown()
+
+    def test_json_file_is_pretty_printed(self):
+        manager = self._load()
+        path = os.path.join(self.tmpdir, "data.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"course": "prompt engineering", "days": 24}, f)
+
+        result = ingest_file(manager, path, "Data")
+        self.assertEqual(result.chunks, 1)
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
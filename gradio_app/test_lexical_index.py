@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the BM25 lexical index and hybrid retrieval helpers.
+"""
+
+import os
+import sys
+import unittest
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lexical_index import (  # noqa: E402
+    BM25Index,
+    is_identifier_query,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from test_persistence_manager import IndexTestCase  # noqa: E402
+
+
+class TestBM25Index(unittest.TestCase):
+    """Test cases for BM25Index"""
+
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add("a", "The error ERR-4021 is raised when the index is missing")
+        self.index.add("b", "Retrieval augmented generation grounds answers")
+        self.index.add("c", "The index is rebuilt from the docs dictionary")
+
+    def test_identifiers_are_indexed_whole_and_by_part(self):
+        self.assertIn("err-4021", tokenize("ERR-4021"))
+        self.assertIn("4021", tokenize("ERR-4021"))
+        self.assertEqual(self.index.search("4021", k=1)[0][0], "a")
+
+    def test_rare_terms_outrank_common_terms(self):
+        ranked = [doc_id for doc_id, _ in self.index.search("index rebuilt", k=3)]
+        self.assertEqual(ranked[0], "c")
+
+    def test_remove_drops_postings(self):
+        self.index.remove("a")
+        self.assertEqual(self.index.search("ERR-4021"), [])
+        self.assertEqual(len(self.index), 2)
+
+    def test_identifier_query_detection(self):
+        self.assertTrue(is_identifier_query("ERR-4021 faiss_helper.py"))
+        self.assertFalse(is_identifier_query("what is retrieval"))
+
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])
+        self.assertEqual(fused[0], "y")
+        self.assertEqual(set(fused), {"x", "y", "z", "w"})
+
+
+class TestManagerLexicalIndex(IndexTestCase):
+    """Test cases for the BM25 index maintained by BatchedPersistenceManager"""
+
+    def test_lexical_index_tracks_adds_and_survives_reload(self):
+        manager = self._load(lexical_index=True, compact_every=100)
+        manager.add_documents([Document(page_content="Ticket ERR-4021 covers the outage")])
+
+        hits = manager.lexical_search("ERR-4021", k=1)
+        self.assertEqual(hits[0][0].page_content, "Ticket ERR-4021 covers the outage")
+        manager.compact()
+        manager.add_documents([Document(page_content="Ticket ERR-5000 is a follow-up")])
+        manager.shutdown()
+
+        self.assertTrue(os.path.exists(os.path.join(self.path, "bm25.pkl")))
+        reloaded = self._load(lexical_index=True)
+        self.assertEqual(len(reloaded._lexical), 4)
+        self.assertEqual(
+            reloaded.lexical_search("ERR-5000", k=1)[0][0].page_content,
+            "Ticket ERR-5000 is a follow-up",
+        )
+        reloaded.shutdown()
+
+    def test_lexical_search_requires_lexical_index(self):
+        manager = self._load()
+        with self.assertRaises(RuntimeError):
+            manager.lexical_search("python")
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for metadata filters applied as FAISS ID selectors.
+"""
+
+import os
+import sys
+import unittest
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from faiss_helper import load_or_build_index  # noqa: E402
+from index_spec import IndexSpec  # noqa: E402
+from ingestion import ingest_blocks  # noqa: E402
+from metadata_filter import (  # noqa: E402
+    MetadataIndex,
+    clear_positions,
+    enable_reconstruction,
+    matches,
+    parse_filter,
+    search_bitmap,
+)
+from test_persistence_manager import IndexTestCase  # noqa: E402
+
+
+class TestFilters(unittest.TestCase):
+    """Test cases for filter parsing and matching"""
+
+    def test_parse_filter(self):
+        self.assertEqual(
+            parse_filter("source=a.txt, source=b.txt, uploaded>=2026-01-01, uploaded<2026-02"),
+            {"source": ["a.txt", "b.txt"], "uploaded": {"gte": "2026-01-01", "lt": "2026-02"}},
+        )
+        with self.assertRaises(ValueError):
+            parse_filter("source")
+
+    def test_matches(self):
+        metadata = {"source": "a.txt", "uploaded": "2026-01-15"}
+        self.assertTrue(matches(metadata, {"source": ["a.txt", "b.txt"]}))
+        self.assertTrue(matches(metadata, {"uploaded": {"gte": "2026-01-01"}}))
+        self.assertFalse(matches(metadata, {"source": "a.txt", "tenant": "acme"}))
+
+    def test_bitmap_ors_values_and_ands_fields(self):
+        index = MetadataIndex(["source", "tenant"])
+        index.add(0, "a", {"source": "a.txt", "tenant": "acme"})
+        index.add(1, "b", {"source": "b.txt", "tenant": "acme"})
+        index.add(2, "c", {"source": "a.txt", "tenant": "globex"})
+        index.add(9, "d", {"source": "b.txt"})
+
+        bits = np.unpackbits(
+            index.bitmap({"source": ["a.txt", "b.txt"], "tenant": "acme"}, 10),
+            bitorder="little",
+        )
+        self.assertEqual(list(np.flatnonzero(bits)), [0, 1])
+        with self.assertRaises(ValueError):
+            index.bitmap({"title": "x"}, 10)
+
+
+class TestSearchBitmap(unittest.TestCase):
+    """Test cases for searching only the positions in a bitmap"""
+
+    def test_selective_filter_on_every_index_type(self):
+        vectors = np.random.default_rng(0).random((500, 8), dtype=np.float32)
+        mask = np.zeros(500, dtype=bool)
+        mask[[3, 77, 401]] = True
+        for factory in ["Flat", "IVF4,Flat", "HNSW8"]:
+            with self.subTest(factory=factory):
+                index = faiss.index_factory(8, factory)
+                index.train(vectors)
+                index.add(vectors)
+                enable_reconstruction(index)
+                bitmap = np.packbits(mask, bitorder="little")
+                clear_positions(bitmap, [77])
+
+                _, labels = search_bitmap(index, vectors[401:402], 5, bitmap)
+                self.assertEqual(list(labels[0]), [401, 3, -1, -1, -1])
+
+    def test_search_never_builds_a_direct_map(self):
+        vectors = np.random.default_rng(0).random((500, 8), dtype=np.float32)
+        index = faiss.index_factory(8, "IVF4,Flat")
+        index.train(vectors)
+        index.add(vectors)
+        index.nprobe = 4
+        bitmap = np.packbits(np.arange(500) < 3, bitorder="little")
+
+        _, labels = search_bitmap(index, vectors[1:2], 2, bitmap)
+        self.assertEqual(labels[0][0], 1)
+        self.assertIn(labels[0][1], (0, 2))
+        self.assertEqual(faiss.extract_index_ivf(index).direct_map.type, faiss.DirectMap.NoMap)
+
+
+class TestManagerFilteredSearch(IndexTestCase):
+    """Test cases for metadata_filter in BatchedPersistenceManager searches"""
+
+    def test_filter_restricts_results_and_follows_updates(self):
+        manager = self._load()
+        query = manager.embed_query("What is RAG?")
+        for tenant in ["acme", "globex"]:
+            ingest_blocks(
+                manager, ["What is RAG?"], f"{tenant} notes", metadata={"tenant": tenant}
+            )
+
+        results = manager.similarity_search_by_vector(
+            query, k=4, metadata_filter={"tenant": "globex"}
+        )
+        self.assertEqual([doc.metadata["title"] for doc in results], ["globex notes"])
+        self.assertEqual(len(results[0].metadata["uploaded"]), 10)
+
+        # Documents added and deleted after the first filtered search
+        ingest_blocks(manager, ["Globex plans"], "globex plans", metadata={"tenant": "globex"})
+        manager.delete(titles=["globex notes"])
+        results = manager.similarity_search_by_vector(
+            query, k=4, metadata_filter={"tenant": ["globex"]}
+        )
+        self.assertEqual([doc.metadata["title"] for doc in results], ["globex plans"])
+
+        unfiltered = manager.similarity_search_by_vector(query, k=4)
+        self.assertEqual(len(unfiltered), 4)
+        manager.shutdown()
+
+    def test_ivf_direct_map_is_built_before_searches(self):
+        docs = {f"doc {i}": f"topic {i % 7} note {i}" for i in range(100)}
+        manager = load_or_build_index(
+            docs, path=self.path, auto_persist=False, purge_threshold=0.1,
+            index_spec=IndexSpec("ivf-flat"),
+        )
+        self.assertNotEqual(
+            faiss.extract_index_ivf(manager.index.index).direct_map.type, faiss.DirectMap.NoMap
+        )
+        results = manager.similarity_search("note 5", k=2, metadata_filter={"title": "doc 5"})
+        self.assertEqual([doc.metadata["title"] for doc in results], ["doc 5"])
+
+        manager.delete(titles=[f"doc {i}" for i in range(20)])
+        self.assertTrue(manager.compact())
+        self.assertNotEqual(
+            faiss.extract_index_ivf(manager.index.index).direct_map.type, faiss.DirectMap.NoMap
+        )
+        results = manager.similarity_search("note 5", k=2, metadata_filter={"title": "doc 50"})
+        self.assertEqual([doc.metadata["title"] for doc in results], ["doc 50"])
+        manager.shutdown()
+
+    def test_filter_after_purge(self):
+        manager = self._load(purge_threshold=0.1)
+        manager.add_documents([
+            Document(page_content=f"Note {i}", metadata={"title": f"t{i}", "source": "s"})
+            for i in range(4)
+        ])
+        query = manager.embed_query("Note 3")
+        manager.similarity_search_by_vector(query, metadata_filter={"source": "s"})
+
+        manager.delete(titles=["t0", "t1"])
+        self.assertTrue(manager.compact())
+        results = manager.similarity_search_by_vector(
+            query, k=4, metadata_filter={"source": "s"}
+        )
+        self.assertEqual(sorted(doc.metadata["title"] for doc in results), ["t2", "t3"])
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the metrics registry, its HTTP endpoint and the index instrumentation.
+"""
+
+import json
+import os
+import sys
+import time
+import unittest
+import urllib.request
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import REGISTRY, MetricsRegistry, StallProbe, start_metrics_server  # noqa: E402
+from test_persistence_manager import IndexTestCase  # noqa: E402
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for counters, gauges, histograms and their rendering"""
+
+    def test_histogram_buckets_and_quantiles(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("op_seconds", "Op latency", buckets=[0.1, 1.0])
+        for value in [0.05, 0.05, 0.5, 5.0]:
+            histogram.observe(value)
+
+        text = registry.render_prometheus()
+        self.assertIn("# TYPE op_seconds histogram", text)
+        self.assertIn('op_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('op_seconds_bucket{le="1"} 3', text)
+        self.assertIn('op_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("op_seconds_count 4", text)
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.99), 1.0)
+
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 5)
+
+    def test_labels_and_registration(self):
+        registry = MetricsRegistry()
+        lookups = registry.counter("lookups_total", "Lookups", ["result"])
+        lookups.labels(result="hit").inc(2)
+        lookups.labels("miss").inc()
+        self.assertIs(registry.counter("lookups_total", "Lookups", ["result"]), lookups)
+        with self.assertRaises(ValueError):
+            registry.gauge("lookups_total", "Lookups")
+        with self.assertRaises(ValueError):
+            lookups.labels()
+
+        text = registry.render_prometheus()
+        self.assertIn('lookups_total{result="hit"} 2', text)
+        self.assertIn('lookups_total{result="miss"} 1', text)
+
+    def test_gauge_function_is_held_weakly(self):
+        class Source:
+            def pending(self):
+                return 7
+
+        registry = MetricsRegistry()
+        gauge = registry.gauge("pending", "Pending")
+        source = Source()
+        gauge.set_function(source.pending)
+        self.assertEqual(gauge.value, 7)
+        del source
+        self.assertEqual(gauge.value, 0)
+
+    def test_stall_probe_sees_a_held_gil(self):
+        with StallProbe(interval=0.001) as probe:
+            time.sleep(0.02)
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                # sum() over a range runs in C without releasing the GIL
+                sum(range(2_000_000))
+        self.assertGreater(probe.total_seconds, 0)
+        self.assertGreaterEqual(probe.total_seconds, probe.max_seconds)
+
+    def test_http_endpoint(self):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests").inc(3)
+        registry.histogram("latency_seconds", "Latency").observe(0.2)
+        server, _ = start_metrics_server(port=0, registry=registry)
+        try:
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+                self.assertIn("requests_total 3", response.read().decode("utf-8"))
+            with urllib.request.urlopen(server.url + ".json", timeout=5) as response:
+                metrics = json.load(response)["metrics"]
+            self.assertEqual(metrics["requests_total"]["series"][0]["value"], 3)
+            self.assertEqual(metrics["latency_seconds"]["series"][0]["count"], 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestIndexInstrumentation(IndexTestCase):
+    """Test cases for metrics recorded by BatchedPersistenceManager"""
+
+    def _value(self, name, **labels):
+        metric = REGISTRY.get(name)
+        if labels:
+            metric = metric.labels(**labels)
+        return metric.count if hasattr(metric, "count") else metric.value
+
+    def test_adds_searches_and_saves_are_recorded(self):
+        before = {
+            "added": self._value("rag_documents_added_total"),
+            "queries": self._value("rag_embed_query_seconds"),
+            "searches": self._value("rag_similarity_search_seconds", filtered="false"),
+            "deltas": self._value("rag_save_bytes", kind="delta"),
+        }
+        manager = self._load()
+        manager.add_documents([Document(page_content="A new note", metadata={"title": "n"})])
+        manager.similarity_search("note", k=1)
+
+        self.assertEqual(self._value("rag_documents_added_total"), before["added"] + 1)
+        self.assertEqual(self._value("rag_embed_query_seconds"), before["queries"] + 1)
+        self.assertEqual(
+            self._value("rag_similarity_search_seconds", filtered="false"),
+            before["searches"] + 1,
+        )
+        self.assertEqual(self._value("rag_save_bytes", kind="delta"), before["deltas"] + 1)
+        self.assertEqual(self._value("rag_pending_documents", index=self.path), 0)
+        self.assertIn("rag_save_seconds_bucket", REGISTRY.render_prometheus())
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
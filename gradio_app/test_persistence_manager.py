@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched FAISS persistence manager.
+
+These tests use a deterministic hashing embedder so they run offline without
+OpenAI or HuggingFace models.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from faiss_helper import load_or_build_index  # noqa: E402
+from embedding_cache import CachedEmbeddings, EmbeddingStore  # noqa: E402
+from index_spec import IndexSpec  # noqa: E402
+from delta_log import COMMIT_MARKER, SnapshotStaging  # noqa: E402
+from persistence_manager import _LIVE_MANAGERS, PersistenceBackpressureError  # noqa: E402
+from sqlite_docstore import DOCSTORE_FILE, SqliteDocstore  # noqa: E402
+from rerank import FloatVectorFile  # noqa: E402
+from write_ahead_log import WAL_FILE, WriteAheadLog  # noqa: E402
+
+
+class HashEmbeddings(Embeddings):
+    """Offline stub that embeds text as a normalized bag of hashed words."""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.embedded_texts = 0
+
+    def _embed(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vec[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts):
+        self.embedded_texts += len(texts)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+DOCS = {
+    "What is RAG?": "Retrieval augmented generation grounds answers in external data.",
+    "Who created Python?": "Python was created by Guido van Rossum in 1991.",
+}
+
+
+class IndexTestCase(unittest.TestCase):
+    """Builds indexes in a temporary directory with offline embeddings"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "index")
+        self.embeddings = HashEmbeddings()
+        self._patch = patch(
+            "faiss_helper._load_embeddings", return_value=self.embeddings
+        )
+        self._patch.start()
+
+    def tearDown(self):
+        self._patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _load(self, **kwargs):
+        kwargs.setdefault("auto_persist", False)
+        return load_or_build_index(DOCS, path=self.path, **kwargs)
+
+
+class TestDeltaPersistence(IndexTestCase):
+    """Test cases for delta segment persistence and compaction"""
+
+    def test_flush_writes_delta_segment(self):
+        manager = self._load(compact_every=100)
+        base_mtime = os.path.getmtime(os.path.join(self.path, "index.faiss"))
+
+        manager.add_documents([Document(page_content="FAISS stores dense vectors.")])
+
+        segments = os.listdir(os.path.join(self.path, "deltas"))
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(
+            os.path.getmtime(os.path.join(self.path, "index.faiss")), base_mtime
+        )
+        self.assertFalse(manager.is_dirty())
+        manager.shutdown()
+
+    def test_reload_replays_deltas(self):
+        manager = self._load(compact_every=100)
+        manager.add_documents([Document(page_content="FAISS stores dense vectors.")])
+        manager.add_documents([Document(page_content="Gradio builds web interfaces.")])
+        manager.shutdown()
+
+        reloaded = self._load(compact_every=100)
+        self.assertEqual(reloaded.index.index.ntotal, 4)
+        result = reloaded.similarity_search("gradio builds web interfaces", k=1)
+        self.assertEqual(result[0].page_content, "Gradio builds web interfaces.")
+        reloaded.shutdown()
+
+    def test_compaction_folds_segments(self):
+        manager = self._load(compact_every=2)
+        manager.add_documents([Document(page_content="first addition")])
+        manager.add_documents([Document(page_content="second addition")])
+        self.assertTrue(manager._needs_compaction())
+
+        self.assertTrue(manager.compact())
+        self.assertEqual(os.listdir(os.path.join(self.path, "deltas")), [])
+        manager.shutdown()
+
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 4)
+        reloaded.shutdown()
+
+
+class TestConcurrency(IndexTestCase):
+    """Test cases for concurrent searches, additions and snapshots"""
+
+    def test_concurrent_adds_searches_and_compactions(self):
+        manager = self._load(auto_persist=True, batch_size=1000, compact_every=1000)
+        errors = []
+
+        def writer(worker):
+            try:
+                for i in range(25):
+                    manager.add_documents([Document(page_content=f"writer {worker} doc {i}")])
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        def reader():
+            try:
+                for _ in range(50):
+                    manager.similarity_search("writer doc", k=3)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        def saver():
+            try:
+                for _ in range(5):
+                    manager.force_save()
+                    manager.compact()
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        threads.append(threading.Thread(target=saver))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        manager.shutdown()
+
+        self.assertEqual(errors, [])
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 2 + 4 * 25)
+        self.assertEqual(len(set(reloaded.index.index_to_docstore_id.values())), 2 + 4 * 25)
+        reloaded.shutdown()
+
+
+class TestMmapLoading(IndexTestCase):
+    """Test cases for memory-mapped read-only loading"""
+
+    def test_mmap_index_is_read_only(self):
+        self._load().shutdown()
+
+        mapped = self._load(mmap=True)
+        self.assertTrue(mapped.read_only)
+        self.assertFalse(mapped.index.docstore._source.is_loaded())
+        result = mapped.similarity_search("who created python", k=1)
+        self.assertEqual(result[0].metadata["title"], "Who created Python?")
+        with self.assertRaises(RuntimeError):
+            mapped.add_documents([Document(page_content="not allowed")])
+        mapped.shutdown()
+
+    def test_mmap_startup_leaves_docstore_unloaded(self):
+        manager = self._load(lexical_index=True, dedup="reject", purge_threshold=1.0)
+        manager.delete(titles=["What is RAG?"])
+        manager.compact()
+        manager.shutdown()
+
+        mapped = self._load(mmap=True, lexical_index=True, dedup="reject")
+        self.assertEqual(len(mapped._tombstones), 1)
+        self.assertFalse(mapped.index.docstore._source.is_loaded())
+        titles = [doc.metadata["title"] for doc, _ in mapped.lexical_search("python rag")]
+        self.assertEqual(titles, ["Who created Python?"])
+        hits = mapped.similarity_search("python rag", k=2)
+        self.assertEqual([doc.metadata["title"] for doc in hits], ["Who created Python?"])
+        mapped.shutdown()
+
+    def test_mmap_falls_back_with_pending_deltas(self):
+        manager = self._load(compact_every=100)
+        manager.add_documents([Document(page_content="FAISS stores dense vectors.")])
+        manager.shutdown()
+
+        loaded = self._load(mmap=True)
+        self.assertFalse(loaded.read_only)
+        self.assertEqual(loaded.index.index.ntotal, 3)
+        loaded.shutdown()
+
+
+class TestEmbeddingCache(IndexTestCase):
+    """Test cases for the content-addressed embedding cache"""
+
+    def test_rebuild_reuses_cached_embeddings(self):
+        cache = os.path.join(self.tmpdir, "embeddings.sqlite")
+        load_or_build_index(DOCS, embedding_cache=cache, auto_persist=False)
+        self.assertEqual(self.embeddings.embedded_texts, 2)
+
+        manager = load_or_build_index(DOCS, embedding_cache=cache, auto_persist=False)
+        self.assertEqual(self.embeddings.embedded_texts, 2)
+
+        manager.add_documents([Document(page_content=DOCS["What is RAG?"])])
+        manager.add_documents([Document(page_content="brand new text")])
+        self.assertEqual(self.embeddings.embedded_texts, 3)
+
+    def test_batched_queries_get_query_vectors(self):
+        class AsymmetricEmbeddings(HashEmbeddings):
+            """Query vectors differ from document vectors, like instruction-tuned models."""
+
+            def embed_query(self, text):
+                return [-x for x in self._embed(text)]
+
+        class QueryBatchEmbeddings(AsymmetricEmbeddings):
+            def embed_queries(self, texts):
+                return [self.embed_query(text) for text in texts]
+
+        store = EmbeddingStore(os.path.join(self.tmpdir, "queries.sqlite"))
+        queries = ["entropy", "who created python"]
+
+        model = AsymmetricEmbeddings()
+        cached = CachedEmbeddings(model, store, model_name="asymmetric")
+        expected = [model.embed_query(query) for query in queries]
+        self.assertEqual(cached.embed_queries(queries), expected)
+        self.assertEqual(cached.embed_query("entropy"), expected[0])
+        self.assertEqual(model.embedded_texts, 0)
+        self.assertEqual((cached.hits, cached.misses), (1, 2))
+
+        model = QueryBatchEmbeddings()
+        cached = CachedEmbeddings(model, store, model_name="query-batch")
+        expected = [model.embed_query(query) for query in queries]
+        self.assertEqual(cached.embed_queries(queries), expected)
+        self.assertEqual(cached.embed_query(queries[1]), expected[1])
+        self.assertEqual((cached.hits, cached.misses), (1, 2))
+        store.close()
+
+    def test_store_evicts_least_recently_used(self):
+        vector_bytes = 64 * 4
+        store = EmbeddingStore(
+            os.path.join(self.tmpdir, "lru.sqlite"), max_bytes=3 * vector_bytes
+        )
+        vector = [0.5] * 64
+        store.put_many({"a": vector, "b": vector, "c": vector})
+        store.get_many(["a"])
+        store.put_many({"d": vector})
+
+        self.assertEqual(set(store.get_many(["a", "b", "c", "d"])), {"a", "d"})
+        store.close()
+
+
+class TestIndexSpec(IndexTestCase):
+    """Test cases for selectable ANN index types"""
+
+    def test_hnsw_spec_is_persisted(self):
+        manager = self._load(index_spec=IndexSpec("hnsw", ef_search=48))
+        self.assertIsInstance(manager.index.index, faiss.IndexHNSWFlat)
+        manager.shutdown()
+
+        reloaded = self._load(index_spec=IndexSpec("flat", ef_search=96))
+        self.assertIsInstance(reloaded.index.index, faiss.IndexHNSWFlat)
+        self.assertEqual(reloaded.index.index.hnsw.efSearch, 96)
+        self.assertEqual(IndexSpec.load(self.path).factory, "HNSW32")
+        reloaded.shutdown()
+
+    def test_ivf_trains_and_applies_nprobe(self):
+        docs = {f"doc {i}": f"topic {i % 17} note {i}" for i in range(400)}
+        manager = load_or_build_index(
+            docs, path=self.path, auto_persist=False,
+            index_spec=IndexSpec("ivf-flat", nprobe=3),
+        )
+        ivf = faiss.extract_index_ivf(manager.index.index)
+        self.assertEqual(ivf.nlist, 10)
+        self.assertEqual(ivf.nprobe, 3)
+        self.assertEqual(manager.index.index.ntotal, 400)
+        manager.shutdown()
+
+    def test_small_corpus_falls_back_to_flat(self):
+        manager = self._load(index_spec=IndexSpec("ivf-pq"))
+        spec = IndexSpec.load(self.path)
+        self.assertEqual((spec.factory, spec.requested), ("Flat", "ivf-pq"))
+        self.assertEqual(len(manager.similarity_search("python", k=2)), 2)
+        manager.shutdown()
+
+    def test_compaction_rebuilds_fallback_as_requested(self):
+        manager = self._load(index_spec=IndexSpec("ivf-flat", nprobe=2))
+        manager.add_documents([
+            Document(page_content=f"topic {i % 7} note {i}", metadata={"title": str(i)})
+            for i in range(40)
+        ])
+        self.assertTrue(manager.compact())
+
+        ivf = faiss.extract_index_ivf(manager.index.index)
+        self.assertEqual((ivf.nlist, ivf.nprobe), (1, 2))
+        self.assertEqual(manager.index.index.ntotal, 42)
+        hit = manager.similarity_search(DOCS["Who created Python?"], k=1)[0]
+        self.assertEqual(hit.metadata["title"], "Who created Python?")
+        spec = IndexSpec.load(self.path)
+        self.assertEqual((spec.factory, spec.requested), ("IVF1,Flat", None))
+        manager.shutdown()
+
+        reloaded = self._load()
+        self.assertIsNotNone(faiss.extract_index_ivf(reloaded.index.index))
+        self.assertEqual(reloaded.index.index.ntotal, 42)
+        reloaded.shutdown()
+
+    def test_empty_corpus_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "empty corpus"):
+            IndexSpec("ivf-flat").build([])
+        with self.assertRaisesRegex(ValueError, "empty corpus"):
+            load_or_build_index({}, path=self.path, auto_persist=False)
+
+    def test_scalar_quantized_storage(self):
+        self.assertEqual(IndexSpec(storage="float16").resolve_factory(1000, 64), "SQfp16")
+        self.assertEqual(IndexSpec("hnsw", storage="int8").resolve_factory(1000, 64),
+                         "HNSW32,SQ8")
+        self.assertEqual(IndexSpec("ivf-flat", storage="int8").resolve_factory(1000, 64),
+                         "IVF25,SQ8")
+        with self.assertRaises(ValueError):
+            IndexSpec(storage="int4")
+
+        manager = self._load(index_spec=IndexSpec(storage="int8"))
+        self.assertIsInstance(manager.index.index, faiss.IndexScalarQuantizer)
+        hit = manager.similarity_search("Who created Python", k=1)[0]
+        self.assertEqual(hit.metadata["title"], "Who created Python?")
+        manager.shutdown()
+
+    def test_rerank_keeps_full_precision_rows_in_step(self):
+        manager = self._load(index_spec=IndexSpec(storage="int8", rerank=4),
+                             purge_threshold=0.1)
+        manager.add_documents([Document(page_content="Rust is a systems language")])
+        vectors = FloatVectorFile(self.path, self.embeddings.dim)
+        self.assertEqual(len(vectors), 3)
+        np.testing.assert_allclose(
+            vectors.rows([2])[0], self.embeddings.embed_query("Rust is a systems language")
+        )
+
+        # Exact scores: a document's own text is at distance zero
+        doc, score = manager.similarity_search_with_score("Rust is a systems language", k=1)[0]
+        self.assertEqual(doc.page_content, "Rust is a systems language")
+        self.assertAlmostEqual(score, 0.0, places=5)
+
+        manager.delete(titles=["What is RAG?"])
+        self.assertTrue(manager.compact())
+        self.assertEqual(len(FloatVectorFile(self.path, self.embeddings.dim)), 2)
+        manager.shutdown()
+
+        reloaded = self._load()
+        self.assertEqual(reloaded.rerank, 4)
+        doc, score = reloaded.similarity_search_with_score("Who created Python?", k=1)[0]
+        self.assertEqual(doc.metadata["title"], "Who created Python?")
+        filtered = reloaded.similarity_search(
+            "Rust", k=1, metadata_filter={"title": "Who created Python?"}
+        )
+        self.assertEqual(filtered[0].metadata["title"], "Who created Python?")
+        reloaded.shutdown()
+
+
+class TestUpsertAndDelete(IndexTestCase):
+    """Test cases for tombstoned deletes, upserts and purging compaction"""
+
+    def _titles(self, manager, query, k=4):
+        return [doc.metadata["title"] for doc in manager.similarity_search(query, k=k)]
+
+    def test_delete_hides_documents_and_survives_reload(self):
+        manager = self._load(purge_threshold=1.0)
+        self.assertEqual(manager.delete(titles=["Who created Python?"]), 1)
+        self.assertEqual(self._titles(manager, "Guido van Rossum Python"), ["What is RAG?"])
+        self.assertEqual(manager.index.index.ntotal, 2)
+        manager.shutdown()
+
+        reloaded = self._load(purge_threshold=1.0)
+        self.assertEqual(self._titles(reloaded, "Guido van Rossum Python"), ["What is RAG?"])
+        reloaded.compact()
+        reloaded.shutdown()
+
+        reloaded = self._load(purge_threshold=1.0)
+        self.assertEqual(len(reloaded._tombstones), 1)
+        self.assertEqual(self._titles(reloaded, "Guido van Rossum Python"), ["What is RAG?"])
+        reloaded.shutdown()
+
+    def test_tombstones_are_excluded_without_over_fetching(self):
+        for spec in ("flat", "hnsw"):
+            with self.subTest(spec=spec):
+                manager = load_or_build_index(
+                    DOCS, path=os.path.join(self.tmpdir, spec), auto_persist=False,
+                    index_spec=IndexSpec(spec), purge_threshold=1.0,
+                )
+                manager.add_documents([
+                    Document(page_content=f"note {i} about python", metadata={"title": str(i)})
+                    for i in range(10)
+                ])
+                manager.delete(titles=[str(i) for i in range(8)])
+
+                searched = []
+                search = manager.index.index.search
+                with patch.object(
+                    manager.index.index, "search",
+                    side_effect=lambda x, k, **kw: searched.append(k) or search(x, k, **kw),
+                ):
+                    titles = self._titles(manager, "note about python", k=3)
+                self.assertEqual(searched, [3])
+                self.assertEqual(len(titles), 3)
+                self.assertFalse(set(titles) & {str(i) for i in range(8)})
+
+                # Additions extend the live bitmap
+                manager.add_documents(
+                    [Document(page_content="note 10 about python", metadata={"title": "10"})]
+                )
+                self.assertEqual(len(self._titles(manager, "note about python", k=10)), 5)
+                manager.shutdown()
+
+    def test_upsert_replaces_all_chunks_with_the_same_title(self):
+        manager = self._load(purge_threshold=1.0, lexical_index=True)
+        manager.add_documents([
+            Document(page_content="old chunk one about tokenizers", metadata={"title": "T"}),
+            Document(page_content="old chunk two about tokenizers", metadata={"title": "T"}),
+        ])
+        ids = manager.upsert_documents(
+            [Document(page_content="new chunk about tokenizers", metadata={"title": "T"})]
+        )
+        hits = manager.similarity_search("chunk about tokenizers", k=4)
+        self.assertEqual([d.id for d in hits if d.metadata["title"] == "T"], ids)
+        self.assertEqual(len(manager.lexical_search("old")), 0)
+        manager.shutdown()
+
+    def test_compaction_purges_dead_vectors(self):
+        for spec in ("flat", "hnsw"):
+            with self.subTest(spec=spec):
+                path = os.path.join(self.tmpdir, spec)
+                manager = load_or_build_index(
+                    DOCS, path=path, auto_persist=False, index_spec=IndexSpec(spec),
+                    purge_threshold=0.3,
+                )
+                self.assertTrue(manager._needs_compaction() is False)
+                manager.delete(titles=["What is RAG?"])
+                self.assertTrue(manager._needs_compaction())
+                self.assertTrue(manager.compact())
+                self.assertEqual(manager.index.index.ntotal, 1)
+                self.assertEqual(manager._tombstones, set())
+                manager.add_documents([Document(page_content="tokenizers split text")])
+                self.assertEqual(len(manager.similarity_search("text", k=5)), 2)
+                manager.shutdown()
+
+                reloaded = load_or_build_index(DOCS, path=path, auto_persist=False)
+                self.assertEqual(reloaded.index.index.ntotal, 2)
+                self.assertEqual(len(reloaded._tombstones), 0)
+                reloaded.shutdown()
+
+
+class TestPersistenceScheduler(IndexTestCase):
+    """Test cases for event-driven saves, adaptive batching and backpressure"""
+
+    def _wait_until_clean(self, manager, timeout=5.0):
+        with manager._changed:
+            return manager._changed.wait_for(lambda: not manager._is_dirty, timeout=timeout)
+
+    def _notes(self, start, count):
+        return [Document(page_content=f"note {i}") for i in range(start, start + count)]
+
+    def test_full_batch_and_max_wait_time_trigger_saves(self):
+        manager = self._load(auto_persist=True, batch_size=2, max_wait_time=60)
+        manager.add_documents(self._notes(0, 1))
+        self.assertFalse(self._wait_until_clean(manager, timeout=0.2))
+        manager.add_documents(self._notes(1, 1))
+        self.assertTrue(self._wait_until_clean(manager))
+        manager.shutdown()
+
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=0.1)
+        manager.add_documents(self._notes(2, 1))
+        self.assertTrue(self._wait_until_clean(manager))
+        manager.shutdown()
+
+    def test_slow_saves_grow_the_batch(self):
+        manager = self._load(auto_persist=True, batch_size=2, max_batch_size=50,
+                             max_wait_time=60, save_budget=0.1)
+        with manager._lock:
+            manager._save_seconds = 5.0
+        manager.add_documents(self._notes(0, 3))
+        self.assertFalse(self._wait_until_clean(manager, timeout=0.2))
+        self.assertGreater(manager.effective_batch_size(), 2)
+        self.assertLessEqual(manager.effective_batch_size(), 50)
+        self.assertTrue(manager.shutdown())
+        self.assertFalse(manager.is_dirty())
+
+    def test_backpressure_policies(self):
+        for policy in ("reject", "block", "memory"):
+            with self.subTest(policy=policy):
+                path = os.path.join(self.tmpdir, policy)
+                manager = load_or_build_index(
+                    DOCS, path=path, batch_size=100, max_wait_time=60,
+                    max_unsaved=2, backpressure=policy,
+                )
+                manager.add_documents(self._notes(0, 2))
+                if policy == "reject":
+                    with self.assertRaises(PersistenceBackpressureError):
+                        manager.add_documents(self._notes(2, 1))
+                    # The rejected write requested a flush, which frees room
+                    self.assertTrue(self._wait_until_clean(manager))
+                manager.add_documents(self._notes(2, 1))
+                manager.add_documents(self._notes(3, 2))
+                self.assertTrue(manager.shutdown())
+
+                reloaded = load_or_build_index(DOCS, path=path, auto_persist=False)
+                self.assertEqual(reloaded.index.index.ntotal, 2 + 5)
+                reloaded.shutdown()
+
+    def test_shutdown_flushes_pending_changes(self):
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=60)
+        manager.add_documents(self._notes(0, 3))
+        self.assertTrue(manager.is_dirty())
+        self.assertTrue(manager.shutdown())
+        self.assertTrue(manager.shutdown())
+
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 5)
+        reloaded.shutdown()
+
+
+def crash(manager):
+    """Stop the persistence thread without the final flush, as a kill would."""
+    _LIVE_MANAGERS.discard(manager)
+    with manager._changed:
+        manager._shutdown = True
+        manager._changed.notify_all()
+    manager._persistence_thread.join()
+    manager._wal.close()
+
+
+class TestCrashRecovery(IndexTestCase):
+    """Test cases for the write-ahead log and atomic snapshots"""
+
+    def _crash(self, manager):
+        crash(manager)
+
+    def test_unsaved_changes_survive_a_crash(self):
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=60)
+        manager.add_documents([Document(page_content="Logged before the crash")])
+        manager.delete(titles=["Who created Python?"])
+        self.assertTrue(manager.is_dirty())
+        self._crash(manager)
+
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 3)
+        titles = [d.metadata.get("title") for d in reloaded.similarity_search("Python", k=3)]
+        self.assertNotIn("Who created Python?", titles)
+        self.assertEqual(os.path.getsize(os.path.join(self.path, WAL_FILE)), 0)
+        reloaded.shutdown()
+
+    def test_failed_log_append_leaves_the_index_unchanged(self):
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=60)
+        with patch.object(manager._wal, "append", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                manager.add_documents([Document(page_content="Never logged")])
+            with self.assertRaises(OSError):
+                manager.delete(titles=["Who created Python?"])
+
+        self.assertEqual(manager.index.index.ntotal, 2)
+        self.assertFalse(manager.is_dirty())
+        self.assertEqual(len(manager.similarity_search("Python", k=3)), 2)
+        manager.shutdown()
+
+    def test_searches_run_while_a_change_is_logged(self):
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=60)
+        logging, release = threading.Event(), threading.Event()
+        append = manager._wal.append
+
+        def slow_append(*args):
+            logging.set()
+            release.wait(5)
+            return append(*args)
+
+        with patch.object(manager._wal, "append", side_effect=slow_append):
+            writer = threading.Thread(
+                target=manager.add_documents, args=([Document(page_content="Slowly logged")],)
+            )
+            writer.start()
+            self.assertTrue(logging.wait(5))
+            # No index lock is held while the change is logged
+            self.assertEqual(len(manager.similarity_search("Python", k=3)), 2)
+            release.set()
+            writer.join()
+        self.assertEqual(manager.index.index.ntotal, 3)
+        manager.shutdown()
+
+    def test_saves_truncate_the_log(self):
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=60)
+        manager.add_documents([Document(page_content="Soon saved")])
+        self.assertEqual(WriteAheadLog(self.path).last_lsn, 1)
+        self.assertTrue(manager.force_save())
+        self.assertEqual(WriteAheadLog(self.path).last_lsn, 0)
+        manager.shutdown()
+
+    def test_torn_record_is_ignored(self):
+        manager = self._load(auto_persist=True, batch_size=100, max_wait_time=60)
+        manager.add_documents([Document(page_content="Complete record")])
+        self._crash(manager)
+        with open(os.path.join(self.path, WAL_FILE), "ab") as f:
+            f.write(b"\x02\x00\x00\x00partial")
+
+        self.assertEqual(len(list(WriteAheadLog(self.path).records())), 1)
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 3)
+        reloaded.shutdown()
+
+    def test_interrupted_snapshot_is_rolled_forward_or_discarded(self):
+        manager = self._load()
+        manager.add_documents([Document(page_content="In the staged snapshot")])
+        staged = manager._snapshot()
+        manager.shutdown()
+        shutil.rmtree(os.path.join(self.path, "deltas"))
+
+        # Crash before the commit marker: the old snapshot stays
+        staging = SnapshotStaging(self.path)
+        staged.save_local(staging.path)
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 2)
+        self.assertFalse(os.path.exists(staging.path))
+        reloaded.shutdown()
+
+        # Crash after the commit marker: the swap completes on load
+        staging = SnapshotStaging(self.path)
+        staged.save_local(staging.path)
+        open(os.path.join(staging.path, COMMIT_MARKER), "w").close()
+        reloaded = self._load()
+        self.assertEqual(reloaded.index.index.ntotal, 3)
+        reloaded.shutdown()
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "fork is not available")
+class TestForkedSnapshots(IndexTestCase):
+    """Test cases for full snapshots written by a forked child process"""
+
+    def test_forked_compaction_is_reloadable(self):
+        manager = self._load(snapshot_mode="fork", lexical_index=True)
+        manager.add_documents([Document(page_content="Written by the child", metadata={})])
+        self.assertTrue(manager.compact())
+        self.assertEqual(manager.last_snapshot["mode"], "fork")
+        self.assertGreater(manager.last_snapshot["bytes"], 0)
+        self.assertGreaterEqual(manager.last_snapshot["max_stall_seconds"], 0)
+        manager.shutdown()
+
+        self.assertFalse(os.listdir(os.path.join(self.path, "deltas")))
+        reloaded = self._load(lexical_index=True)
+        self.assertEqual(reloaded.index.index.ntotal, 3)
+        self.assertEqual(reloaded.lexical_search("child", k=1)[0][0].page_content,
+                         "Written by the child")
+        reloaded.shutdown()
+
+    def test_purging_compaction_runs_on_the_thread(self):
+        manager = self._load(snapshot_mode="fork", purge_threshold=0.1)
+        manager.delete(titles=["What is RAG?"])
+        self.assertTrue(manager.compact())
+        self.assertEqual(manager.last_snapshot["mode"], "thread")
+        self.assertEqual(manager.index.index.ntotal, 1)
+        manager.shutdown()
+
+    def test_invalid_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self._load(snapshot_mode="process")
+
+
+class TestSqliteDocstore(IndexTestCase):
+    """Test cases for documents kept in docstore.sqlite instead of index.pkl"""
+
+    def test_documents_are_read_from_sqlite(self):
+        manager = self._load(docstore="sqlite")
+        self.assertIsInstance(manager.docstore, SqliteDocstore)
+        manager.add_documents([
+            Document(page_content="Stored on disk", metadata={"title": "disk", "source": "s"})
+        ])
+        self.assertTrue(manager.compact())
+        manager.shutdown()
+
+        reloaded = self._load()
+        self.assertIsInstance(reloaded.docstore, SqliteDocstore)
+        self.assertEqual(len(reloaded.docstore), 3)
+        hit = reloaded.similarity_search("Stored on disk", k=1)[0]
+        self.assertEqual(hit.page_content, "Stored on disk")
+        self.assertEqual(hit.metadata["title"], "disk")
+        filtered = reloaded.similarity_search("Python", k=3, metadata_filter={"source": "s"})
+        self.assertEqual([d.page_content for d in filtered], ["Stored on disk"])
+        reloaded.shutdown()
+
+    def test_purge_deletes_rows_and_mmap_reads_them(self):
+        manager = self._load(docstore="sqlite", purge_threshold=0.1)
+        manager.delete(titles=["What is RAG?"])
+        self.assertTrue(manager.compact())
+        self.assertEqual(len(manager.docstore), 1)
+        manager.shutdown()
+
+        mapped = self._load(mmap=True)
+        hit = mapped.similarity_search("Python", k=1)[0]
+        self.assertEqual(hit.metadata["title"], "Who created Python?")
+        mapped.shutdown()
+
+    def test_in_memory_docstore_is_moved(self):
+        self._load().shutdown()
+        size_before = os.path.getsize(os.path.join(self.path, "index.pkl"))
+        manager = self._load(docstore="sqlite")
+        self.assertIsInstance(manager.docstore, SqliteDocstore)
+        self.assertTrue(os.path.exists(os.path.join(self.path, DOCSTORE_FILE)))
+        self.assertLess(os.path.getsize(os.path.join(self.path, "index.pkl")), size_before)
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for micro-batched query embedding.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import REGISTRY  # noqa: E402
+from query_batching import QueryCoalescer  # noqa: E402
+from test_persistence_manager import IndexTestCase  # noqa: E402
+
+
+class RecordingIndex:
+    """Stand-in index that records each embed_queries batch."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+
+    def embed_queries(self, queries):
+        self.batches.append(list(queries))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return [[float(len(query))] for query in queries]
+
+
+def _embed_concurrently(coalescer, index, queries):
+    results = {}
+    errors = {}
+
+    def embed(query):
+        try:
+            results[query] = coalescer.embed(index, query)
+        except Exception as e:
+            errors[query] = e
+
+    threads = [threading.Thread(target=embed, args=(query,)) for query in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class TestQueryCoalescer(unittest.TestCase):
+    """Test cases for QueryCoalescer"""
+
+    def test_concurrent_queries_share_a_batch(self):
+        index = RecordingIndex()
+        coalescer = QueryCoalescer(window=0.2, max_batch=4)
+        queries = ["a", "bb", "ccc", "dddd"]
+
+        started = time.perf_counter()
+        results, errors = _embed_concurrently(coalescer, index, queries)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(len(index.batches), 1)
+        self.assertEqual(sorted(index.batches[0]), queries)
+        # Every caller gets the vector of its own query
+        self.assertEqual(results, {query: [float(len(query))] for query in queries})
+        # A full batch does not wait out the window
+        self.assertLess(time.perf_counter() - started, 0.2)
+
+    def test_max_batch_splits_batches(self):
+        index = RecordingIndex()
+        coalescer = QueryCoalescer(window=0.05, max_batch=3)
+        results, _ = _embed_concurrently(coalescer, index, [str(i) * 2 for i in range(7)])
+
+        self.assertEqual(len(results), 7)
+        self.assertTrue(all(len(batch) <= 3 for batch in index.batches))
+        self.assertEqual(sum(len(batch) for batch in index.batches), 7)
+
+    def test_indexes_are_batched_separately(self):
+        first, second = RecordingIndex(), RecordingIndex()
+        coalescer = QueryCoalescer(window=0.05)
+        threads = [
+            threading.Thread(target=coalescer.embed, args=(index, query))
+            for index in (first, second)
+            for query in ("x", "yy")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(q for batch in first.batches for q in batch), ["x", "yy"])
+        self.assertEqual(sorted(q for batch in second.batches for q in batch), ["x", "yy"])
+
+    def test_errors_reach_every_caller(self):
+        coalescer = QueryCoalescer(window=0.05, max_batch=2)
+        results, errors = _embed_concurrently(coalescer, RecordingIndex(fail=True), ["a", "b"])
+
+        self.assertEqual(results, {})
+        self.assertEqual(sorted(errors), ["a", "b"])
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors.values()))
+
+    def test_metrics(self):
+        batch_sizes = REGISTRY.get("rag_query_batch_size")
+        queue_seconds = REGISTRY.get("rag_query_queue_seconds")
+        sizes_before, delays_before = batch_sizes.count, queue_seconds.count
+
+        coalescer = QueryCoalescer(window=0.05, max_batch=2)
+        _embed_concurrently(coalescer, RecordingIndex(), ["a", "b"])
+
+        self.assertEqual(batch_sizes.count - sizes_before, 1)
+        self.assertEqual(queue_seconds.count - delays_before, 2)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            QueryCoalescer(window=-1)
+        with self.assertRaises(ValueError):
+            QueryCoalescer(max_batch=0)
+
+
+class TestBatchedQueryEmbedding(IndexTestCase):
+    """embed_queries on real index managers"""
+
+    def test_batch_matches_single_queries(self):
+        manager = self._load()
+        queries = ["Who created Python?", "What is RAG?", "entropy"]
+
+        self.assertEqual(
+            manager.embed_queries(queries), [manager.embed_query(q) for q in queries]
+        )
+        coalescer = QueryCoalescer(window=0.05)
+        results, errors = _embed_concurrently(coalescer, manager, queries)
+        self.assertEqual(errors, {})
+        docs = manager.similarity_search_by_vector(results["Who created Python?"], k=1)
+        self.assertIn("Guido", docs[0].page_content)
+        manager.shutdown()
+
+    def test_batch_uses_query_vectors_without_a_batched_query_method(self):
+        # Query vectors differ from document vectors, like instruction-tuned models
+        self.embeddings.embed_query = lambda text: [-x for x in self.embeddings._embed(text)]
+        manager = self._load()
+        queries = ["Who created Python?", "entropy"]
+        expected = [self.embeddings.embed_query(q) for q in queries]
+
+        self.assertEqual(manager.embed_queries(queries), expected)
+        coalescer = QueryCoalescer(window=0.05, max_batch=2)
+        results, errors = _embed_concurrently(coalescer, manager, queries)
+        self.assertEqual(errors, {})
+        self.assertEqual([results[q] for q in queries], expected)
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the sharded index manager.
+"""
+
+import os
+import sys
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sharded_index import (  # noqa: E402
+    SHARDS_FILE,
+    load_or_build_sharded_index,
+    shard_path,
+)
+from test_persistence_manager import DOCS, IndexTestCase  # noqa: E402
+
+
+def _notes(count, title_prefix="note"):
+    return [
+        Document(page_content=f"Note number {i}", metadata={"title": f"{title_prefix}-{i}"})
+        for i in range(count)
+    ]
+
+
+class TestShardedIndex(IndexTestCase):
+    """Test cases for ShardedIndexManager"""
+
+    def _load_sharded(self, shards=3, **kwargs):
+        kwargs.setdefault("auto_persist", False)
+        return load_or_build_sharded_index(DOCS, self.path, shards=shards, **kwargs)
+
+    def test_documents_are_spread_and_persisted_per_shard(self):
+        manager = self._load_sharded()
+        manager.add_documents(_notes(30))
+
+        sizes = manager.shard_sizes()
+        self.assertEqual(sum(sizes), 32)
+        self.assertTrue(all(sizes))
+        for shard in range(3):
+            self.assertTrue(os.path.exists(os.path.join(shard_path(self.path, shard), "deltas")))
+        self.assertTrue(os.path.exists(os.path.join(self.path, SHARDS_FILE)))
+        manager.shutdown()
+
+        # Reloading keeps the recorded shard count and every document
+        reloaded = self._load_sharded(shards=5)
+        self.assertEqual(reloaded.num_shards, 3)
+        self.assertEqual(reloaded.shard_sizes(), sizes)
+        reloaded.shutdown()
+
+    def test_empty_corpus_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "empty corpus"):
+            load_or_build_sharded_index({}, self.path, shards=2)
+
+    def test_search_merges_the_global_top_k(self):
+        manager = self._load_sharded()
+        manager.add_documents(_notes(30))
+
+        results = manager.similarity_search_with_score("Note number 7", k=5)
+        self.assertEqual(results[0][0].metadata["title"], "note-7")
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores))
+
+        # Same ranking as searching every shard exhaustively
+        query = manager.embed_query("Note number 7")
+        everything = sorted(
+            score
+            for shard in manager.shards
+            for _, score in shard.similarity_search_with_score_by_vector(query, k=40)
+        )
+        self.assertEqual(scores, everything[:5])
+        manager.shutdown()
+
+    def test_upsert_and_delete_by_title_stay_on_one_shard(self):
+        manager = self._load_sharded()
+        manager.add_documents(_notes(10))
+        shard = manager.shards[manager.shard_for("note-3")]
+
+        manager.upsert_documents([
+            Document(page_content="Rewritten note", metadata={"title": "note-3"})
+        ])
+        titles = [doc.metadata["title"] for doc in manager.similarity_search("Note", k=20)]
+        self.assertEqual(titles.count("note-3"), 1)
+        self.assertEqual(len(shard._tombstones), 1)
+
+        self.assertEqual(manager.delete(titles=["note-3", "note-4"]), 2)
+        titles = [doc.metadata["title"] for doc in manager.similarity_search("Note", k=20)]
+        self.assertNotIn("note-3", titles)
+        self.assertNotIn("note-4", titles)
+        manager.shutdown()
+
+    def test_delete_by_id_searches_every_shard(self):
+        manager = self._load_sharded()
+        ids = manager.add_documents(_notes(6))
+        self.assertEqual(manager.delete(ids=ids[:4]), 4)
+        self.assertEqual(len(manager.similarity_search("Note", k=20)), 4)
+        manager.shutdown()
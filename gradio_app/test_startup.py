@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for startup timing, background index loading and lazy embeddings.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from faiss_helper import LazyEmbeddings  # noqa: E402
+from startup import BackgroundLoader, StartupTimer  # noqa: E402
+from test_persistence_manager import HashEmbeddings, IndexTestCase  # noqa: E402
+
+
+class TestStartupTimer(unittest.TestCase):
+    """Test cases for StartupTimer"""
+
+    def test_phases_are_reported_in_start_order(self):
+        timer = StartupTimer()
+        with timer.phase("load"):
+            pass
+        timer.mark("ready")
+
+        phases = timer.phases()
+        self.assertEqual([phase["phase"] for phase in phases], ["load", "ready"])
+        self.assertIn("load", timer.report())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "startup.json")
+            timer.save(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["phases"], phases)
+
+
+class TestBackgroundLoader(unittest.TestCase):
+    """Test cases for BackgroundLoader"""
+
+    def test_ready_before_warm_up_finishes(self):
+        release = threading.Event()
+        warmed_up = []
+        loader = BackgroundLoader("index", lambda: "index")
+        loader.add_warm_up("slow", lambda result: (release.wait(5), warmed_up.append(result)))
+        loader.start()
+
+        self.assertEqual(loader.wait(5), "index")
+        self.assertEqual(loader.status, "ready")
+        self.assertFalse(loader.warmed.is_set())
+        release.set()
+        self.assertTrue(loader.warmed.wait(5))
+        self.assertEqual(warmed_up, ["index"])
+        self.assertEqual(
+            [phase["phase"] for phase in loader.timer.phases()], ["index", "warm-up: slow"]
+        )
+
+    def test_failures(self):
+        def fail():
+            raise OSError("disk gone")
+
+        loader = BackgroundLoader("index", fail).start()
+        with self.assertRaises(RuntimeError):
+            loader.wait(5)
+        self.assertEqual(loader.status, "failed")
+
+        stuck = threading.Event()
+        loader = BackgroundLoader("index", lambda: stuck.wait(5)).start()
+        with self.assertRaises(TimeoutError):
+            loader.wait(0.01)
+        stuck.set()
+
+    def test_warm_up_errors_are_not_fatal(self):
+        loader = BackgroundLoader("index", lambda: 1)
+        loader.add_warm_up("broken", lambda _: 1 / 0)
+        self.assertEqual(loader.run(), 1)
+        self.assertTrue(loader.warmed.is_set())
+
+
+class TestLazyEmbeddings(IndexTestCase):
+    """Test cases for loading an index without creating the embedding model"""
+
+    def test_model_is_created_on_first_query(self):
+        self._load().shutdown()
+        created = []
+
+        def factory():
+            created.append(True)
+            return HashEmbeddings()
+
+        lazy = LazyEmbeddings(factory)
+        manager = self._load(embeddings=lazy)
+        self.assertFalse(lazy.loaded)
+        self.assertEqual(len(manager.similarity_search("What is RAG?", k=1)), 1)
+        self.assertEqual(created, [True])
+        manager.shutdown()
+
+
+class TestDeferredImports(unittest.TestCase):
+    """Importing the app must not import the heavy libraries"""
+
+    def test_app_import_leaves_heavy_modules_unloaded(self):
+        # A fresh interpreter, since this one has imported FAISS for other tests
+        heavy = ["faiss", "numpy", "langchain_core", "langchain_community", "gradio", "openai"]
+        script = (
+            "import json, sys; import gradio_rag_app; "
+            f"print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(json.loads(output.splitlines()[-1]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
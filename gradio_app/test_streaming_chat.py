@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the async streaming chat client against the stand-in server.
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import start_mock_server  # noqa: E402
+from streaming_chat import StreamingChatClient  # noqa: E402
+
+HAS_OPENAI = importlib.util.find_spec("openai") is not None
+
+
+@unittest.skipUnless(HAS_OPENAI, "openai is not installed")
+class TestStreamingChatClient(unittest.TestCase):
+    """Test cases for StreamingChatClient"""
+
+    def _start(self, **kwargs):
+        server, thread = start_mock_server(**kwargs)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _client(self, server, max_concurrent=8):
+        return StreamingChatClient(
+            base_url=server.base_url, api_key="test", max_concurrent=max_concurrent
+        )
+
+    def test_streams_deltas_and_reports_usage(self):
+        server = self._start(reply="Python was created by Guido")
+        client = self._client(server)
+        messages = [{"role": "user", "content": "Context: x\n\nQ: Who?\nA:"}]
+
+        async def run():
+            usage = {}
+            deltas = [delta async for delta in client.stream(messages, usage)]
+            return deltas, usage
+
+        deltas, usage = asyncio.run(run())
+        self.assertEqual(len(deltas), 5)
+        self.assertEqual("".join(deltas), "Python was created by Guido")
+        self.assertEqual(usage["completion_tokens"], 5)
+        self.assertGreater(usage["prompt_tokens"], 0)
+
+    def test_concurrency_limit_is_enforced(self):
+        server = self._start(token_delay=0.01)
+        client = self._client(server, max_concurrent=2)
+
+        async def ask(i):
+            return await client.complete([{"role": "user", "content": f"Q: question {i}\nA:"}])
+
+        async def run():
+            return await asyncio.gather(*(ask(i) for i in range(6)))
+
+        answers = asyncio.run(run())
+        self.assertEqual(answers[3], "Stand-in answer to: question 3")
+        self.assertEqual(server.requests, 6)
+        self.assertLessEqual(server.max_active, 2)
+        self.assertEqual(client.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Token Counting Helpers
+
+Provides one cached tokenizer per encoding so chunking and prompt packing can
+count tokens without reloading BPE tables on every call. Falls back to a
+whitespace tokenizer when tiktoken or its encoding files are unavailable
+(e.g. offline classrooms).
+"""
+
+import logging
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class WhitespaceTokenizer:
+    """Approximate tokenizer that treats whitespace-separated words as tokens."""
+
+    name = "whitespace"
+
+    def encode(self, text: str) -> List[str]:
+        return text.split()
+
+    def decode(self, tokens: Sequence[str]) -> str:
+        return " ".join(tokens)
+
+
+class TiktokenTokenizer:
+    """Adapter that encodes special-token text (e.g. ``<|endoftext|>``) as plain text."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def encode(self, text: str) -> List[int]:
+        return self.encoding.encode(text, disallowed_special=())
+
+    def decode(self, tokens: Sequence[int]) -> str:
+        return self.encoding.decode(list(tokens))
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding_name: str = DEFAULT_ENCODING):
+    """
+    Return a cached tokenizer with ``encode``/``decode`` methods.
+
+    Args:
+        encoding_name: tiktoken encoding to load
+
+    Returns:
+        TiktokenTokenizer, or WhitespaceTokenizer if tiktoken cannot be loaded
+    """
+    try:
+        import tiktoken
+
+        return TiktokenTokenizer(tiktoken.get_encoding(encoding_name))
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding {encoding_name} ({e}); "
+                       "counting whitespace-separated words instead")
+        return WhitespaceTokenizer()
+
+
+def count_tokens(text: str, tokenizer: Optional[object] = None) -> int:
+    """Count tokens in text with the given or default cached tokenizer."""
+    tokenizer = tokenizer or get_tokenizer()
+    return len(tokenizer.encode(text))
@@ -0,0 +1,179 @@
+"""
+Write-Ahead Log for Unsaved Index Changes
+
+The persistence manager applies changes in memory and saves them in batches,
+so a crash used to lose every change made since the last save. This module
+appends each change to ``wal.log`` and fsyncs it before the change is
+acknowledged. Once a delta segment or snapshot covers a change, its records
+are truncated away; on startup any remaining records are turned into a delta
+segment and replayed like any other.
+
+Each record is a fixed header (sequence number, payload length, CRC32)
+followed by the pickled change. A record torn by a crash fails its length or
+checksum test and ends the log.
+"""
+
+import logging
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    from .delta_log import DeltaLog, DeltaRecord, payload_records, segment_payload
+except ImportError:
+    # Fallback for direct execution
+    from delta_log import DeltaLog, DeltaRecord, payload_records, segment_payload
+
+logger = logging.getLogger(__name__)
+
+WAL_FILE = "wal.log"
+_HEADER = struct.Struct("<QII")
+
+
+class WriteAheadLog:
+    """Durable, append-only record of changes not yet in a delta segment or snapshot."""
+
+    def __init__(self, index_path: str, sync: bool = True):
+        """
+        Args:
+            index_path: Index directory holding ``wal.log``
+            sync: fsync every append; without it a power loss (but not a
+                process crash) can lose the latest records
+        """
+        self.path = os.path.join(index_path, WAL_FILE)
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._last_lsn: Optional[int] = None
+
+    @property
+    def last_lsn(self) -> int:
+        """Sequence number of the newest record (0 if the log is empty)."""
+        with self._lock:
+            return self._current_lsn()
+
+    def _current_lsn(self) -> int:
+        if self._last_lsn is None:
+            self._last_lsn = 0
+            for lsn, _ in self.records():
+                self._last_lsn = lsn
+        return self._last_lsn
+
+    def append(
+        self,
+        records: List[DeltaRecord],
+        deleted_ids: Iterable[str] = (),
+        updates: Optional[Mapping[str, Mapping[str, Any]]] = None,
+    ) -> int:
+        """
+        Durably append one change.
+
+        Returns:
+            Sequence number of the record
+        """
+        data = pickle.dumps(
+            segment_payload(records, deleted_ids, updates), protocol=pickle.HIGHEST_PROTOCOL
+        )
+        with self._lock:
+            lsn = self._current_lsn() + 1
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            start = self._file.tell()
+            try:
+                self._file.write(_HEADER.pack(lsn, len(data), zlib.crc32(data)) + data)
+                self._file.flush()
+                if self.sync:
+                    os.fsync(self._file.fileno())
+            except Exception:
+                # Never leave a partial record in front of later ones
+                self._file.truncate(start)
+                raise
+            self._last_lsn = lsn
+            return lsn
+
+    def records(self) -> Iterator[Tuple[int, Dict]]:
+        """Yield (sequence number, payload) for every intact record."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            while True:
+                header = f.read(_HEADER.size)
+                if not header:
+                    return
+                if len(header) < _HEADER.size:
+                    logger.warning(f"Ignoring a torn record at the end of {self.path}")
+                    return
+                lsn, length, checksum = _HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != checksum:
+                    logger.warning(f"Ignoring a torn record at the end of {self.path}")
+                    return
+                yield lsn, pickle.loads(data)
+
+    def truncate(self, through_lsn: int) -> None:
+        """Drop records up to ``through_lsn``, which a save has made durable."""
+        with self._lock:
+            if through_lsn <= 0:
+                return
+            if through_lsn >= self._current_lsn():
+                if self._file is not None:
+                    self._file.truncate(0)
+                    self._file.seek(0)
+                elif os.path.exists(self.path):
+                    os.truncate(self.path, 0)
+                return
+
+            # Changes made while the save ran are kept
+            kept = [
+                (lsn, payload) for lsn, payload in self.records() if lsn > through_lsn
+            ]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for lsn, payload in kept:
+                    data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+                    f.write(_HEADER.pack(lsn, len(data), zlib.crc32(data)) + data)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(tmp_path, self.path)
+
+    def recover(self, delta_log: DeltaLog) -> int:
+        """
+        Turn the records left by a crash into one delta segment and clear the log.
+
+        Returns:
+            Number of changes (additions, deletions and metadata updates) recovered
+        """
+        records: List[DeltaRecord] = []
+        deleted: List[str] = []
+        updates: Dict[str, Dict[str, Any]] = {}
+        for _, payload in self.records():
+            records.extend(payload_records(payload))
+            deleted.extend(payload["deleted"])
+            for doc_id, fields in payload.get("updates", {}).items():
+                updates.setdefault(doc_id, {}).update(fields)
+        if records or deleted or updates:
+            delta_log.append(records, deleted, updates)
+            logger.info(
+                f"Recovered {len(records)} additions, {len(deleted)} deletions and "
+                f"{len(updates)} metadata updates from {self.path}"
+            )
+        with self._lock:
+            if os.path.exists(self.path):
+                os.truncate(self.path, 0)
+            self._last_lsn = 0
+        return len(records) + len(deleted) + len(updates)
+
+    def close(self) -> None:
+        """Close the log file; later appends reopen it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None